@@ -24,6 +24,8 @@ except:
 import q_auth as auth
 from engine import synchronize
 from engine.synchronize import Synchronizer
+from model import m_gpkg
+from model.m_config import PROBE_SERIES_LAYER_STR
 from model.m_qgis import IQgis
 from model.m_user import User
 from q_auth import LoginError
@@ -57,6 +59,7 @@ def _try_login() -> User:
 SYNC_TEXT = 'Synchronizacja'
 PROJECT_TEXT = 'Temat'
 HELP_TEXT = 'Pomoc'
+ASSIGN_TEXT = 'Przydział pracy'
 
 
 class SrappPlugin:
@@ -65,6 +68,7 @@ class SrappPlugin:
         self.iface = iface
         self.sync_action = None
         self.add_project_action = None
+        self.assign_action = None
 
     def initGui(self):
         self.tool_button = QToolButton()
@@ -87,6 +91,11 @@ class SrappPlugin:
         self.add_project_action.triggered.connect(self.run_add_project)
         m.addAction(self.add_project_action)
 
+        self.assign_action = QAction(ASSIGN_TEXT, self.iface.mainWindow())
+        self.assign_action.triggered.connect(self.run_assign_work)
+        self.assign_action.setDisabled(True)
+        m.addAction(self.assign_action)
+
         help_icon = QIcon(self.make_icon_path('help.png'))
         self.help_action = QAction(help_icon, HELP_TEXT, self.iface.mainWindow())
         self.help_action.triggered.connect(self.show_help)
@@ -104,6 +113,8 @@ class SrappPlugin:
     def resolve_push_actions_visibility(self):
         is_sync = self.sync_action.isChecked()
         self.add_project_action.setDisabled(is_sync)
+        # assignments are sent through the synchronization
+        self.assign_action.setDisabled(not is_sync)
 
     def show_help(self):
         path = os.path.dirname(os.path.abspath(__file__))
@@ -124,6 +135,23 @@ class SrappPlugin:
         else:
             _sync_instance.desynchronize()
 
+    def run_assign_work(self):
+        if not _sync_instance:
+            return
+        projects = {project.name: project for project in _sync_instance.projects}
+        if not projects:
+            return
+        project_name, ok = QInputDialog.getItem(QInputDialog(), 'Przydział pracy',
+                                                'Przydziel punkty do zrobienia zespołom w temacie: ',
+                                                list(projects.keys()), 0, False)
+        if not ok:
+            return
+        name_to_performer = _sync_instance.assign_work(projects[project_name])
+        if name_to_performer:
+            G.Log.information(f'Przydzielono zespołom {len(name_to_performer)} punktów w temacie "{project_name}"')
+        else:
+            G.Log.information(f'Brak nieprzydzielonych punktów do zrobienia lub zespołów w temacie "{project_name}"')
+
     def run_add_project(self):
         qid = QInputDialog()
         title = "Wpisz nazwę tematu"
@@ -144,15 +172,20 @@ class SrappPlugin:
         G.Log.message(f'Tworzy temat "{project_name}"')
 
         projects_dir = self._make_projects_dir()
-        new_project = Project(project_name, projects_dir)
-        if os.path.isfile(new_project.gpkg_file_path):
-            qm = QMessageBox
+        qm = QMessageBox
+        gpkg_file_path = Project(project_name, projects_dir).gpkg_file_path
+        if os.path.isfile(gpkg_file_path):
             ret = QMessageBox.question(None, 'Potwierdź', f'Plik .gpkg z podaną nazwą "{project_name}" już istnieje. '
                                                           f'Czy utworzyć nowy plik?', qm.Yes | qm.No)
             if ret == qm.No:
                 G.Log.message(f'Przerwano tworzenie tematu "{project_name}"')
-                q_project.add_project_to_qgis(new_project)
+                # the existing file keeps its layout of probe units
+                packed_probe_units = m_gpkg.has_table(gpkg_file_path, PROBE_SERIES_LAYER_STR)
+                q_project.add_project_to_qgis(Project(project_name, projects_dir, packed_probe_units=packed_probe_units))
                 return
+        ret = qm.question(None, 'Wartości sondowań', 'Czy zapisywać wszystkie wartości sondowania w jednym wierszu? '
+                                                      'Zmniejsza to rozmiar dużych tematów.', qm.Yes | qm.No, qm.No)
+        new_project = Project(project_name, projects_dir, packed_probe_units=ret == qm.Yes)
         q_project.create_files(new_project)
         if os.path.isfile(new_project.gpkg_file_path):
             q_project.add_project_to_qgis(new_project)
@@ -189,7 +222,8 @@ class SrappPlugin:
                 if not project_group:
                     G.Log.message(f'Temat "{name}" nie jest dodany do widoku warstw')
                     continue
-                project = Project(name, projects_dir)
+                packed_probe_units = m_gpkg.has_table(os.path.join(projects_dir, file), PROBE_SERIES_LAYER_STR)
+                project = Project(name, projects_dir, packed_probe_units=packed_probe_units)
                 layers = project_group.findLayers()
                 name_to_index = {l.name(): layers.index(l) for l in layers}
 
@@ -200,6 +234,7 @@ class SrappPlugin:
                         pass
 
                 q_project.set_project_layers(get_layer, project, IQgis(qgs))
+                q_project.upgrade_files(project)
 
                 projects.append(project)
         return projects
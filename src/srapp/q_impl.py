@@ -1,13 +1,14 @@
 import datetime
 from typing import *
 
-from PyQt5.QtCore import QVariant, QDateTime
+from PyQt5.QtCore import QVariant, QDateTime, QObject, Qt, QTimer, pyqtSignal
 from PyQt5.QtWidgets import QMessageBox
-from qgis._core import QgsFeature, QgsGeometry, QgsPointXY, QgsSpatialIndex, QgsMessageLog, QgsVectorLayer, \
+from qgis._core import QgsFeature, QgsGeometry, QgsPointXY, QgsMessageLog, QgsVectorLayer, \
     QgsExpression, QgsFeatureRequest
 
 import logger
 from database.data import IPointFeature, PointData
+from model.m_columns import Columns
 from model.m_layer import IMapLayer
 from srapp_model.database import data
 from srapp_model.database.data import FTR
@@ -46,21 +47,20 @@ class Feature(IFeature[QgsFeature]):
 class PointFeature(Feature, IPointFeature):
 
     def xy(self) -> Tuple[float, float]:
-        feature: QgsFeature = self.feature
-        geometry = feature.geometry()
-        if not geometry:
-            return 0, 0
-        p = geometry.asPoint()
-        x = p.x()
-        y = p.y()
-        return x, y
+        return _xy(self.feature)
 
     def set_geometry(self, x: float, y: float):
         self.feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
 
-    def set_spatial_index(self):
-        index = QgsSpatialIndex()
-        index.addFeature(self.feature)
+
+def _xy(feature: QgsFeature) -> Tuple[float, float]:
+    geometry = feature.geometry()
+    if not geometry:
+        return 0, 0
+    p = geometry.asPoint()
+    x = p.x()
+    y = p.y()
+    return x, y
 
 
 class Logger(ILogger):
@@ -74,16 +74,41 @@ class Logger(ILogger):
         QMessageBox.information(None, title, message)
 
 
+class _MainThreadInvoker(QObject):
+    invoked = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.invoked.connect(self._call, Qt.QueuedConnection)
+
+    @staticmethod
+    def _call(func: Callable[[], None]):
+        func()
+
+
 class Qgis(IQgis):
 
+    def __init__(self, iface):
+        super().__init__(iface)
+        # created on the main thread, so the queued signal is delivered there
+        self._invoker = _MainThreadInvoker()
+
     def try_refresh(self) -> bool:
         can_refresh = not self.iface.mapCanvas().isCachingEnabled()
         if can_refresh:
             self.iface.mapCanvas().refresh()
         return can_refresh
 
+    def run_on_main_thread(self, func: Callable[[], None]):
+        self._invoker.invoked.emit(func)
+
+    def call_later(self, seconds: float, func: Callable[[], None]):
+        # timers work only on threads with an event loop
+        self.run_on_main_thread(lambda: QTimer.singleShot(int(seconds * 1000), func))
+
 
 class MapLayer(IMapLayer[QgsVectorLayer]):
+    _has_geometry = False
 
     def get_wkid(self) -> int:
         authid = self.layer.crs().authid()
@@ -96,9 +121,28 @@ class MapLayer(IMapLayer[QgsVectorLayer]):
     def field_names(self):
         return self.layer.fields().names()
 
-    def features_by_fids(self, fids: List[int]):
-        all_features = self.all_features()
-        return [f for f in all_features if f.fid() in fids]
+    def features_by_fids(self, fids: List[int]) -> List[IFeature]:
+        request = QgsFeatureRequest().setFilterFids(fids)
+        raw_features = self.layer.dataProvider().getFeatures(request)
+        features = [self.wrap_raw_feature(f) for f in raw_features]
+        features.sort(key=lambda f: f.fid())
+        return features
+
+    def columns(self, fids: Optional[List[int]], names: Iterable[str]) -> Columns:
+        field_names = self.field_names()
+        positions = {name: field_names.index(name) for name in names if name in field_names}
+        request = QgsFeatureRequest()
+        if fids is not None:
+            request.setFilterFids(fids)
+        request.setSubsetOfAttributes(list(positions.values()))
+        if not self._has_geometry:
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+        raw_features = sorted(self.layer.dataProvider().getFeatures(request), key=lambda f: f.id())
+        filter_attr = Feature.filter_attr
+        rows = [raw.attributes() for raw in raw_features]
+        name_to_values = {name: [filter_attr(row[pos]) for row in rows] for name, pos in positions.items()}
+        xy = [_xy(raw) for raw in raw_features] if self._has_geometry else None
+        return Columns([raw.id() for raw in raw_features], name_to_values, xy)
 
     def stop_edit_mode(self):
         self.layer.commitChanges(True)
@@ -107,30 +151,23 @@ class MapLayer(IMapLayer[QgsVectorLayer]):
         return QDateTime(timestamp)
 
     def all_features(self) -> List[IFeature]:
-        return [Feature(feat) for feat in self.layer.dataProvider().getFeatures()]
-
-    def _add_feature(self, item):
-        feature = item.to_feature(self.wrap_raw_feature(QgsFeature()))
-        self.layer.dataProvider().addFeature(feature)
+        return [self.wrap_raw_feature(feat) for feat in self.layer.dataProvider().getFeatures()]
 
-    def _delete_features(self, fid: int):
-        self.layer.dataProvider().deleteFeatures([fid])
+    def _add_features(self, items) -> List[int]:
+        features = [item.to_feature(self.wrap_raw_feature(QgsFeature())) for item in items]
+        is_added, added_features = self.layer.dataProvider().addFeatures(features)
+        return [feat.id() for feat in added_features]
 
-    def delete_features_by_name(self, name: str):
-        layer_features = self.features_by_name(name)
-        if layer_features:
-            provider = self.layer.dataProvider()
-            provider.deleteFeatures([feat.fid() for feat in layer_features])
+    def _delete_features(self, fids: List[int]):
+        self.layer.dataProvider().deleteFeatures(fids)
 
-    def features_by_name(self, name: str) -> List[IFeature]:
-        expression = QgsExpression(f'"{data.NAME}"=\'{name}\'')
-        raw_features = self.layer.dataProvider().getFeatures(QgsFeatureRequest(expression))
-        features = [self.wrap_raw_feature(f) for f in raw_features]
-        return list(features) if features else []
+    def _scan_features_by_name(self, name: str) -> List[IFeature]:
+        expression = QgsExpression.createFieldEqualityExpression(data.NAME, name)
+        raw_features = self.layer.dataProvider().getFeatures(QgsFeatureRequest(QgsExpression(expression)))
+        return [self.wrap_raw_feature(f) for f in raw_features]
 
-    def refresh(self):
-        if not self.qgis.try_refresh():
-            self.layer.triggerRepaint()
+    def trigger_repaint(self):
+        self.layer.triggerRepaint()
 
     def change_attribute_values(self, attr_map: Dict[int, Dict[int, Any]]):
         self.layer.dataProvider().changeAttributeValues(attr_map)
@@ -160,14 +197,18 @@ class MapLayer(IMapLayer[QgsVectorLayer]):
 
 
 class PointsMapLayer(MapLayer):
+    _has_geometry = True
 
     def wrap_raw_feature(self, feature: FTR):
         return PointFeature(feature)
 
-    def change_geometry_values(self, feat_id: int, item: PointData):
-        x = item.x
-        y = item.y
-        if not (x and y):
-            return
-        geom = QgsGeometry.fromPointXY(QgsPointXY(x, y))
-        self.layer.dataProvider().changeGeometryValues({feat_id: geom})
+    def change_geometry_values(self, fid_to_item: Dict[int, PointData]):
+        geometry_map = dict()
+        for feat_id, item in fid_to_item.items():
+            x = item.x
+            y = item.y
+            if not (x and y):
+                continue
+            geometry_map[feat_id] = QgsGeometry.fromPointXY(QgsPointXY(x, y))
+        if geometry_map:
+            self.layer.dataProvider().changeGeometryValues(geometry_map)
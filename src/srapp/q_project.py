@@ -11,6 +11,7 @@ from qgis._core import (QgsVectorLayer, QgsField, QgsMessageLog, QgsVectorFileWr
 import model.m_config
 from database import data
 from model.m_config import LAYER_NAME_TO_FIELDS_CONSTRAINTS
+from model import m_gpkg
 from model.m_field import FieldConstraint
 from model.m_layer import IMapLayer
 from model.m_qgis import IQgis
@@ -44,6 +45,12 @@ class LayerFieldCreator(m_project.IFieldCreator):
 def create_files(project: Project):
     Path(project.dir).mkdir(parents=True, exist_ok=True)
     _create_layers(project)
+    if os.path.isfile(project.gpkg_file_path):
+        m_gpkg.initialize(project.gpkg_file_path)
+
+
+def upgrade_files(project: Project):
+    m_gpkg.upgrade(project.gpkg_file_path)
 
 
 def _create_layers(project: Project):
@@ -56,10 +63,15 @@ def _create_layers(project: Project):
     _create_layer(project, 'None', model.m_config.SET_WATER_LAYER_STR, m_project.set_water_fields(creator))
     _create_layer(project, 'None', model.m_config.EXUDATIONS_LAYER_STR, m_project.exudations_fields(creator))
     _create_layer(project, 'None', model.m_config.PROBES_LAYER_STR, m_project.probes_fields(creator))
-    _create_layer(project, 'None', model.m_config.PROBE_UNITS_LAYER_STR, m_project.probe_unit_fields(creator))
+    if project.packed_probe_units:
+        _create_layer(project, 'None', model.m_config.PROBE_SERIES_LAYER_STR, m_project.probe_series_fields(creator))
+    else:
+        _create_layer(project, 'None', model.m_config.PROBE_UNITS_LAYER_STR, m_project.probe_unit_fields(creator))
     _create_layer(project, 'None', model.m_config.PROBE_PERSONS_LAYER_STR, m_project.persons_fields(creator))
+    _create_layer(project, 'None', model.m_config.PROBE_ANALYSIS_LAYER_STR, m_project.probe_analysis_fields(creator))
     _create_layer(project, 'None', model.m_config.SHEARS_TODO_LAYER_STR, m_project.shears_todo_fields(creator))
     _create_layer(project, 'None', model.m_config.SHEAR_UNITS_LAYER_STR, m_project.shear_unit_fields(creator))
+    _create_layer(project, 'None', model.m_config.SHEAR_SUMMARY_LAYER_STR, m_project.shear_summary_fields(creator))
     _create_layer(project, 'Point', model.m_config.TEAMS_LAYER_STR, m_project.teams_fields(creator))
 
 
@@ -100,6 +112,8 @@ def add_project_to_qgis(project: Project):
         return _add_layer_to_qgis(project.gpkg_file_path, project_group, qgs, layer_name)
 
     set_project_layers(layer_supplier, project, IQgis(qgs))
+    if project.packed_probe_units:
+        _add_view_to_qgis(project.gpkg_file_path, project_group, qgs, model.m_config.PROBE_SERIES_VIEW_STR)
 
 
 def set_project_layers(layer_supplier: Callable[[str], QgsVectorLayer], project: Project, iqgis: IQgis):
@@ -169,3 +183,16 @@ def _add_layer_to_qgis(gpkg_file_path: str, group: QgsLayerTree, qgs: QgsProject
 
     QgsMessageLog.logMessage(f'Dodano warstwę "{layer_name}"', 'SRApp')
     return layer
+
+
+def _add_view_to_qgis(gpkg_file_path: str, group: QgsLayerTree, qgs: QgsProject, view_name: str):
+    """Views are only browsed, they are not layers of the project"""
+    layer_path = f'{gpkg_file_path}|layername={view_name}'
+    tmp_layer = QgsVectorLayer(layer_path, view_name, 'ogr')
+    if not tmp_layer.isValid():
+        QgsMessageLog.logMessage(f'Nieprawidłowy widok {view_name}', 'SRApp')
+        return
+    layer: QgsVectorLayer = qgs.addMapLayer(tmp_layer, False)
+    group.addLayer(layer)
+    layer.setReadOnly(True)
+    QgsMessageLog.logMessage(f'Dodano widok "{view_name}"', 'SRApp')
@@ -72,10 +72,6 @@ class IPointFeature(IFeature, ABC):
     def set_geometry(self, x: float, y: float):
         pass
 
-    @abc.abstractmethod
-    def set_spatial_index(self):
-        pass
-
     @abc.abstractmethod
     def xy(self) -> Tuple[float, float]:
         pass
@@ -86,6 +82,8 @@ DTTP = TypeVar('DTTP')
 
 @dataclasses.dataclass(frozen=True)
 class Data:
+    # no instance dictionaries for records of sub-items, subclasses declare slots of their fields
+    __slots__ = ()
 
     def attr_map(self, feat_id: int) -> Dict[int, dict]:
         attr = self.attrs()
@@ -115,8 +113,8 @@ class Data:
     def remote_time_to_local(r: DatetimeWithNanoseconds) -> str:
         if not r:
             return ''
-        r = r.replace(tzinfo=datetime.timezone.utc).astimezone(tz=None)
-        r = r.replace(microsecond=0)
+        # every replace of the database timestamp makes an instance of its subclass, so it is done once
+        r = r.replace(tzinfo=datetime.timezone.utc, microsecond=0).astimezone(tz=None)
         return str(r)
 
 
@@ -128,5 +126,4 @@ class PointData(Data, ABC):
     def to_feature(self, feature_wrapper: IPointFeature) -> FTR:
         super().to_feature(feature_wrapper)
         feature_wrapper.set_geometry(self.x, self.y)
-        feature_wrapper.set_spatial_index()
         return feature_wrapper.feature
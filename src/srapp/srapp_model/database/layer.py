@@ -43,6 +43,8 @@ LOCAL_TO_REMOTE: LocalToRemote[str, str] = LocalToRemote([
 
 @dataclasses.dataclass(frozen=True)
 class Layer(Data):
+    __slots__ = ('name', 'to', 'type', 'admixtures', 'interbeddings', 'color', 'moisture', 'rollsNumber',
+                 'soilState', 'sampling', 'desc')
     name: str
     to: float
     type: str
@@ -13,6 +13,7 @@ LOCAL_TO_REMOTE: LocalToRemote[str, str] = LocalToRemote([
 
 @dataclasses.dataclass(frozen=True)
 class Person(Data):
+    __slots__ = ('point_name', 'person_name')
     point_name: str
     person_name: str
 
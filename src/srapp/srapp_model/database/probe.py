@@ -1,4 +1,6 @@
 import dataclasses
+import json
+import math
 from typing import *
 
 from database import data, product_point, shear
@@ -19,6 +21,8 @@ UNITS_REMOTE = 'units'
 
 VALUE = 'wartosc'
 INDEX = 'indeks'
+# values of all units of the probe in one field of the packed series layer
+SERIES = 'wartosci'
 
 PROBE_TYPE = 'typ'
 INTERVAL = 'interwal'
@@ -53,8 +57,62 @@ def probe_unit_local_names() -> List[str]:
     ]
 
 
+def probe_series_local_names() -> List[str]:
+    return [
+        data.NAME,
+        SERIES
+    ]
+
+
+def pack_units(values: Iterable[Any]) -> str:
+    """JSON array of the values of the units, values which are written back unchanged are kept as numbers"""
+    return json.dumps([_packed_unit(value) for value in values], separators=(',', ':'))
+
+
+def unpack_units(series: Optional[str]) -> List[str]:
+    if not series:
+        return []
+    values = json.loads(series)
+    if type(values) is not list:
+        raise ValueError(f'Series of values is not an array: {series}')
+    return [_unpacked_unit(value) for value in values]
+
+
+def is_series(series: Any) -> bool:
+    try:
+        unpack_units(series)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _packed_unit(value: Any) -> Union[int, float, str, None]:
+    if value is None or value == '':
+        return None
+    text = str(value)
+    try:
+        number = int(text)
+    except ValueError:
+        try:
+            number = float(text)
+        except ValueError:
+            return text
+        if not math.isfinite(number):
+            return text
+    return number if _unpacked_unit(number) == text else text
+
+
+def _unpacked_unit(value: Union[int, float, str, None]) -> str:
+    if value is None:
+        return ''
+    if type(value) is float:
+        return repr(value)
+    return str(value)
+
+
 @dataclasses.dataclass(frozen=True)
 class ProbeUnit(Data):
+    __slots__ = ('name', 'index', 'value')
     name: str
     index: int
     value: str
@@ -66,6 +124,26 @@ class ProbeUnit(Data):
             self.value,
         ]
 
+    def fields_names(self) -> List[str]:
+        return probe_unit_local_names()
+
+
+@dataclasses.dataclass(frozen=True)
+class ProbeSeries(Data):
+    """All units of the probe in one feature, values are packed by `pack_units`"""
+    __slots__ = ('name', 'series')
+    name: str
+    series: str
+
+    def attrs(self) -> list:
+        return [
+            self.name,
+            self.series,
+        ]
+
+    def fields_names(self) -> List[str]:
+        return probe_series_local_names()
+
 
 @dataclasses.dataclass(frozen=True)
 class Probe(ProductPoint):
@@ -24,6 +24,7 @@ def shear_unit_local_names() -> List[str]:
 
 @dataclasses.dataclass(frozen=True)
 class ShearUnit(Data):
+    __slots__ = ('name', 'depth', 'index', 'torque')
     name: str
     depth: float
     index: int
@@ -37,6 +38,9 @@ class ShearUnit(Data):
             self.torque,
         ]
 
+    def fields_names(self) -> List[str]:
+        return shear_unit_local_names()
+
 
 SHEAR_TODO_LOCAL_TO_REMOTE: LocalToRemote[str, str] = LocalToRemote([
     (data.NAME, data.NAME_REMOTE),
@@ -46,6 +50,7 @@ SHEAR_TODO_LOCAL_TO_REMOTE: LocalToRemote[str, str] = LocalToRemote([
 
 @dataclasses.dataclass(frozen=True)
 class TodoShear(Data):
+    __slots__ = ('name', 'depth')
     name: str
     depth: float
 
@@ -37,3 +37,6 @@ class TeamPoint(PointData):
             self.timestamp,
             self.name,
         ]
+
+    def fields_names(self) -> List[str]:
+        return team_local_names()
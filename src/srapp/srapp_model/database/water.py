@@ -22,6 +22,7 @@ DRILLED_WATER_LOCAL_TO_REMOTE: LocalToRemote[str, str] = LocalToRemote([
 
 @dataclasses.dataclass(frozen=True)
 class DrilledWaterHorizon(Data):
+    __slots__ = ('name', 'horizon', 'depth', 'time')
     name: str
     horizon: str
     depth: float
@@ -57,8 +58,19 @@ SET_WATER_LOCAL_TO_REMOTE: LocalToRemote[str, str] = LocalToRemote([
 ])
 
 
+def measurement_period_minutes(doc_map: dict) -> int:
+    measurement_period: dict = doc_map.get('measurementPeriod')
+    if not measurement_period:
+        return 0
+    days = measurement_period.get('days', 0)
+    hours = measurement_period.get('hours', 0)
+    minutes = measurement_period.get('minutes', 0)
+    return days * 24 * 60 + hours * 60 + minutes
+
+
 @dataclasses.dataclass(frozen=True)
 class SetWaterHorizon(Data):
+    __slots__ = ('name', 'horizon', 'depth', 'time', 'measurement_period_min')
     name: str
     horizon: str
     depth: float
@@ -70,13 +82,7 @@ class SetWaterHorizon(Data):
 
     @staticmethod
     def from_dict(point_name, doc_map: {}) -> 'SetWaterHorizon':
-        all_minutes = 0
-        measurement_period: dict = doc_map.get('measurementPeriod')
-        if measurement_period:
-            days = measurement_period.get('days', 0)
-            hours = measurement_period.get('hours', 0)
-            minutes = measurement_period.get('minutes', 0)
-            all_minutes = days * 24 * 60 + hours * 60 + minutes
+        all_minutes = measurement_period_minutes(doc_map)
         local = Data.remote_time_to_local(doc_map.get(TIME_REMOTE))
         return SetWaterHorizon(
             point_name,
@@ -108,6 +114,7 @@ EXUDATION_LOCAL_TO_REMOTE: LocalToRemote[str, str] = LocalToRemote([
 
 @dataclasses.dataclass(frozen=True)
 class Exudation(Data):
+    __slots__ = ('name', 'type', 'depth', 'time')
     name: str
     type: str
     depth: float
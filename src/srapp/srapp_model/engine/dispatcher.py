@@ -0,0 +1,128 @@
+import dataclasses
+import datetime
+import threading
+import time
+import traceback
+from typing import *
+
+from google.cloud.firestore_v1.watch import ChangeType
+
+from model.m_qgis import IQgis
+from srapp_model import G
+
+# documents waiting for the main thread, watch threads wait when there are more
+MAX_PENDING = 10000
+
+ApplyChanges = Callable[[List['QueuedChange'], Optional[datetime.datetime]], None]
+
+
+@dataclasses.dataclass(frozen=True)
+class QueuedChange:
+    type: ChangeType
+    doc_id: str
+    doc_map: dict
+    # time.perf_counter() of the first change of the document merged into this one
+    queued_at: float
+
+
+@dataclasses.dataclass(frozen=True)
+class DispatcherMetrics:
+    depth: int
+    max_depth: int
+    applied: int
+    merged: int
+    mean_latency: float
+    max_latency: float
+
+
+class _Batch:
+    def __init__(self, apply: ApplyChanges):
+        self.apply = apply
+        self.changes: OrderedDict[str, QueuedChange] = OrderedDict()
+        self.read_time: Optional[datetime.datetime] = None
+
+
+class Dispatcher:
+    """Passes remote changes from the watch threads to the main thread.
+
+    Changes are applied in batches, one per event loop iteration. A later change of a document waiting in the queue
+    replaces the earlier one.
+    """
+
+    def __init__(self, qgis: IQgis, max_pending: int = MAX_PENDING):
+        self._qgis = qgis
+        self._max_pending = max_pending
+        self._batches: OrderedDict[Hashable, _Batch] = OrderedDict()
+        self._depth = 0
+        self._is_scheduled = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._max_depth = 0
+        self._applied = 0
+        self._merged = 0
+        self._latency_sum = 0.0
+        self._max_latency = 0.0
+
+    def put(self, key: Hashable, apply: ApplyChanges, changes: List[QueuedChange],
+            read_time: datetime.datetime = None):
+        """Queues changes of a collection identified by the key, waits when the queue is full"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._depth < self._max_pending or self._closed)
+            if self._closed:
+                return
+            batch = self._batches.get(key)
+            if not batch:
+                batch = self._batches[key] = _Batch(apply)
+            for change in changes:
+                earlier = batch.changes.pop(change.doc_id, None)
+                if earlier:
+                    self._merged += 1
+                    change = dataclasses.replace(change, queued_at=earlier.queued_at)
+                else:
+                    self._depth += 1
+                batch.changes[change.doc_id] = change
+            if read_time and (not batch.read_time or read_time > batch.read_time):
+                batch.read_time = read_time
+            self._max_depth = max(self._max_depth, self._depth)
+            is_scheduled = self._is_scheduled
+            self._is_scheduled = True
+        if not is_scheduled:
+            self._qgis.run_on_main_thread(self._apply_batches)
+
+    def metrics(self) -> DispatcherMetrics:
+        with self._condition:
+            mean_latency = self._latency_sum / self._applied if self._applied else 0.0
+            return DispatcherMetrics(self._depth, self._max_depth, self._applied, self._merged, mean_latency,
+                                     self._max_latency)
+
+    def close(self):
+        """Drops waiting changes, they are not marked as applied and come again with the next synchronization"""
+        with self._condition:
+            self._closed = True
+            self._batches.clear()
+            self._depth = 0
+            self._condition.notify_all()
+
+    def _apply_batches(self):
+        with self._condition:
+            batches = self._batches
+            self._batches = OrderedDict()
+            self._depth = 0
+            self._is_scheduled = False
+            self._condition.notify_all()
+        for batch in batches.values():
+            changes = list(batch.changes.values())
+            try:
+                batch.apply(changes, batch.read_time)
+            except Exception:
+                G.Log.error(f'{traceback.format_exc()}')
+            self._measure(changes)
+
+    def _measure(self, changes: List[QueuedChange]):
+        now = time.perf_counter()
+        with self._condition:
+            for change in changes:
+                latency = now - change.queued_at
+                self._latency_sum += latency
+                self._max_latency = max(self._max_latency, latency)
+            self._applied += len(changes)
@@ -0,0 +1,44 @@
+import datetime
+import hashlib
+import json
+from typing import *
+
+from database import data
+
+# hash of every value of the document by its path, e.g. 'probe.units'
+Fingerprint = Dict[str, int]
+
+
+def document_fingerprint(doc_map: dict, with_time: bool = False) -> Fingerprint:
+    """Fingerprint of the document content, equal for documents differing only in the timestamp.
+
+    The timestamp is kept `with_time`, for documents where it is content rather than the time of the last write.
+    """
+    fingerprint = leaves_fingerprint(doc_map)
+    if not with_time:
+        fingerprint.pop(data.TIME_REMOTE, None)
+    return fingerprint
+
+
+def leaves_fingerprint(doc_map: dict, prefix: str = '') -> Fingerprint:
+    fingerprint = dict()
+    for key, value in doc_map.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            # nested maps are updated by fields like in the database, lists are replaced as a whole
+            fingerprint.update(leaves_fingerprint(value, f'{path}.'))
+        else:
+            fingerprint[path] = _hash(value)
+    return fingerprint
+
+
+def _hash(value: Any) -> int:
+    encoded = json.dumps(value, sort_keys=True, default=_encode).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), 'big')
+
+
+def _encode(value: Any) -> str:
+    if isinstance(value, datetime.datetime):
+        # the database returns written local times in UTC
+        return value.astimezone(datetime.timezone.utc).isoformat()
+    return repr(value)
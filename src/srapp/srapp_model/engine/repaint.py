@@ -0,0 +1,51 @@
+import threading
+import time
+from typing import *
+
+from model.m_layer import IMapLayer
+from model.m_qgis import IQgis
+
+# seconds between repaints of the map
+REPAINT_INTERVAL = 0.25
+
+
+class RepaintScheduler:
+    """Repaints layers marked as changed at most once per interval.
+
+    The whole map canvas is refreshed if it can be, otherwise only the changed layers are repainted.
+    """
+
+    def __init__(self, qgis: IQgis, interval: float = REPAINT_INTERVAL, clock: Callable[[], float] = time.monotonic):
+        self._qgis = qgis
+        self._interval = interval
+        self._clock = clock
+        self._dirty: Dict[int, IMapLayer] = {}
+        self._is_scheduled = False
+        self._last_repaint: Optional[float] = None
+        self._lock = threading.Lock()
+        self.repaints = 0
+
+    def request(self, layer: IMapLayer):
+        with self._lock:
+            self._dirty[id(layer)] = layer
+            if self._is_scheduled:
+                return
+            self._is_scheduled = True
+            delay = 0.0
+            if self._last_repaint is not None:
+                delay = max(0.0, self._last_repaint + self._interval - self._clock())
+        self._qgis.call_later(delay, self._repaint)
+
+    def _repaint(self):
+        with self._lock:
+            layers = list(self._dirty.values())
+            self._dirty.clear()
+            self._is_scheduled = False
+            self._last_repaint = self._clock()
+        if not layers:
+            return
+        self.repaints += 1
+        if self._qgis.try_refresh():
+            return
+        for layer in layers:
+            layer.trigger_repaint()
@@ -1,27 +1,37 @@
 import abc
+import datetime
+import os
 import threading
+import time
 import traceback
+from contextlib import closing
 from typing import *
 
 from google.cloud.firestore_v1.base_document import DocumentSnapshot
 from google.cloud.firestore_v1.watch import ChangeType, Watch
 
+from database import team
 from database.data import Data, IFeature
 from database.person import Person
 from database.team import TeamPoint
+from engine import fingerprint
+from engine.dispatcher import Dispatcher, DispatcherMetrics, QueuedChange
+from engine.fingerprint import Fingerprint
+from engine.repaint import RepaintScheduler
+from model import m_assignment, m_gpkg, m_shears
+from model.m_analysis import ProbeAnalyzer, ProbeMeasurement
 from model.m_layer import IListener, IMapLayer
 from model.m_qgis import IQgis
+from model.m_schema import ItemRow
 from model.m_user import User
 from remote import remote_update
+from remote.outbox import Outbox
+from remote.outbox_store import OutboxStore
+from remote.remote_update import DocumentWrite, DATABASE_TAG
 from srapp_model import G
-from srapp_model.database import data
-from srapp_model.database.borehole import BoreholeProduct
-from srapp_model.database.layer import Layer
-from srapp_model.database.point import Point
-from srapp_model.database.probe import ProbeProduct
-from srapp_model.database.shear import ShearUnit
-from srapp_model.database.water import DrilledWaterHorizon, SetWaterHorizon, Exudation
-from srapp_model.model.m_project import Project
+from srapp_model.database import data, point, probe, product_point
+from srapp_model.model import m_project
+from srapp_model.model.m_project import Project, PointRows, BoreholeRows, ProbeRows
 
 
 class ListenerWatch(IListener[Watch]):
@@ -31,7 +41,15 @@ class ListenerWatch(IListener[Watch]):
         self.obj.unsubscribe()
 
 
-local_database_lock = threading.Lock()
+# seconds to wait for sending pending writes when synchronization is turned off
+FLUSH_TIMEOUT = 30
+# documents are listened from the latest applied timestamp less the margin for clocks of the devices
+RESUME_MARGIN = datetime.timedelta(days=1)
+RESUME_MARK_KEY = 'resume_mark'
+# seconds between writes of the advanced resume marks to the GeoPackage
+RESUME_MARK_FLUSH_INTERVAL = 5.0
+# expected fingerprints kept for a document, older ones are dropped when its writes never come back unchanged
+MAX_EXPECTED_ECHOES = 16
 
 
 class Synchronizer:
@@ -43,14 +61,34 @@ class Synchronizer:
             for layer in p.layers:
                 layer.set_editable(True)
         self._listeners: List[IListener] = []
+        self._outboxes: Dict[str, Outbox] = {}
+        # fingerprints of the last applied documents of a collection by document ids
+        self._applied: Dict[Tuple[str, str], Dict[str, Fingerprint]] = {}
+        # fingerprints of documents after the writes sent by the plugin, None for deletions
+        self._expected: Dict[Tuple[str, str], Dict[str, List[Optional[Fingerprint]]]] = {}
+        self._expected_lock = threading.Lock()
+        self._suppressed_echoes = 0
+        # latest timestamps of applied documents of a collection
+        self._resume_marks: Dict[Tuple[str, str], datetime.datetime] = {}
+        # marks advanced since they were written, by collections
+        self._unsaved_marks: Dict[Tuple[str, str], Tuple[Project, datetime.datetime]] = {}
+        self._is_marks_flush_scheduled = False
+        self._marks_lock = threading.Lock()
+        self._incremental: Set[Tuple[str, str]] = set()
+        self._dispatcher: Optional[Dispatcher] = None
+        self._repaint_scheduler = RepaintScheduler(qgis)
+        # analyses of probes of a project shared by remote snapshots and local edits
+        self._analyzers: Dict[str, ProbeAnalyzer] = {}
 
     def synchronize(self):
+        self._dispatcher = Dispatcher(self.qgis)
         for project in self.projects:
+            self._outboxes[project.name] = self._make_outbox(project)
             # todo not resetting means leaving the data that not exists in remote
             # project.reset()
             for layer in project.layers:
-                features = layer.all_features()
-                layer.fid_to_name.update({f.fid(): f.name() for f in features})
+                layer.index_features(layer.all_features())
+                layer.repaint_scheduler = self._repaint_scheduler
             self._listen_to_remote(project)
 
     def desynchronize(self):
@@ -59,9 +97,113 @@ class Synchronizer:
                 if layer:
                     layer.stop_edit_mode()
                     layer.set_editable(False)
+                    layer.repaint_scheduler = None
         for listener in self._listeners:
             listener.stop()
         self._listeners.clear()
+        if self._dispatcher:
+            self._dispatcher.close()
+        for project_name, outbox in self._outboxes.items():
+            if outbox.close(FLUSH_TIMEOUT):
+                continue
+            if outbox.is_persistent:
+                G.Log.information(f'Nie wysłano do bazy danych {outbox.pending_count} zmian w temacie "{project_name}". '
+                                  f'Zmiany zostaną wysłane przy następnej synchronizacji')
+            else:
+                G.Log.information(f'Nie wysłano do bazy danych {outbox.pending_count} zmian w temacie "{project_name}"')
+        self._outboxes.clear()
+        self._applied.clear()
+        self._flush_resume_marks()
+        self._resume_marks.clear()
+        self._incremental.clear()
+        with self._expected_lock:
+            self._expected.clear()
+
+    def _make_outbox(self, project: Project) -> Outbox:
+        store = None
+        if os.path.isfile(project.gpkg_file_path):
+            store = OutboxStore(project.gpkg_file_path)
+        return Outbox(self.user, project.name, store)
+
+    def pending_writes_count(self) -> int:
+        return sum(outbox.pending_count for outbox in self._outboxes.values())
+
+    def flush(self, timeout: float = None) -> bool:
+        return all([outbox.flush(timeout) for outbox in self._outboxes.values()])
+
+    def dispatcher_metrics(self) -> DispatcherMetrics:
+        """Depth of the queue of remote changes and times from receiving to applying them"""
+        return self._dispatcher.metrics()
+
+    def suppressed_echoes_count(self) -> int:
+        """Number of remote changes recognized as the plugin's own writes and not applied again"""
+        return self._suppressed_echoes
+
+    def expected_echoes_count(self) -> int:
+        """Number of states of documents after the plugin's writes still waiting for their echoes"""
+        with self._expected_lock:
+            return sum(len(doc_expected) for expected in self._expected.values() for doc_expected in expected.values())
+
+    def assign_work(self, project: Project) -> Dict[str, str]:
+        """Assigns unassigned points to do to the teams and sends the performers like local edits"""
+        layer = project.points_layer
+        if not (layer and project.teams_layer):
+            return {}
+        tasks = m_assignment.todo_tasks(layer.columns(None, m_assignment.POINT_FIELDS))
+        teams = m_assignment.team_positions(project.teams_layer.columns(None, [data.NAME]))
+        name_to_performer = m_assignment.assign(tasks, teams)
+        if name_to_performer:
+            layer.change_values_by_names({name: {point.ASSIGNED_PERFORMER: performer}
+                                          for name, performer in name_to_performer.items()})
+            project, project_ref = self.project_ref(layer)
+            self._send(layer, remote_update.items_modify_writes(project_ref, set(name_to_performer), layer))
+            layer.refresh()
+        return name_to_performer
+
+    def _send(self, layer: IMapLayer, writes: List[DocumentWrite]):
+        self._expect_echoes(layer, writes)
+        self._outboxes[layer.project.name].put(writes)
+
+    def _expect_echoes(self, layer: IMapLayer, writes: List[DocumentWrite]):
+        collection = _collection_key(layer)
+        applied = self._applied.get(collection, {})
+        with self._expected_lock:
+            expected = self._expected.setdefault(collection, {})
+            for write in writes:
+                doc_id = write.path.split('/')[-1]
+                doc_expected = expected.setdefault(doc_id, [])
+                written = None
+                if not write.is_delete():
+                    written = fingerprint.document_fingerprint(write.data, layer.time_is_content)
+                if written is not None and write.merge:
+                    # the document is the last state known to the plugin updated by the written values
+                    earlier = doc_expected[-1] if doc_expected else applied.get(doc_id)
+                    written = {**(earlier or {}), **written}
+                doc_expected.append(written)
+                del doc_expected[:-MAX_EXPECTED_ECHOES]
+
+    def _is_echo(self, collection: Tuple[str, str], doc_id: str, doc_fingerprint: Optional[Fingerprint]) -> bool:
+        with self._expected_lock:
+            doc_expected = self._expected.get(collection, {}).get(doc_id)
+            if not doc_expected or doc_fingerprint not in doc_expected:
+                return False
+            # earlier states of the document were overwritten by the matching write
+            del doc_expected[:doc_expected.index(doc_fingerprint) + 1]
+            if not doc_expected:
+                del self._expected[collection][doc_id]
+            self._suppressed_echoes += 1
+            return True
+
+    def _forget_echoes(self, collection: Tuple[str, str], doc_id: str):
+        """The applied document of other writes replaced the states expected after the writes of the plugin"""
+        with self._expected_lock:
+            self._expected.get(collection, {}).pop(doc_id, None)
+
+    def _on_connection_alive(self, project: Project):
+        # incoming snapshot means the database is reachable again
+        outbox = self._outboxes.get(project.name)
+        if outbox:
+            outbox.retry_now()
 
     def _listen_to_remote(self, project: Project):
         map_points_ref = self.user.map_points_ref(project.name)
@@ -71,18 +213,22 @@ class Synchronizer:
         crs_ref = self.user.crs_ref(project.name)
         try:
             if project.points_layer:
+                map_points_ref = self._changes_query(project.points_layer, map_points_ref)
                 self._listeners.append(self._listen_points_changes(map_points_ref, project))
                 self._listen_to_layer_changes(project.points_layer)
                 wkid = project.points_layer.get_wkid()
                 if wkid:
                     crs_ref.set({'wkid': wkid}, True)
             if project.boreholes_layer:
+                boreholes_ref = self._changes_query(project.boreholes_layer, boreholes_ref)
                 self._listeners.append(self._listen_boreholes_changes(boreholes_ref, project))
                 self._listen_to_layer_changes(project.boreholes_layer)
             if project.probes_layer:
+                probes_ref = self._changes_query(project.probes_layer, probes_ref)
                 self._listeners.append(self._listen_probes_changes(probes_ref, project))
                 self._listen_to_layer_changes(project.probes_layer)
             if project.teams_layer:
+                teams_ref = self._changes_query(project.teams_layer, teams_ref)
                 self._listeners.append(self._listen_team_changes(teams_ref, project))
                 self._listen_to_layer_changes(project.teams_layer)
 
@@ -94,11 +240,60 @@ class Synchronizer:
             self._listen_to_sublayer_changes(project.exudations_layer)
             self._listen_to_sublayer_changes(project.probe_persons_layer)
             self._listen_to_sublayer_changes(project.probe_units_layer)
+            self._listen_to_sublayer_changes(project.probe_series_layer)
             self._listen_to_sublayer_changes(project.shear_units_layer)
         except Exception as e:
             self.desynchronize()
             raise e
 
+    def _changes_query(self, layer: IMapLayer, collection_ref):
+        """Documents changed since the previous synchronization, the whole collection the first time"""
+        collection = _collection_key(layer)
+        mark = self._load_resume_mark(layer.project, collection)
+        if not mark:
+            return collection_ref
+        self._resume_marks[collection] = mark
+        self._incremental.add(collection)
+        since = mark - RESUME_MARGIN
+        G.Log.message(f'{layer.name}: pobieranie zmian od {Data.remote_time_to_local(since)}', DATABASE_TAG)
+        return collection_ref.where(data.TIME_REMOTE, '>', since)
+
+    def _load_resume_mark(self, project: Project, collection: Tuple[str, str]) -> Optional[datetime.datetime]:
+        if not os.path.isfile(project.gpkg_file_path):
+            return None
+        with closing(m_gpkg.connect(project.gpkg_file_path)) as conn, conn:
+            mark = m_gpkg.get_meta(conn, _resume_mark_key(collection))
+        return datetime.datetime.fromisoformat(mark) if mark else None
+
+    def _advance_resume_mark(self, project: Project, collection: Tuple[str, str], latest: datetime.datetime):
+        """The mark is kept in memory, marks advanced by many snapshots are written together later"""
+        with self._marks_lock:
+            mark = self._resume_marks.get(collection)
+            if mark and mark >= latest:
+                return
+            self._resume_marks[collection] = latest
+            self._unsaved_marks[collection] = (project, latest)
+            if self._is_marks_flush_scheduled:
+                return
+            self._is_marks_flush_scheduled = True
+        self.qgis.call_later(RESUME_MARK_FLUSH_INTERVAL, self._flush_resume_marks)
+
+    def _flush_resume_marks(self):
+        """Writes the unsaved marks with one connection to the GeoPackage of every project"""
+        with self._marks_lock:
+            unsaved = list(self._unsaved_marks.items())
+            self._unsaved_marks.clear()
+            self._is_marks_flush_scheduled = False
+        path_to_marks: Dict[str, List[Tuple[Tuple[str, str], datetime.datetime]]] = {}
+        for collection, (project, mark) in unsaved:
+            path_to_marks.setdefault(project.gpkg_file_path, []).append((collection, mark))
+        for gpkg_file_path, marks in path_to_marks.items():
+            if not os.path.isfile(gpkg_file_path):
+                continue
+            with closing(m_gpkg.connect(gpkg_file_path)) as conn, conn:
+                for collection, mark in marks:
+                    m_gpkg.set_meta(conn, _resume_mark_key(collection), mark.isoformat())
+
     def _listen_to_layer_changes(self, layer: IMapLayer):
         if not layer:
             return
@@ -122,9 +317,9 @@ class Synchronizer:
         if not layer:
             pass
         project, project_ref = self.project_ref(layer)
-        layer.fid_to_name.update({f.fid(): f.name() for f in features})
         names = {f.name() for f in features}
-        remote_update.on_items_modify(project_ref, names, layer)
+        self._send(layer, remote_update.items_modify_writes(project_ref, names, layer))
+        self._analyse_probes(layer, names)
 
     def _on_items_deleted(self, layer: IMapLayer, deleted_features_fids: List[int]):
         if not layer:
@@ -132,47 +327,107 @@ class Synchronizer:
         project, project_ref = self.project_ref(layer)
         collection_ref = project_ref.collection(layer.database_ref_path)
         names = {layer.fid_to_name.get(fid) for fid in deleted_features_fids}
-        remote_update.on_items_deleted(collection_ref, names, layer.name)
+        self._send(layer, remote_update.items_deleted_writes(collection_ref, names, layer.name))
+        self._analyse_probes(layer, names)
 
     def _on_items_changed(self, layer: IMapLayer, features: List[IFeature]):
         if not layer:
             pass
         project, project_ref = self.project_ref(layer)
         names = {f.name() for f in features}
-        remote_update.on_items_modify(project_ref, names, layer)
+        self._send(layer, remote_update.items_modify_writes(project_ref, names, layer))
+        self._analyse_probes(layer, names)
 
     def _on_subitems_added(self, layer: IMapLayer, features: List[IFeature]):
         if not layer:
             pass
         project, project_ref = self.project_ref(layer)
         names = {feat.name() for feat in features}
-        layer.fid_to_name.update({f.fid(): f.name() for f in features})
-        remote_update.on_subitems_modify(project_ref, names, layer)
+        self._send(layer, remote_update.subitems_modify_writes(project_ref, names, layer))
+        self._summarize_shears(layer, names)
+        self._analyse_probes(layer, names)
 
     def _on_subitems_deleted(self, layer: IMapLayer, deleted_features_fids: List[int]):
         if not layer:
             pass
         project, project_ref = self.project_ref(layer)
         names = {layer.fid_to_name.get(fid) for fid in deleted_features_fids}
-        remote_update.on_subitems_modify(project_ref, names, layer)
+        self._send(layer, remote_update.subitems_modify_writes(project_ref, names, layer))
+        self._summarize_shears(layer, names)
+        self._analyse_probes(layer, names)
 
     def _on_subitems_changed(self, layer: IMapLayer, features: List[IFeature]):
         if not layer:
             pass
         project, project_ref = self.project_ref(layer)
         names = {f.name() for f in features}
-        remote_update.on_subitems_modify(project_ref, names, layer)
+        self._send(layer, remote_update.subitems_modify_writes(project_ref, names, layer))
+        self._summarize_shears(layer, names)
+        self._analyse_probes(layer, names)
+
+    def _summarize_shears(self, layer: IMapLayer, names: Set[str]):
+        """Summaries of shears of the points committed locally, echoes of the writes are not applied"""
+        project: Project = layer.project
+        summary_layer = project.shear_summary_layer
+        if layer is not project.shear_units_layer or not summary_layer:
+            return
+        names = [name for name in names if name]
+        name_to_columns = layer.columns_by_names(names, m_shears.SHEAR_UNIT_FIELDS)
+        name_to_summaries: Dict[str, List[Data]] = {}
+        for name in names:
+            columns = name_to_columns.get(name)
+            name_to_summaries[name] = m_shears.summaries(m_shears.groups_of_columns(columns)) if columns else []
+        summary_layer.apply_features(name_to_summaries)
+        summary_layer.refresh()
+
+    def _analyse_probes(self, layer: IMapLayer, names: Set[str]):
+        """Analyses of the probes committed locally, from their units or series and their interval and start depth;
+        echoes of the writes are not applied"""
+        project: Project = layer.project
+        analysis_layer = project.probe_analysis_layer
+        probes_layer = project.probes_layer
+        units_layer = project.probe_series_layer or project.probe_units_layer
+        if not (analysis_layer and probes_layer) or layer not in (probes_layer, units_layer):
+            return
+        names = [name for name in names if name]
+        name_to_probe = probes_layer.columns_by_names(names, [probe.INTERVAL, product_point.START_DEPTH])
+        name_to_units = dict()
+        if units_layer is project.probe_series_layer:
+            name_to_units = {name: probe.unpack_units(columns.column(probe.SERIES)[0])
+                             for name, columns in units_layer.columns_by_names(names, [probe.SERIES]).items()}
+        elif units_layer:
+            for name, columns in units_layer.columns_by_names(names, [probe.INDEX, probe.VALUE]).items():
+                indexes = columns.column(probe.INDEX)
+                columns = columns.sorted_by(lambda row: int(indexes[row] or 0))
+                name_to_units[name] = columns.column(probe.VALUE)
+        analyzer = self._analyzers.setdefault(project.name, ProbeAnalyzer())
+        name_to_analyses: Dict[str, List[Data]] = {}
+        measurements = []
+        for name in names:
+            probe_columns = name_to_probe.get(name)
+            if not probe_columns:
+                analyzer.forget(name)
+                name_to_analyses[name] = []
+                continue
+            measurements.append(ProbeMeasurement.of(name, name_to_units.get(name),
+                                                    probe_columns.column(probe.INTERVAL)[0],
+                                                    probe_columns.column(product_point.START_DEPTH)[0]))
+        for analysis in analyzer.analyse(measurements):
+            name_to_analyses[analysis.name] = [analysis]
+        analysis_layer.apply_features(name_to_analyses)
+        analysis_layer.refresh()
 
     def _listen_points_changes(self, map_points_ref, project: Project) -> ListenerWatch:
         points_layer = project.points_layer
         shears_layer = project.shears_todo_layer
 
         def on_map_points(change_type, doc_map: dict):
-            point: Point = Point.from_dict(doc_map)
-            if not point:
+            rows: PointRows = m_project.decode_point(doc_map)
+            if not rows:
                 return
-            shears: [] = point.shears_todo
-            point_name = point.fields.get(data.NAME)
+            point = rows.point
+            shears: [] = rows.shears_todo
+            point_name = rows.name
 
             if change_type == ChangeType.REMOVED:
                 if points_layer:
@@ -186,8 +441,8 @@ class Synchronizer:
                     shears_layer.add_features(shears, point_name)
 
         def on_map_points_snapshot(doc_snapshot, changes, read_time):
-            self._on_iteration(points_layer, 'punkty', on_map_points, changes)
-            points_layer.refresh()
+            self._on_snapshot(points_layer, 'punkty', on_map_points, changes, read_time,
+                              on_applied=points_layer.refresh)
 
         return ListenerWatch(map_points_ref.on_snapshot(on_map_points_snapshot))
 
@@ -201,15 +456,16 @@ class Synchronizer:
         additional_layers = [persons_layer, layers_layer, drilled_water_layer, set_water_layer, exudations_layer]
 
         def on_boreholes(change_type, doc_map: dict):
-            bp: BoreholeProduct = BoreholeProduct.from_dict(doc_map)
-            persons: List[Person] = bp.borehole.persons
-            layers: List[Layer] = bp.layers
-            drilled_water_list: List[DrilledWaterHorizon] = bp.drilledWaterHorizons
-            set_water_list: List[SetWaterHorizon] = bp.setWaterHorizons
-            exudations: List[Exudation] = bp.exudations
+            rows: BoreholeRows = m_project.decode_borehole(doc_map)
+            bp = rows.borehole
+            persons: List[Person] = rows.persons
+            layers: List[ItemRow] = rows.layers
+            drilled_water_list: List[ItemRow] = rows.drilled_water_horizons
+            set_water_list: List[ItemRow] = rows.set_water_horizons
+            exudations: List[ItemRow] = rows.exudations
             additional_lists = [persons, layers, drilled_water_list, set_water_list, exudations]
             additional = zip(additional_layers, additional_lists)
-            point_name = bp.name
+            point_name = rows.name
 
             if change_type == ChangeType.REMOVED:
                 boreholes_layer.delete_features_by_name(point_name)
@@ -223,27 +479,42 @@ class Synchronizer:
                         add[0].add_features(add[1], point_name)
 
         def on_boreholes_snapshot(doc_snapshot, changes, read_time):
-            return self._on_iteration(boreholes_layer, 'wiercenia', on_boreholes, changes)
+            self._on_snapshot(boreholes_layer, 'wiercenia', on_boreholes, changes, read_time)
 
         return ListenerWatch(boreholes_ref.on_snapshot(on_boreholes_snapshot))
 
     def _listen_probes_changes(self, probes_ref, p: Project) -> ListenerWatch:
         probes_layer = p.probes_layer
         probe_units_layer = p.probe_units_layer
+        probe_series_layer = p.probe_series_layer
+        analysis_layer = p.probe_analysis_layer
+        analyzer = self._analyzers[p.name] = ProbeAnalyzer()
+        # probes of the snapshot analysed together, None for removed probes; used on the main thread
+        name_to_measurement: Dict[str, Optional[ProbeMeasurement]] = {}
+        shear_summary_layer = p.shear_summary_layer
+        # summaries of shears of the snapshot applied together, used on the main thread
+        name_to_shear_summaries: Dict[str, List[Data]] = {}
         shears_layer = p.shear_units_layer
         persons_layer = p.probe_persons_layer
 
         def on_probes(change_type, doc_map: dict):
-            pp: ProbeProduct = ProbeProduct.from_dict(doc_map)
-            persons: List[Person] = pp.probe.persons
-            shears: List[ShearUnit] = pp.shears
-            point_name = pp.name
+            rows: ProbeRows = m_project.decode_probe(doc_map, packed_units=probe_series_layer is not None)
+            pp = rows.probe
+            persons: List[Person] = rows.persons
+            shears: List[ItemRow] = rows.shears
+            point_name = rows.name
 
             if change_type == ChangeType.REMOVED:
                 if probes_layer:
                     probes_layer.delete_features_by_name(point_name)
                 if probe_units_layer:
                     probe_units_layer.delete_features_by_name(point_name)
+                if probe_series_layer:
+                    probe_series_layer.delete_features_by_name(point_name)
+                if analysis_layer:
+                    name_to_measurement[point_name] = None
+                if shear_summary_layer:
+                    name_to_shear_summaries[point_name] = []
                 if shears_layer:
                     shears_layer.delete_features_by_name(point_name)
                 if persons_layer:
@@ -252,59 +523,171 @@ class Synchronizer:
                 if probes_layer:
                     probes_layer.add_feature(pp, point_name)
                 if probe_units_layer:
-                    probe_units_layer.add_features(pp.probe.units, point_name)
+                    probe_units_layer.add_features(rows.units, point_name)
+                if probe_series_layer:
+                    probe_series_layer.add_features([rows.series], point_name)
+                if analysis_layer:
+                    name_to_measurement[point_name] = ProbeMeasurement.from_dict(doc_map)
+                if shear_summary_layer:
+                    name_to_shear_summaries[point_name] = m_shears.summaries(m_shears.groups_of_units(shears))
                 if shears_layer:
                     shears_layer.add_features(shears, point_name)
                 if persons_layer:
                     persons_layer.add_features(persons, point_name)
 
+        def apply_analyses():
+            if not name_to_measurement:
+                return
+            name_to_analyses: Dict[str, List[Data]] = {}
+            for name, measurement in name_to_measurement.items():
+                if not measurement:
+                    analyzer.forget(name)
+                    name_to_analyses[name] = []
+            measurements = [measurement for measurement in name_to_measurement.values() if measurement]
+            for analysis in analyzer.analyse(measurements):
+                name_to_analyses[analysis.name] = [analysis]
+            analysis_layer.apply_features(name_to_analyses)
+            name_to_measurement.clear()
+            analysis_layer.refresh()
+
+        def apply_shear_summaries():
+            if not name_to_shear_summaries:
+                return
+            shear_summary_layer.apply_features(name_to_shear_summaries)
+            name_to_shear_summaries.clear()
+            shear_summary_layer.refresh()
+
+        def apply_derived():
+            apply_analyses()
+            apply_shear_summaries()
+
         def on_probes_snapshot(doc_snapshot, changes, read_time):
-            return self._on_iteration(probes_layer, 'sondowania', on_probes, changes)
+            self._on_snapshot(probes_layer, 'sondowania', on_probes, changes, read_time, on_applied=apply_derived)
 
         return ListenerWatch(probes_ref.on_snapshot(on_probes_snapshot))
 
     def _listen_team_changes(self, teams_ref, p: Project) -> ListenerWatch:
+        teams_layer = p.teams_layer
+        # teams of the snapshot applied together, an empty list removes the team; used on the main thread
+        name_to_teams: Dict[str, List[TeamPoint]] = {}
+
+        def on_teams(change_type, doc_map: dict):
+            name = doc_map.get(team.TEAM_ID_REMOTE)
+            if change_type == ChangeType.REMOVED:
+                name_to_teams[name] = []
+            elif change_type == ChangeType.ADDED or change_type == ChangeType.MODIFIED:
+                name_to_teams[name] = [TeamPoint.from_dict(doc_map)]
+
+        def apply_teams():
+            if not name_to_teams:
+                return
+            teams_layer.apply_features(name_to_teams)
+            name_to_teams.clear()
+            teams_layer.refresh()
+
         def on_teams_snapshot(doc_snapshots: List[DocumentSnapshot], changes, read_time):
-            with local_database_lock:
-                teams_layer = p.teams_layer
-                if not teams_layer:
-                    pass
-                try:
-                    for doc_snapshot in doc_snapshots:
-                        team_doc = doc_snapshot.to_dict()
-                        team: TeamPoint = TeamPoint.from_dict(team_doc)
-                        teams_layer.add_feature(team, team.name)
-                    teams_layer.refresh()
-                except Exception as e:
-                    G.Log.error(f'{traceback.format_exc()}')
-                    raise e
+            self._on_snapshot(teams_layer, 'zespoły', on_teams, changes, read_time, team.TEAM_ID_REMOTE, apply_teams)
 
         return ListenerWatch(teams_ref.on_snapshot(on_teams_snapshot))
 
-    def _on_iteration(self, basic_layer: IMapLayer, tag: str, func: callable, changes):
-        with local_database_lock:
-            if not basic_layer:
-                pass
-            try:
-                for change in changes:
-                    change_type = change.type
-                    doc: DocumentSnapshot = change.document
-                    doc_map = doc.to_dict()
-                    name = doc_map.get(data.NAME_REMOTE)
-                    if not name:
-                        continue
-                    feat = basic_layer.feature_by_name(name)
-                    if feat:
-                        local_time = str(feat.time())
-                        raw_remote_time = doc_map.get(data.TIME_REMOTE)
-                        remote_time = str(Data.remote_time_to_local(raw_remote_time))
-                        if local_time == remote_time:
-                            continue
-
-                    func(change_type, doc_map)
-
-                    G.Log.message(f'{change_type} {doc.id}', f'SRApp - {tag}')
-            except Exception as e:
-                G.Log.error(f'{traceback.format_exc()}')
-                raise e
+    def _on_snapshot(self, basic_layer: IMapLayer, tag: str, func: callable, changes,
+                     read_time: datetime.datetime = None, name_key: str = data.NAME_REMOTE,
+                     on_applied: Callable[[], None] = None):
+        """Called on a watch thread, the changes are applied on the main thread"""
+        self._on_connection_alive(basic_layer.project)
+        collection = _collection_key(basic_layer)
+        queued_at = time.perf_counter()
+        queued_changes = []
+        removed: Dict[str, int] = {}
+        try:
+            for change in changes:
+                doc: DocumentSnapshot = change.document
+                if change.type == ChangeType.REMOVED and collection in self._incremental:
+                    removed[doc.id] = len(queued_changes)
+                queued_changes.append(QueuedChange(change.type, doc.id, doc.to_dict(), queued_at))
+            # document leaves the listened changes also when its timestamp is set back
+            for current_doc in self._existing_documents([change.document for change in changes
+                                                         if change.document.id in removed]):
+                queued_changes[removed[current_doc.id]] = QueuedChange(ChangeType.MODIFIED, current_doc.id,
+                                                                       current_doc.to_dict(), queued_at)
+        except Exception as e:
+            G.Log.error(f'{traceback.format_exc()}')
+            raise e
+        if not queued_changes:
+            return
+
+        def apply(batch: List[QueuedChange], batch_read_time: Optional[datetime.datetime]):
+            self._on_iteration(basic_layer, tag, func, batch, batch_read_time, name_key, on_applied)
 
+        self._dispatcher.put(collection, apply, queued_changes, read_time)
+
+    def _existing_documents(self, docs: List[DocumentSnapshot]) -> List[DocumentSnapshot]:
+        """Current snapshots of the documents which still exist, documents which cannot be read are removed"""
+        if not docs:
+            return []
+        existing = []
+        try:
+            for current_doc in self.user.get_all([doc.reference for doc in docs]):
+                if current_doc.exists:
+                    existing.append(current_doc)
+        except Exception:
+            G.Log.error(f'Nie udało się sprawdzić usuniętych dokumentów, zostaną usunięte\n{traceback.format_exc()}')
+        return existing
+
+    def _on_iteration(self, basic_layer: IMapLayer, tag: str, func: callable, changes: List[QueuedChange],
+                      read_time: datetime.datetime = None, name_key: str = data.NAME_REMOTE,
+                      on_applied: Callable[[], None] = None):
+        collection = _collection_key(basic_layer)
+        if not basic_layer:
+            pass
+        applied = self._applied.setdefault(collection, {})
+        latest_time = None
+        for change in changes:
+            change_type = change.type
+            doc_map = change.doc_map
+            name = doc_map.get(name_key)
+            if not name:
+                continue
+            doc_time = doc_map.get(data.TIME_REMOTE)
+            if change_type != ChangeType.REMOVED and isinstance(doc_time, datetime.datetime):
+                doc_time = doc_time.astimezone(datetime.timezone.utc)
+                if not latest_time or doc_time > latest_time:
+                    latest_time = doc_time
+            doc_fingerprint = None
+            if change_type != ChangeType.REMOVED:
+                doc_fingerprint = fingerprint.document_fingerprint(doc_map, basic_layer.time_is_content)
+                if applied.get(change.doc_id) == doc_fingerprint:
+                    continue
+            if self._is_echo(collection, change.doc_id, doc_fingerprint):
+                if doc_fingerprint is None:
+                    applied.pop(change.doc_id, None)
+                else:
+                    applied[change.doc_id] = doc_fingerprint
+                continue
+
+            func(change_type, doc_map)
+            self._forget_echoes(collection, change.doc_id)
+
+            if doc_fingerprint is None:
+                applied.pop(change.doc_id, None)
+            else:
+                applied[change.doc_id] = doc_fingerprint
+
+            G.Log.message(f'{change_type} {change.doc_id}', f'SRApp - {tag}')
+        if on_applied:
+            on_applied()
+        if latest_time:
+            if read_time and read_time < latest_time:
+                # timestamps from devices with clocks ahead of the database
+                latest_time = read_time
+            self._advance_resume_mark(basic_layer.project, collection, latest_time)
+
+
+def _collection_key(layer: IMapLayer) -> Tuple[str, str]:
+    return layer.project.name, layer.database_ref_path
+
+
+def _resume_mark_key(collection: Tuple[str, str]) -> str:
+    # the GeoPackage keeps data of one project
+    project_name, database_ref_path = collection
+    return f'{RESUME_MARK_KEY}.{database_ref_path}'
@@ -0,0 +1,254 @@
+import dataclasses
+import hashlib
+import json
+import math
+from typing import *
+
+import numpy as np
+
+from database import constants, data, probe, product_point
+from database.data import Data
+
+DEPTH = 'glebokosc'
+N10_MEAN = 'n10_srednia'
+N10_MAX = 'n10_max'
+N20_MEAN = 'n20_srednia'
+METRE_SUMS = 'sumy_metrow'
+RUNNING_MEANS = 'srednie_n10'
+BOUNDARIES = 'granice'
+
+# depth in metres of the units averaged by the running average of N10
+RUNNING_WINDOW = 0.5
+# relative change of the N10 averages above and below a depth making a boundary of layers
+BOUNDARY_RATIO = 0.5
+# smallest change of the N10 averages making a boundary, small numbers of blows change a lot relatively
+BOUNDARY_MIN_BLOWS = 2.0
+
+
+def analysis_local_names() -> List[str]:
+    return [
+        data.NAME,
+        DEPTH,
+        N10_MEAN,
+        N10_MAX,
+        N20_MEAN,
+        METRE_SUMS,
+        RUNNING_MEANS,
+        BOUNDARIES,
+    ]
+
+
+@dataclasses.dataclass(frozen=True)
+class ProbeMeasurement:
+    """Series of numbers of blows of a probe with the depths of its units"""
+    name: str
+    units: Tuple[Any, ...]
+    interval: float
+    start_depth: float
+
+    def content_hash(self) -> str:
+        encoded = json.dumps([self.units, self.interval, self.start_depth], default=str).encode('utf-8')
+        return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+    @staticmethod
+    def of(name: str, units: Iterable[Any], interval: Any, start_depth: Any) -> 'ProbeMeasurement':
+        """Measurement of values of a document or of layers, missing interval is the default one"""
+        return ProbeMeasurement(
+            name,
+            tuple(units or []),
+            _positive(_number(interval), constants.DEFAULT_PROBE_INTERVAL),
+            _positive(_number(start_depth), 0.0),
+        )
+
+    @staticmethod
+    def from_dict(doc_map: dict) -> 'ProbeMeasurement':
+        probe_map = doc_map.get(probe.REMOTE_PROBE) or {}
+        return ProbeMeasurement.of(doc_map.get(data.NAME_REMOTE), probe_map.get(probe.UNITS_REMOTE),
+                                   probe_map.get(probe.INTERVAL_REMOTE), probe_map.get(product_point.START_DEPTH_REMOTE))
+
+
+@dataclasses.dataclass(frozen=True)
+class ProbeAnalysis(Data):
+    """Statistics of a probe, lists are kept as JSON arrays"""
+    __slots__ = ('name', 'depth', 'n10_mean', 'n10_max', 'n20_mean', 'metre_sums', 'running_means', 'boundaries')
+    name: str
+    depth: float
+    n10_mean: Optional[float]
+    n10_max: Optional[float]
+    n20_mean: Optional[float]
+    # sums of blows of every metre from the surface, null for metres without units
+    metre_sums: str
+    # running average of N10 at the bottom of every unit
+    running_means: str
+    # depths of bottoms of units where the N10 average changes
+    boundaries: str
+
+    def attrs(self) -> list:
+        return [
+            self.name,
+            self.depth,
+            self.n10_mean,
+            self.n10_max,
+            self.n20_mean,
+            self.metre_sums,
+            self.running_means,
+            self.boundaries,
+        ]
+
+    def fields_names(self) -> List[str]:
+        return analysis_local_names()
+
+
+class ProbeAnalyzer:
+    """Analyses of probes kept by the content of their series, only changed series are computed again"""
+
+    def __init__(self):
+        self._name_to_analysis: Dict[str, Tuple[str, ProbeAnalysis]] = dict()
+
+    def analyse(self, measurements: List[ProbeMeasurement]) -> List[ProbeAnalysis]:
+        name_to_analysis: Dict[str, ProbeAnalysis] = dict()
+        changed: List[Tuple[ProbeMeasurement, str]] = []
+        for measurement in measurements:
+            content_hash = measurement.content_hash()
+            cached = self._name_to_analysis.get(measurement.name)
+            if cached and cached[0] == content_hash:
+                name_to_analysis[measurement.name] = cached[1]
+            else:
+                changed.append((measurement, content_hash))
+        analyses = analyse_probes([measurement for measurement, _ in changed])
+        for (measurement, content_hash), analysis in zip(changed, analyses):
+            self._name_to_analysis[measurement.name] = (content_hash, analysis)
+            name_to_analysis[measurement.name] = analysis
+        return [name_to_analysis[measurement.name] for measurement in measurements]
+
+    def forget(self, name: str):
+        self._name_to_analysis.pop(name, None)
+
+
+def analyse_probes(measurements: List[ProbeMeasurement]) -> List[ProbeAnalysis]:
+    """Statistics of all probes computed together, series are padded to the longest one"""
+    if not measurements:
+        return []
+    lengths = np.array([len(m.units) for m in measurements])
+    size = max(int(lengths.max()), 1)
+    blows = np.full((len(measurements), size), np.nan)
+    for row, measurement in enumerate(measurements):
+        blows[row, :lengths[row]] = _blows(measurement.units)
+    interval = np.array([m.interval for m in measurements])[:, None]
+    start = np.array([m.start_depth for m in measurements])[:, None]
+    positions = np.arange(size)[None, :]
+    in_series = positions < lengths[:, None]
+    present = ~np.isnan(blows)
+    top = start + positions * interval
+    bottom = top + interval
+    n10 = blows * (0.1 / interval)
+    n20 = blows * (0.2 / interval)
+
+    counts = present.sum(axis=1)
+    n10_means = _divide(np.where(present, n10, 0).sum(axis=1), counts)
+    n20_means = _divide(np.where(present, n20, 0).sum(axis=1), counts)
+    n10_maxes = np.where(counts > 0, np.where(present, n10, -np.inf).max(axis=1), np.nan)
+    depths = start[:, 0] + lengths * interval[:, 0]
+    # metres reached by the probes, the last one can be reached only by the bottom of the last unit
+    metres = np.where(lengths > 0, np.floor(depths - 1e-9).astype(int) + 1, 0)
+
+    metre_sums = _metre_sums(blows, present, top, int(metres.max()))
+    running = _running_means(n10, present, in_series, interval[:, 0])
+    boundaries = _boundaries(running, lengths, interval[:, 0])
+
+    analyses = []
+    for row, measurement in enumerate(measurements):
+        length = lengths[row]
+        analyses.append(ProbeAnalysis(
+            measurement.name,
+            _rounded(depths[row]),
+            _rounded(n10_means[row]),
+            _rounded(n10_maxes[row]),
+            _rounded(n20_means[row]),
+            _json_array(metre_sums[row, :metres[row]]),
+            _json_array(running[row, :length]),
+            _json_array(bottom[row, boundaries[row]]),
+        ))
+    return analyses
+
+
+def _metre_sums(blows: np.ndarray, present: np.ndarray, top: np.ndarray, metres: int) -> np.ndarray:
+    # a unit belongs to the metre of its top, margin of float errors of the multiplied interval
+    metre = np.floor(top + 1e-9).astype(int)
+    rows = np.broadcast_to(np.arange(blows.shape[0])[:, None], blows.shape)
+    sums = np.zeros((blows.shape[0], max(metres, int(metre.max()) + 1)))
+    counts = np.zeros(sums.shape, dtype=int)
+    np.add.at(sums, (rows[present], metre[present]), blows[present])
+    np.add.at(counts, (rows[present], metre[present]), 1)
+    sums[counts == 0] = np.nan
+    return sums
+
+
+def _running_means(values: np.ndarray, present: np.ndarray, in_series: np.ndarray, interval: np.ndarray) \
+        -> np.ndarray:
+    """Averages of the window of units ending at every unit, units count is the same depth for every interval"""
+    window = np.maximum(1, np.rint(RUNNING_WINDOW / interval).astype(int))
+    zeros = np.zeros((values.shape[0], 1))
+    sums = np.hstack([zeros, np.cumsum(np.where(present, values, 0), axis=1)])
+    counts = np.hstack([zeros, np.cumsum(present, axis=1)])
+    positions = np.arange(values.shape[1])[None, :]
+    window_start = np.maximum(positions - window[:, None] + 1, 0)
+    window_sums = sums[:, 1:] - np.take_along_axis(sums, window_start, axis=1)
+    window_counts = counts[:, 1:] - np.take_along_axis(counts, window_start, axis=1)
+    running = _divide(window_sums, window_counts)
+    running[~in_series] = np.nan
+    return running
+
+
+def _boundaries(running: np.ndarray, lengths: np.ndarray, interval: np.ndarray) -> np.ndarray:
+    """Units at bottoms of which the average of the window above differs from the average of the window below"""
+    window = np.maximum(1, np.rint(RUNNING_WINDOW / interval).astype(int))[:, None]
+    positions = np.arange(running.shape[1])[None, :]
+    below_positions = positions + window
+    has_below = below_positions < lengths[:, None]
+    below = np.take_along_axis(running, np.minimum(below_positions, running.shape[1] - 1), axis=1)
+    change = np.abs(below - running)
+    with np.errstate(invalid='ignore'):
+        threshold = np.maximum(BOUNDARY_MIN_BLOWS, BOUNDARY_RATIO * np.fmin(running, below))
+        is_candidate = has_below & (change >= threshold)
+    # of neighbouring candidates the one with the largest change is the boundary
+    candidate_change = np.where(is_candidate, change, -np.inf)
+    minus_inf = np.full((running.shape[0], 1), -np.inf)
+    previous_change = np.hstack([minus_inf, candidate_change[:, :-1]])
+    next_change = np.hstack([candidate_change[:, 1:], minus_inf])
+    return is_candidate & (candidate_change >= previous_change) & (candidate_change > next_change)
+
+
+def _blows(units: Tuple[Any, ...]) -> np.ndarray:
+    try:
+        # numbers as text are converted at once, empty and other values one by one
+        values = np.array(units, dtype=float)
+    except (TypeError, ValueError):
+        return np.array([_number(unit) for unit in units], dtype=float)
+    values[~np.isfinite(values)] = np.nan
+    return values
+
+
+def _divide(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def _number(value: Any) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return number if math.isfinite(number) else math.nan
+
+
+def _positive(number: float, default: float) -> float:
+    return number if number > 0 else default
+
+
+def _rounded(value: float) -> Optional[float]:
+    return None if math.isnan(value) else round(float(value), 2)
+
+
+def _json_array(values: np.ndarray) -> str:
+    rounded = np.round(values.astype(float), 2).tolist()
+    return json.dumps([None if math.isnan(value) else value for value in rounded], separators=(',', ':'))
@@ -0,0 +1,115 @@
+import dataclasses
+import math
+from typing import *
+
+import numpy as np
+
+from database import constants, data, point
+from model.m_columns import Columns
+
+STATUS_TODO = constants.STATUSES_REMOTE_TO_LOCAL['TODO']
+# work of reaching a point and setting up on it, in metres of designed depth
+POINT_WORK = 1.0
+# part of the average work a team can get above the average before nearer points go to other teams, larger slack
+# gives nearer points but less even work
+BALANCE_SLACK = 0.0
+
+# fields of the points layer read to assign the points
+POINT_FIELDS = [data.NAME, point.BOREHOLE_STATE, point.PROBE_STATE, point.BOREHOLE_DEPTH, point.PROBE_DEPTH,
+                point.ASSIGNED_PERFORMER]
+
+
+@dataclasses.dataclass(frozen=True)
+class Task:
+    """Point with a borehole or a probe to do"""
+    name: str
+    x: float
+    y: float
+    work: float
+    performer: Optional[str]
+
+
+@dataclasses.dataclass(frozen=True)
+class TeamPosition:
+    name: str
+    x: float
+    y: float
+
+
+def todo_tasks(columns: Columns) -> List[Task]:
+    """Points with the status of the borehole or the probe to do, the work counts only designed depths to do.
+    Points without geometry are skipped"""
+    tasks = []
+    rows = zip(columns.column(data.NAME), columns.column(point.BOREHOLE_STATE), columns.column(point.PROBE_STATE),
+               columns.column(point.BOREHOLE_DEPTH), columns.column(point.PROBE_DEPTH),
+               columns.column(point.ASSIGNED_PERFORMER), columns.xy or [])
+    for name, borehole_state, probe_state, borehole_depth, probe_depth, performer, (x, y) in rows:
+        is_borehole_todo = borehole_state == STATUS_TODO
+        is_probe_todo = probe_state == STATUS_TODO
+        # features without geometry have zero coordinates, as in the spatial index of the layer
+        if not (is_borehole_todo or is_probe_todo) or not (x and y):
+            continue
+        work = POINT_WORK
+        if is_borehole_todo:
+            work += _depth(borehole_depth)
+        if is_probe_todo:
+            work += _depth(probe_depth)
+        tasks.append(Task(name, x, y, work, performer or None))
+    return tasks
+
+
+def team_positions(columns: Columns) -> List[TeamPosition]:
+    return [TeamPosition(name, x, y) for name, (x, y) in zip(columns.column(data.NAME), columns.xy or [])
+            if name and x and y]
+
+
+def assign(tasks: List[Task], teams: List[TeamPosition]) -> Dict[str, str]:
+    """Performers of the unassigned tasks. Pairs of tasks and teams are taken from the nearest, a team takes a task
+    while its work stays below the balanced share; tasks left go to the least loaded teams"""
+    open_tasks = [task for task in tasks if not task.performer]
+    if not open_tasks or not teams:
+        return {}
+    team_names = [team.name for team in teams]
+    team_to_column = {name: column for column, name in enumerate(team_names)}
+    loads = np.zeros(len(teams))
+    # assigned tasks keep their teams and count to their work
+    for task in tasks:
+        column = team_to_column.get(task.performer)
+        if column is not None:
+            loads[column] += task.work
+    works = np.array([task.work for task in open_tasks])
+    capacity = (loads.sum() + works.sum()) / len(teams) * (1 + BALANCE_SLACK)
+    distances = distance_matrix(np.array([(task.x, task.y) for task in open_tasks]),
+                                np.array([(team.x, team.y) for team in teams]))
+
+    performers: List[Optional[int]] = [None] * len(open_tasks)
+    left = len(open_tasks)
+    for flat in np.argsort(distances, axis=None, kind='stable'):
+        row, column = divmod(int(flat), len(teams))
+        if performers[row] is not None or loads[column] + works[row] > capacity:
+            continue
+        performers[row] = column
+        loads[column] += works[row]
+        left -= 1
+        if not left:
+            break
+    # the largest tasks first, so the small ones even out the loads
+    for row in sorted((row for row in range(len(open_tasks)) if performers[row] is None), key=lambda r: -works[r]):
+        column = int(np.lexsort((distances[row], loads))[0])
+        performers[row] = column
+        loads[column] += works[row]
+    return {task.name: team_names[column] for task, column in zip(open_tasks, performers)}
+
+
+def distance_matrix(points: np.ndarray, teams: np.ndarray) -> np.ndarray:
+    """Distances of every point (rows) to every team (columns)"""
+    difference = points[:, None, :] - teams[None, :, :]
+    return np.sqrt((difference ** 2).sum(axis=2))
+
+
+def _depth(value: Any) -> float:
+    try:
+        depth = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return depth if math.isfinite(depth) and depth > 0 else 0.0
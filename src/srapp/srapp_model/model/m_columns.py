@@ -0,0 +1,64 @@
+from typing import *
+
+from database.data import IFeature, IPointFeature
+
+
+class Columns:
+    """Values of fields of features kept as one list per field, the n-th value of every list belongs to the n-th
+    feature. Values are already converted to Python types"""
+
+    def __init__(self, fids: List[int], name_to_values: Dict[str, list], xy: List[Tuple[float, float]] = None):
+        self.fids = fids
+        self.name_to_values = name_to_values
+        # coordinates of point features, None for features without geometry
+        self.xy = xy
+
+    def __len__(self):
+        return len(self.fids)
+
+    def column(self, name: str) -> list:
+        values = self.name_to_values.get(name)
+        return values if values is not None else [None] * len(self.fids)
+
+    def take(self, rows: List[int]) -> 'Columns':
+        """Columns of the rows at the positions, in their order"""
+        name_to_values = {name: [values[row] for row in rows] for name, values in self.name_to_values.items()}
+        xy = [self.xy[row] for row in rows] if self.xy is not None else None
+        return Columns([self.fids[row] for row in rows], name_to_values, xy)
+
+    def sorted_by(self, key: Callable[[int], Any]) -> 'Columns':
+        """Columns with rows sorted by the key of the row position"""
+        return self.take(sorted(range(len(self.fids)), key=key))
+
+    def grouped_by(self, name: str) -> Dict[Any, 'Columns']:
+        """Columns of rows with the same value of the field, in order of the first row of the value"""
+        value_to_rows: Dict[Any, List[int]] = dict()
+        for row, value in enumerate(self.column(name)):
+            value_to_rows.setdefault(value, []).append(row)
+        return {value: self.take(rows) for value, rows in value_to_rows.items()}
+
+    @staticmethod
+    def from_features(features: Iterable[IFeature], names: Iterable[str]) -> 'Columns':
+        features = list(features)
+        name_to_values = {name: [feat.attribute(name) for feat in features] for name in names}
+        xy = None
+        if features and all(isinstance(feat, IPointFeature) for feat in features):
+            xy = [feat.xy() for feat in features]
+        return Columns([feat.fid() for feat in features], name_to_values, xy)
+
+    @staticmethod
+    def from_rows(fids: List[int], rows: List[list], field_names: List[str], names: Iterable[str]) -> 'Columns':
+        """Columns of already read attributes of features, positions of the fields are found once"""
+        name_to_values = dict()
+        for name in names:
+            if name in field_names:
+                pos = field_names.index(name)
+                name_to_values[name] = [row[pos] for row in rows]
+        return Columns(fids, name_to_values)
+
+    @staticmethod
+    def of(rows: Union['Columns', Iterable[IFeature]], names: Iterable[str]) -> 'Columns':
+        """Columns of features read by the layer or the given features"""
+        if isinstance(rows, Columns):
+            return rows
+        return Columns.from_features(rows, names)
@@ -1,5 +1,6 @@
-from typing import Dict, Set
+from typing import Dict, Set, Tuple
 
+from database import data, probe, shear
 from model.m_field import FieldConstraint
 
 SHEARS_TODO_LAYER_STR = 'sciecia_do_zrobienia'
@@ -11,8 +12,16 @@ SET_WATER_LAYER_STR = 'woda_ustalona'
 EXUDATIONS_LAYER_STR = 'wysieki'
 PROBES_LAYER_STR = 'sondowania'
 PROBE_UNITS_LAYER_STR = 'sondowania_wartosci'
+# optional layer keeping all values of a probe in one feature instead of the probe units layer
+PROBE_SERIES_LAYER_STR = 'sondowania_serie'
+# read-only view of the packed series with one row per unit
+PROBE_SERIES_VIEW_STR = 'sondowania_serie_wartosci'
 PROBE_PERSONS_LAYER_STR = 'sondowania_wykonawcy'
+# statistics of probes derived from their units, not sent to the database
+PROBE_ANALYSIS_LAYER_STR = 'sondowania_analiza'
 SHEAR_UNITS_LAYER_STR = 'sciecia_wartosci'
+# statistics of shears derived from their units, not sent to the database
+SHEAR_SUMMARY_LAYER_STR = 'sciecia_podsumowanie'
 TEAMS_LAYER_STR = 'zespoły'
 POINTS_LAYER_STR = 'punkty'
 
@@ -52,8 +61,32 @@ LAYER_NAME_TO_FIELDS_CONSTRAINTS: Dict[str, Dict[int, Set[FieldConstraint]]] = {
     PROBE_UNITS_LAYER_STR: {1: {FieldConstraint.NOT_NULL},
                             2: {FieldConstraint.NOT_NULL},
                             3: {FieldConstraint.NOT_NULL}},
+    PROBE_SERIES_LAYER_STR: {1: {FieldConstraint.NOT_NULL, FieldConstraint.UNIQUE},
+                             2: {FieldConstraint.SERIES}},
+    PROBE_ANALYSIS_LAYER_STR: {},
     SHEAR_UNITS_LAYER_STR: {1: {FieldConstraint.NOT_NULL},
                             2: {FieldConstraint.NOT_NULL},
                             3: {FieldConstraint.NOT_NULL, FieldConstraint.SHEARS_NUMBER},
                             4: {FieldConstraint.NOT_NULL}},
+    SHEAR_SUMMARY_LAYER_STR: {},
+}
+
+# fields of the GeoPackage tables indexes, features of a layer are always looked up by the point name
+LAYER_NAME_TO_INDEX_FIELDS: Dict[str, Tuple[str, ...]] = {
+    POINTS_LAYER_STR: (data.NAME,),
+    SHEARS_TODO_LAYER_STR: (data.NAME,),
+    BOREHOLES_LAYER_STR: (data.NAME,),
+    BOREHOLE_PERSONS_LAYER_STR: (data.NAME,),
+    LAYERS_LAYER_STR: (data.NAME,),
+    DRILLED_WATER_LAYER_STR: (data.NAME,),
+    SET_WATER_LAYER_STR: (data.NAME,),
+    EXUDATIONS_LAYER_STR: (data.NAME,),
+    PROBES_LAYER_STR: (data.NAME,),
+    PROBE_UNITS_LAYER_STR: (data.NAME, probe.INDEX),
+    PROBE_SERIES_LAYER_STR: (data.NAME,),
+    PROBE_PERSONS_LAYER_STR: (data.NAME,),
+    PROBE_ANALYSIS_LAYER_STR: (data.NAME,),
+    SHEAR_UNITS_LAYER_STR: (data.NAME, shear.SHEAR_DEPTH, shear.INDEX),
+    SHEAR_SUMMARY_LAYER_STR: (data.NAME,),
+    TEAMS_LAYER_STR: (data.NAME,),
 }
@@ -9,3 +9,4 @@ class FieldConstraint(Enum):
     EXUDATION = 4
     STATUS = 5
     SHEARS_NUMBER = 6
+    SERIES = 7
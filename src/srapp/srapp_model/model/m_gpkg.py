@@ -0,0 +1,96 @@
+import sqlite3
+from contextlib import closing
+from typing import *
+
+from database import data, probe
+from model.m_config import LAYER_NAME_TO_INDEX_FIELDS, PROBE_SERIES_LAYER_STR, PROBE_SERIES_VIEW_STR
+
+# seconds to wait for the lock of the GeoPackage held by QGIS
+GPKG_LOCK_TIMEOUT = 30
+
+META_TABLE = 'srapp_meta'
+SCHEMA_VERSION_KEY = 'schema_version'
+
+# ids of the rows of the series view are made of the series id and the unit index below the limit
+SERIES_VIEW_UNITS_LIMIT = 10000
+
+
+def connect(gpkg_file_path: str) -> sqlite3.Connection:
+    """GeoPackage is a SQLite database, plugin tables are accessed directly"""
+    return sqlite3.connect(gpkg_file_path, timeout=GPKG_LOCK_TIMEOUT)
+
+
+def has_table(gpkg_file_path: str, table: str) -> bool:
+    with closing(connect(gpkg_file_path)) as conn:
+        return table in _tables(conn)
+
+
+def get_meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    _create_meta_table(conn)
+    row = conn.execute(f'SELECT value FROM {META_TABLE} WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_meta(conn: sqlite3.Connection, key: str, value: str):
+    _create_meta_table(conn)
+    conn.execute(f'INSERT OR REPLACE INTO {META_TABLE} (key, value) VALUES (?, ?)', (key, value))
+
+
+def _create_meta_table(conn: sqlite3.Connection):
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)')
+
+
+def _tables(conn: sqlite3.Connection) -> Set[str]:
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _create_indexes(conn: sqlite3.Connection):
+    tables = _tables(conn)
+    for layer_name, fields in LAYER_NAME_TO_INDEX_FIELDS.items():
+        if layer_name not in tables:
+            continue
+        index_name = f'{layer_name}_{"_".join(fields)}_idx'
+        columns = ', '.join(f'"{field}"' for field in fields)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{layer_name}" ({columns})')
+
+
+def _create_probe_series_view(conn: sqlite3.Connection):
+    """Units of the packed series with the fields of the probe units layer, registered so QGIS can open it"""
+    tables = _tables(conn)
+    if PROBE_SERIES_LAYER_STR not in tables:
+        return
+    series = f'series."{probe.SERIES}"'
+    conn.execute(f'''CREATE VIEW IF NOT EXISTS "{PROBE_SERIES_VIEW_STR}" AS
+        SELECT series.fid * {SERIES_VIEW_UNITS_LIMIT} + units.key AS fid, series."{data.NAME}" AS "{data.NAME}",
+            units.key AS "{probe.INDEX}", units.value AS "{probe.VALUE}"
+        FROM "{PROBE_SERIES_LAYER_STR}" AS series,
+            json_each(CASE WHEN json_valid({series}) THEN {series} ELSE '[]' END) AS units''')
+    if 'gpkg_contents' in tables:
+        conn.execute("INSERT OR IGNORE INTO gpkg_contents (table_name, data_type, identifier) VALUES (?, 'attributes', ?)",
+                     (PROBE_SERIES_VIEW_STR, PROBE_SERIES_VIEW_STR))
+
+
+# changes of the plugin tables, each applied once to GeoPackages made by older versions of the plugin
+SCHEMA_UPGRADES: List[Callable[[sqlite3.Connection], None]] = [
+    _create_indexes,
+    _create_probe_series_view,
+]
+
+
+def initialize(gpkg_file_path: str):
+    """Applies all changes to a newly created GeoPackage"""
+    with closing(connect(gpkg_file_path)) as conn, conn:
+        for upgrade_step in SCHEMA_UPGRADES:
+            upgrade_step(conn)
+        set_meta(conn, SCHEMA_VERSION_KEY, str(len(SCHEMA_UPGRADES)))
+
+
+def upgrade(gpkg_file_path: str):
+    """Applies changes missing in the GeoPackage"""
+    with closing(connect(gpkg_file_path)) as conn, conn:
+        version = int(get_meta(conn, SCHEMA_VERSION_KEY) or 0)
+        if version >= len(SCHEMA_UPGRADES):
+            return
+        for upgrade_step in SCHEMA_UPGRADES[version:]:
+            upgrade_step(conn)
+        set_meta(conn, SCHEMA_VERSION_KEY, str(len(SCHEMA_UPGRADES)))
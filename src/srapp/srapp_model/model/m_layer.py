@@ -1,13 +1,17 @@
 import abc
+import bisect
 import datetime
+import difflib
+import math
 from typing import *
 
-from database import data, constants, shear
-from database.data import Data, IFeature, FTR
+from database import data
+from database.data import Data, IFeature, FTR, IPointFeature, PointData
 from model import LocalToRemote
-from model.m_config import LAYER_NAME_TO_FIELDS_CONSTRAINTS
-from model.m_field import FieldConstraint
+from model.m_columns import Columns
 from model.m_qgis import IQgis
+from model.m_spatial import GridIndex
+from model.m_validation import LayerValidator
 from srapp_model import G
 
 LSTNR = TypeVar('LSTNR')
@@ -31,88 +35,66 @@ class IMapLayer(Generic[LR]):
         self.layer = layer
         self.qgis = qgis
         self.fid_to_name: Dict[int, str] = dict()
+        # sorted ids of features with the name, used instead of filtering the layer by name
+        self.name_to_fids: Dict[str, List[int]] = dict()
+        self._is_indexed = False
         self.database_ref_path: str = None
         self.local_to_remote: LocalToRemote = None
         self.remote_transformation: Callable[Dict[str, str], Dict[str, Any]] = None
-        self.features_to_remote: Callable[List[IFeature], dict] = None
+        self.features_to_remote: Callable[[Columns], dict] = None
+        # fields read by features_to_remote
+        self.remote_fields: List[str] = []
         self.can_make_timestamp_on_added = False
+        # positions in item attributes identifying a row of the name, None for rows identified by their order
+        self.key_positions: Optional[Tuple[int, ...]] = None
+        # rows of lists ordered only by feature ids are paired by position instead of aligned by content
+        self.pairs_by_position = False
+        # field of the depth ordering rows of lists aligned by content, new rows get the last ids wherever they are
+        self.order_field: Optional[str] = None
+        # timestamp of the documents is their content, e.g. the time of the reported position, not of the last write
+        self.time_is_content = False
         self.project: 'Project' = None
+        self.repaint_scheduler: 'RepaintScheduler' = None
         self.name: str = ''
+        self._validator: Optional[LayerValidator] = None
+        # positions of point features kept current with the name index, None for layers without the index
+        self.spatial_index: Optional[GridIndex] = None
+        # field kept with the positions to filter them without reading the layer
+        self.spatial_tag_field: Optional[str] = None
 
     def _are_fields_invalid(self, features: List[IFeature]) -> bool:
         if not features:
             return False
-        messages_container: List[str] = []
-        layer_name = self.name
-        field_names = self.field_names()
-        idx_to_constraints: Dict[int, Set[FieldConstraint]] = LAYER_NAME_TO_FIELDS_CONSTRAINTS.get(layer_name)
-        for idx, constraints in idx_to_constraints.items():
-            for constraint in constraints:
-                if constraint == FieldConstraint.NOT_NULL:
-                    for feat in features:
-                        attributes = feat.attributes()
-                        attr = attributes[idx]
-                        if not attr:
-                            messages_container.append(
-                                f'Pusta wartość pola "{field_names[idx]}" w wierszu numer {feat.fid()}')
-                elif constraint == FieldConstraint.UNIQUE:
-                    all_features = self.all_features()
-                    all_attrs = [f.attributes()[idx] for f in all_features]
-                    for feat in features:
-                        attributes = feat.attributes()
-                        attr = attributes[idx]
-                        looked_attrs = list(all_attrs)
-                        looked_attrs.remove(attr)
-                        if attr in looked_attrs:
-                            messages_container.append(
-                                f'Nieunikalna wartość pola "{field_names[idx]}" w wierszu numer {feat.fid()}')
-                elif constraint == FieldConstraint.SOIL:
-                    for feat in features:
-                        attributes = feat.attributes()
-                        attr = attributes[idx]
-                        if attr not in constants.SOIL_TYPES:
-                            messages_container.append(
-                                f'Nazwa gruntu "{attr}" w polu "{field_names[idx]}" w wierszu numer {feat.fid()} nie mieści się w zakresie {constants.SOIL_TYPES}')
-                elif constraint == FieldConstraint.WATER_HORIZON:
-                    for feat in features:
-                        attributes = feat.attributes()
-                        attr = attributes[idx]
-                        if attr not in constants.WATER_HORIZONS:
-                            messages_container.append(
-                                f'Numer warstwy wodonośnej "{attr}" w polu "{field_names[idx]}" w wierszu numer {feat.fid()} nie mieści się w zakresie {constants.WATER_HORIZONS}')
-                elif constraint == FieldConstraint.EXUDATION:
-                    for feat in features:
-                        attributes = feat.attributes()
-                        attr = str(attributes[idx])
-                        if attr not in constants.EXUDATION_TYPES:
-                            messages_container.append(
-                                f'Rodzaj sączenia "{attr}" w polu "{field_names[idx]}" w wierszu numer {feat.fid()} nie mieści się w zakresie {constants.EXUDATION_TYPES}')
-                elif constraint == FieldConstraint.STATUS:
-                    statuses = set(constants.STATUSES_REMOTE_TO_LOCAL.values())
-                    for feat in features:
-                        attributes = feat.attributes()
-                        attr = attributes[idx]
-                        if attr and attr not in statuses:
-                            messages_container.append(
-                                f'Stan wykonania "{attr}" w polu "{field_names[idx]}" w wierszu numer {feat.fid()} nie mieści się w zakresie {statuses}')
-                elif constraint == FieldConstraint.SHEARS_NUMBER:
-                    depths_set = {f.attribute(shear.SHEAR_DEPTH) for f in features}
-
-                    for depth in depths_set:
-                        depth_features = [f for f in features if f.attribute(shear.SHEAR_DEPTH) == depth]
-                        shears_torques = [f.attribute(shear.VALUE) for f in depth_features]
-                        number_of_torques = len(shears_torques)
-                        if number_of_torques != constants.SHEARS_SIZE:
-                            messages_container.append(
-                                f'Ilość wpisów wartości ścięć "{number_of_torques}" w polu "{field_names[idx]}" w dla głębokośći {depth} powinna wynosić {constants.SHEARS_SIZE}')
+        validator = self._layer_validator()
+        rows = [feat.attributes() for feat in features]
+        fids = [feat.fid() for feat in features]
+        for fid, attributes in zip(fids, rows):
+            validator.index(fid, attributes)
+        columns = Columns.from_rows(fids, rows, self.field_names(), validator.fields)
+        messages_container = validator.messages(columns)
         if messages_container:
             tag = 'SRApp - błędy zapisu warstw'
-            G.Log.message(f'Nie wysłano zmian do bazy danych. Błędy w warstwie {layer_name}:', tag)
+            G.Log.message(f'Nie wysłano zmian do bazy danych. Błędy w warstwie {self.name}:', tag)
             for message in messages_container:
                 G.Log.message(message, tag)
             return True
         return False
 
+    def _layer_validator(self) -> LayerValidator:
+        """Validator with indexes of all features, made when the layer is validated first time"""
+        if self._validator is None:
+            self._validator = LayerValidator(self.name, self.field_names())
+            self._validator.reset(self.columns(None, self._validator.fields))
+        return self._validator
+
+    def _validate_index(self, fid: int, attributes: list):
+        if self._validator is not None:
+            self._validator.index(fid, attributes)
+
+    def _validate_unindex(self, fid: int):
+        if self._validator is not None:
+            self._validator.unindex(fid)
+
     @abc.abstractmethod
     def stop_edit_mode(self):
         pass
@@ -121,43 +103,188 @@ class IMapLayer(Generic[LR]):
     def id(self):
         pass
 
-    @abc.abstractmethod
     def refresh(self):
+        if self.repaint_scheduler:
+            self.repaint_scheduler.request(self)
+        elif not self.qgis.try_refresh():
+            self.trigger_repaint()
+
+    @abc.abstractmethod
+    def trigger_repaint(self):
+        """Repaints only this layer"""
         pass
 
     def add_features(self, items: List[Data], name: str):
-        features = self.features_by_name(name)
-        rows = max(len(items), len(features))
-        feat_and_item = (
-            [
-                features[i] if len(features) > i else None,
-                items[i] if len(items) > i else None
-            ]
-            for i in range(rows)
-        )
-        for feat, item in feat_and_item:
-            if feat and item:
+        self.apply_features({name: items})
+
+    def apply_features(self, name_to_items: Dict[str, List[Data]]):
+        """Replaces features of the names with the items, each kind of change is one call of the data provider"""
+        name_to_features = self._features_by_names(list(name_to_items.keys()))
+        attr_map: Dict[int, Dict[int, Any]] = dict()
+        geometry_map: Dict[int, Data] = dict()
+        removed_fids: List[int] = []
+        added_items: List[Data] = []
+        added_names: List[str] = []
+        for name, items in name_to_items.items():
+            features = name_to_features.get(name, [])
+            pairs, removed_features, name_added_items = self._match_features(features, items)
+            for feat, item in pairs:
                 fid = feat.fid()
-                attr_map = item.attr_map(fid)
-                self.change_attribute_values(attr_map)
-                self.change_geometry_values(fid, item)
-            elif feat:
-                self._delete_features(feat.fid())
-            elif item:
-                self._add_feature(item)
-                self.update_fid_to_name(name)
-
-    def update_fid_to_name(self, name):
-        features = self.features_by_name(name)
+                changed_values = _changed_values(feat, item)
+                if changed_values:
+                    attr_map[fid] = changed_values
+                    attributes = list(feat.attributes())
+                    for pos, value in changed_values.items():
+                        attributes[pos:pos + 1] = [value]
+                    self._validate_index(fid, attributes)
+                if _is_moved(feat, item):
+                    geometry_map[fid] = item
+                if changed_values or fid in geometry_map:
+                    self._index_item_position(fid, item)
+            removed_fids += [feat.fid() for feat in removed_features]
+            added_items += name_added_items
+            added_names += [name] * len(name_added_items)
+        if attr_map:
+            self.change_attribute_values(attr_map)
+        if geometry_map:
+            self.change_geometry_values(geometry_map)
+        if removed_fids:
+            self._delete_features(removed_fids)
+            for fid in removed_fids:
+                self._unindex(fid)
+                self._unindex_position(fid)
+                self._validate_unindex(fid)
+        if added_items:
+            for fid, name, item in zip(self._add_features(added_items), added_names, added_items):
+                self._index(fid, name)
+                self._index_item_position(fid, item)
+                self._validate_index(fid, [fid] + item.attrs())
+
+    def change_values_by_names(self, name_to_values: Dict[str, Dict[str, Any]]):
+        """Changes fields of the features with the names in one call of the data provider. Like after local edits,
+        layers with timestamps get new timestamps"""
+        field_names = self.field_names()
+        timestamp = self.make_timestamp_field(datetime.datetime.now())
+        attr_map: Dict[int, Dict[int, Any]] = dict()
+        for name, features in self._features_by_names(list(name_to_values.keys())).items():
+            values = {field_names.index(field): value for field, value in name_to_values[name].items()}
+            if self.can_make_timestamp_on_added:
+                values[data.TIME_POS] = timestamp
+            for feat in features:
+                attr_map[feat.fid()] = values
+                if self.spatial_index is not None and self.spatial_tag_field in name_to_values[name]:
+                    self.spatial_index.set_tag(feat.fid(), name_to_values[name][self.spatial_tag_field])
+        if attr_map:
+            self.change_attribute_values(attr_map)
+            # indexed values are read again when the layer is validated next time
+            self._validator = None
+
+    def _features_by_names(self, names: List[str]) -> Dict[str, List[IFeature]]:
+        if not self._is_indexed:
+            return {name: self._scan_features_by_name(name) for name in names}
+        fids = [fid for name in names for fid in self.name_to_fids.get(name, [])]
+        name_to_features: Dict[str, List[IFeature]] = dict()
+        for feat in self.features_by_fids(fids) if fids else []:
+            name_to_features.setdefault(self.fid_to_name.get(feat.fid()), []).append(feat)
+        return name_to_features
+
+    def _match_features(self, features: List[IFeature], items: List[Data]) \
+            -> Tuple[List[Tuple[IFeature, Data]], List[IFeature], List[Data]]:
+        """Features to update with items, features to remove and items to add"""
+        if self.pairs_by_position:
+            return list(zip(features, items)), features[len(items):], items[len(features):]
+        if self.key_positions is None:
+            if self.order_field is not None:
+                features = sorted(features, key=lambda feat: float(feat.attribute(self.order_field) or 0))
+            return _align_features(features, items)
+        key_to_features: Dict[tuple, List[IFeature]] = dict()
+        for feat in features:
+            attributes = feat.attributes()[1:]
+            key = tuple(_comparable(attributes[pos]) for pos in self.key_positions)
+            key_to_features.setdefault(key, []).append(feat)
+        pairs = []
+        added_items = []
+        for item in items:
+            attrs = item.attrs()
+            key = tuple(_comparable(attrs[pos]) for pos in self.key_positions)
+            key_features = key_to_features.get(key)
+            if key_features:
+                pairs.append((key_features.pop(0), item))
+            else:
+                added_items.append(item)
+        removed_features = [feat for key_features in key_to_features.values() for feat in key_features]
+        return pairs, removed_features, added_items
+
+    def index_features(self, features: List[IFeature]):
+        self.fid_to_name.clear()
+        self.name_to_fids.clear()
+        if self.spatial_index is not None:
+            self.spatial_index.clear()
         for feature in features:
-            self.fid_to_name.update({feature.fid(): name})
+            self._index(feature.fid(), feature.name())
+            self._index_position(feature)
+        self._is_indexed = True
+        self._validator = None
+
+    def clear_indexes(self):
+        """Forgets indexed features, e.g. after deleting all of them"""
+        self.fid_to_name.clear()
+        self.name_to_fids.clear()
+        if self.spatial_index is not None:
+            self.spatial_index.clear()
+        self._is_indexed = False
+        self._validator = None
+
+    def _index(self, fid: int, name: str):
+        old_name = self.fid_to_name.get(fid)
+        if old_name == name and fid in self.name_to_fids.get(name, []):
+            return
+        if old_name is not None:
+            self._unindex(fid)
+        self.fid_to_name[fid] = name
+        bisect.insort(self.name_to_fids.setdefault(name, []), fid)
+
+    def _unindex(self, fid: int):
+        name = self.fid_to_name.pop(fid, None)
+        fids = self.name_to_fids.get(name)
+        if fids and fid in fids:
+            fids.remove(fid)
+            if not fids:
+                del self.name_to_fids[name]
+
+    def _index_position(self, feat: IFeature):
+        if self.spatial_index is None or not isinstance(feat, IPointFeature):
+            return
+        x, y = feat.xy()
+        # features without geometry have zero coordinates, like items without coordinates, see `_is_moved`
+        if not (x and y):
+            self.spatial_index.remove(feat.fid())
+            return
+        tag = feat.attribute(self.spatial_tag_field) if self.spatial_tag_field else None
+        self.spatial_index.insert(feat.fid(), x, y, tag)
+
+    def _index_item_position(self, fid: int, item: Data):
+        if self.spatial_index is None or not isinstance(item, PointData):
+            return
+        # items without coordinates do not move the features, see `_is_moved`
+        xy = (item.x, item.y) if item.x and item.y else self.spatial_index.xy(fid)
+        if xy is None:
+            return
+        tag = dict(zip(item.fields_names(), item.attrs())).get(self.spatial_tag_field) \
+            if self.spatial_tag_field else None
+        self.spatial_index.insert(fid, *xy, tag)
+
+    def _unindex_position(self, fid: int):
+        if self.spatial_index is not None:
+            self.spatial_index.remove(fid)
 
     @abc.abstractmethod
-    def _add_feature(self, item: Data):
+    def _add_features(self, items: List[Data]) -> List[int]:
+        """Returns ids of the added features in order of the items"""
         pass
 
     @abc.abstractmethod
-    def _delete_features(self, id: int):
+    def _delete_features(self, fids: List[int]):
         pass
 
     def add_feature(self, item: Data, name: str):
@@ -168,8 +295,32 @@ class IMapLayer(Generic[LR]):
         assert len(features) < 2
         return features[0] if features else None
 
-    @abc.abstractmethod
+    def columns(self, fids: Optional[List[int]], names: Iterable[str]) -> Columns:
+        """Values of the fields of the features with the ids or of all features, in order of the ids"""
+        features = self.all_features() if fids is None else self.features_by_fids(fids)
+        return Columns.from_features(sorted(features, key=lambda feat: feat.fid()), names)
+
+    def columns_by_names(self, names: Iterable[str], fields: Iterable[str]) -> Dict[str, Columns]:
+        """Values of the fields of features with the names, read at once for all the names"""
+        names = list(names)
+        fields = list(dict.fromkeys([data.NAME, *fields]))
+        if self._is_indexed:
+            fids = [fid for name in names for fid in self.name_to_fids.get(name, [])]
+            columns = self.columns(fids, fields) if fids else Columns([], {})
+        else:
+            features = [feat for name in names for feat in self._scan_features_by_name(name)]
+            columns = Columns.from_features(features, fields)
+        return columns.grouped_by(data.NAME)
+
     def features_by_name(self, name: str) -> List[IFeature]:
+        if not self._is_indexed:
+            return self._scan_features_by_name(name)
+        fids = self.name_to_fids.get(name)
+        return self.features_by_fids(fids) if fids else []
+
+    @abc.abstractmethod
+    def _scan_features_by_name(self, name: str) -> List[IFeature]:
+        """Features with the name found without the index"""
         pass
 
     @abc.abstractmethod
@@ -180,21 +331,31 @@ class IMapLayer(Generic[LR]):
     def change_attribute_values(self, attr_map: Dict[int, Dict[int, Any]]):
         pass
 
-    def change_geometry_values(self, feat_id: int, item: Data):
+    def change_geometry_values(self, fid_to_item: Dict[int, Data]):
         pass
 
     @abc.abstractmethod
     def delete_all_features(self):
         pass
 
-    @abc.abstractmethod
     def delete_features_by_name(self, name: str):
-        pass
+        if self._is_indexed:
+            fids = list(self.name_to_fids.get(name, []))
+        else:
+            fids = [f.fid() for f in self._scan_features_by_name(name)]
+        if fids:
+            self._delete_features(fids)
+            for fid in fids:
+                self._unindex(fid)
+                self._unindex_position(fid)
+                self._validate_unindex(fid)
 
     def committed_features_added(self, func_to_call: Callable[['IMapLayer', List[IFeature]], None]) -> IListener:
         def wrapping_func(layer_id: str, raw_features: Iterable[FTR]):
             features = [self.wrap_raw_feature(feat) for feat in raw_features]
-            self.fid_to_name.update({f.fid(): f.name() for f in features})
+            for feat in features:
+                self._index(feat.fid(), feat.name())
+                self._index_position(feat)
             if self._are_fields_invalid(features):
                 return
             if self.can_make_timestamp_on_added:
@@ -212,6 +373,10 @@ class IMapLayer(Generic[LR]):
     def committed_features_removed(self, func_to_call: callable) -> IListener:
         def wrapping_func(layer_id: str, removed_features_fids: List[int]):
             func_to_call(self, removed_features_fids)
+            for fid in removed_features_fids:
+                self._unindex(fid)
+                self._unindex_position(fid)
+                self._validate_unindex(fid)
             self.refresh()
 
         return IMapLayer.attach_listener(self._committed_features_removed_func(), wrapping_func)
@@ -225,6 +390,9 @@ class IMapLayer(Generic[LR]):
         def wrapping_func(layer_id: str, changed_attrs_values: Dict[int, Dict[int, Any]]):
             fids = list(changed_attrs_values.keys())
             features = self.features_by_fids(fids)
+            for feat in features:
+                self._index(feat.fid(), feat.name())
+                self._index_position(feat)
             if self._are_fields_invalid(features):
                 return
             if self.can_make_timestamp_on_added:
@@ -263,7 +431,8 @@ class IMapLayer(Generic[LR]):
         self.project = project
 
     @abc.abstractmethod
-    def features_by_fids(self, fids: List[int]):
+    def features_by_fids(self, fids: List[int]) -> List[IFeature]:
+        """Features in order of their ids"""
         pass
 
     @abc.abstractmethod
@@ -275,6 +444,91 @@ class IMapLayer(Generic[LR]):
         pass
 
 
+def _align_features(features: List[IFeature], items: List[Data]) \
+        -> Tuple[List[Tuple[IFeature, Data]], List[IFeature], List[Data]]:
+    # rows inserted or removed in the middle of the list leave the following rows in place
+    feature_rows = [tuple(_comparable(attr) for attr in feat.attributes()[1:]) for feat in features]
+    item_rows = [tuple(_comparable(value) for value in item.attrs()) for item in items]
+    matcher = difflib.SequenceMatcher(None, feature_rows, item_rows, autojunk=False)
+    pairs = []
+    removed_features = []
+    added_items = []
+    for tag, f_start, f_end, i_start, i_end in matcher.get_opcodes():
+        block_features = features[f_start:f_end]
+        block_items = items[i_start:i_end]
+        pairs.extend(zip(block_features, block_items))
+        removed_features.extend(block_features[len(block_items):])
+        added_items.extend(block_items[len(block_features):])
+    return pairs, removed_features, added_items
+
+
+def _changed_values(feat: IFeature, item: Data) -> Dict[int, Any]:
+    """Values of the item different from the feature attributes, by positions in the layer"""
+    # the first attribute of the feature is its id
+    attributes = feat.attributes()[1:]
+    values = item.attrs()
+    return {i + 1: value for i, value in enumerate(values)
+            if i >= len(attributes) or not _is_same_value(value, attributes[i])}
+
+
+def _is_same_value(value: Any, attribute: Any) -> bool:
+    # layer returns NULL for empty text, dates as datetimes and numbers of numeric fields as numbers
+    if value in (None, '') or attribute in (None, ''):
+        return value in (None, '') and attribute in (None, '')
+    if isinstance(attribute, datetime.datetime) or isinstance(value, datetime.datetime):
+        return _local_time(value) == _local_time(attribute)
+    if _is_number(value) or _is_number(attribute):
+        try:
+            return math.isclose(float(value), float(attribute))
+        except (TypeError, ValueError):
+            return False
+    return value == attribute
+
+
+def _comparable(value: Any) -> Any:
+    """Value equal for all forms of the same value, see `_is_same_value`"""
+    if value in (None, ''):
+        return None
+    if isinstance(value, (datetime.datetime, str)):
+        time = _local_time(value)
+        if time:
+            return time
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    if _is_number(value):
+        return float(value)
+    return value
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _local_time(value: Any) -> Optional[datetime.datetime]:
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime.datetime):
+        return None
+    if value.tzinfo:
+        value = value.astimezone(tz=None).replace(tzinfo=None)
+    return value.replace(microsecond=0)
+
+
+def _is_moved(feat: IFeature, item: Data) -> bool:
+    if not isinstance(item, PointData) or not isinstance(feat, IPointFeature):
+        return False
+    if not (item.x and item.y):
+        return False
+    x, y = feat.xy()
+    return not (math.isclose(x, item.x) and math.isclose(y, item.y))
+
+
 class ListenerLayer(IListener[Callable]):
 
     @abc.abstractmethod
@@ -1,5 +1,5 @@
 import abc
-import datetime
+import dataclasses
 import enum
 import os
 from typing import *
@@ -7,13 +7,21 @@ from typing import *
 import database.borehole
 import model.m_user
 from database import data, person, product_point, team, constants
-from database.data import IFeature, IPointFeature
+from database.data import IFeature
+from database.person import Person
+from model import m_analysis, m_shears, m_spatial
+from model.m_columns import Columns
+from model.m_schema import Encoding, FieldSpec, Schema, Row, PointRow, ItemRow, compile_encoder, compile_decoder, \
+    compile_item_decoder, row_class
 from model.m_config import SHEARS_TODO_LAYER_STR, BOREHOLES_LAYER_STR, BOREHOLE_PERSONS_LAYER_STR, LAYERS_LAYER_STR, \
     DRILLED_WATER_LAYER_STR, SET_WATER_LAYER_STR, EXUDATIONS_LAYER_STR, PROBES_LAYER_STR, PROBE_UNITS_LAYER_STR, \
-    PROBE_PERSONS_LAYER_STR, SHEAR_UNITS_LAYER_STR, TEAMS_LAYER_STR, POINTS_LAYER_STR
+    PROBE_SERIES_LAYER_STR, PROBE_PERSONS_LAYER_STR, PROBE_ANALYSIS_LAYER_STR, SHEAR_UNITS_LAYER_STR, \
+    SHEAR_SUMMARY_LAYER_STR, TEAMS_LAYER_STR, POINTS_LAYER_STR
 from model.m_layer import IMapLayer
 from srapp_model.database import point
 from srapp_model.database import shear, borehole, probe, layer, water
+from srapp_model.database.probe import ProbeSeries
+from srapp_model.database.shear import TodoShear
 
 
 class FieldType(enum.Enum):
@@ -191,6 +199,46 @@ def probe_unit_fields(creator: IFieldCreator) -> List[FLD]:
     return fields
 
 
+def probe_series_fields(creator: IFieldCreator) -> List[FLD]:
+    make = creator.make_field
+    f_type = creator.get_field_type
+    fields = []
+    names = probe.probe_series_local_names()
+    fields.append(make(name=names.pop(0), comment='Punkt', type=f_type(FieldType.STRING)))
+    fields.append(make(name=names.pop(0), comment='Wartości', type=f_type(FieldType.STRING)))
+    return fields
+
+
+def probe_analysis_fields(creator: IFieldCreator) -> List[FLD]:
+    make = creator.make_field
+    f_type = creator.get_field_type
+    fields = []
+    names = m_analysis.analysis_local_names()
+    fields.append(make(name=names.pop(0), comment='Punkt', type=f_type(FieldType.STRING)))
+    fields.append(make(name=names.pop(0), comment='Głębokość', type=f_type(FieldType.DOUBLE), prec=2))
+    fields.append(make(name=names.pop(0), comment='Średnia N10', type=f_type(FieldType.DOUBLE), prec=2))
+    fields.append(make(name=names.pop(0), comment='Maksimum N10', type=f_type(FieldType.DOUBLE), prec=2))
+    fields.append(make(name=names.pop(0), comment='Średnia N20', type=f_type(FieldType.DOUBLE), prec=2))
+    fields.append(make(name=names.pop(0), comment='Sumy uderzeń w metrach', type=f_type(FieldType.STRING)))
+    fields.append(make(name=names.pop(0), comment='Średnie kroczące N10', type=f_type(FieldType.STRING)))
+    fields.append(make(name=names.pop(0), comment='Granice warstw', type=f_type(FieldType.STRING)))
+    return fields
+
+
+def shear_summary_fields(creator: IFieldCreator) -> List[FLD]:
+    make = creator.make_field
+    f_type = creator.get_field_type
+    fields = []
+    names = m_shears.shear_summary_local_names()
+    fields.append(make(name=names.pop(0), comment='Punkt', type=f_type(FieldType.STRING)))
+    fields.append(make(name=names.pop(0), comment='Głębokość ścięcia', type=f_type(FieldType.DOUBLE), prec=2))
+    fields.append(make(name=names.pop(0), comment='Maksymalny moment', type=f_type(FieldType.DOUBLE), prec=2))
+    fields.append(make(name=names.pop(0), comment='Moment rezydualny', type=f_type(FieldType.DOUBLE), prec=2))
+    fields.append(make(name=names.pop(0), comment='Liczba wartości', type=f_type(FieldType.INT)))
+    fields.append(make(name=names.pop(0), comment='Kompletne', type=f_type(FieldType.BOOL)))
+    return fields
+
+
 def teams_fields(creator: IFieldCreator) -> List[FLD]:
     make = creator.make_field
     f_type = creator.get_field_type
@@ -201,14 +249,80 @@ def teams_fields(creator: IFieldCreator) -> List[FLD]:
     return fields
 
 
-def _persons_list_map(features: List[IFeature]) -> dict:
-    elements = []
-    for feat in features:
-        element = str(feat.attribute(data.PERSON) or '')
-        if not element:
-            continue
-        assert type(element) is str
-        elements.append(element)
+# features are given to the serializers as columns read by the layer or as a list of features
+Rows = Union[Columns, List[IFeature]]
+
+_PRODUCT_POINT_ENCODINGS = {
+    data.TIME: Encoding.TIME,
+    data.NAME: Encoding.STR,
+    product_point.START_DEPTH: Encoding.DEPTH,
+}
+_POINTS_SCHEMA = Schema.of(point.LOCAL_TO_REMOTE, {
+    data.TIME: Encoding.TIME,
+    data.NAME: Encoding.STR,
+    point.HEIGHT: Encoding.DEPTH_TEXT,
+    point.BOREHOLE_STATE: Encoding.STATUS,
+    point.PROBE_STATE: Encoding.STATUS,
+    point.BOREHOLE_DEPTH: Encoding.DEPTH_TEXT,
+    point.PROBE_DEPTH: Encoding.DEPTH_TEXT,
+    point.STAKEOUT: Encoding.BOOL,
+})
+# missing texts of products are read as empty
+_PRODUCT_POINT_DEFAULTS = {
+    product_point.LAST_PERFORMER: '',
+    product_point.LOCATION: '',
+    product_point.VEHICLE_NUMBER: '',
+}
+_BOREHOLES_SCHEMA = Schema.of(borehole.LOCAL_TO_REMOTE, _PRODUCT_POINT_ENCODINGS,
+                              defaults={**_PRODUCT_POINT_DEFAULTS, product_point.TYPE: ''})
+_PROBES_SCHEMA = Schema.of(probe.LOCAL_TO_REMOTE, {**_PRODUCT_POINT_ENCODINGS, probe.INTERVAL: Encoding.FLOAT},
+                           defaults={**_PRODUCT_POINT_DEFAULTS, probe.PROBE_TYPE: '',
+                                     probe.INTERVAL: constants.DEFAULT_PROBE_INTERVAL})
+_LAYERS_SCHEMA = Schema.of(layer.LOCAL_TO_REMOTE, {layer.TO: Encoding.DEPTH_TEXT}, exclude=[data.NAME])
+_WATER_HORIZONS_SCHEMA = Schema.of(water.DRILLED_WATER_LOCAL_TO_REMOTE, {
+    water.HORIZON: Encoding.STR,
+    water.WATER_DEPTH: Encoding.DEPTH_TEXT,
+    data.TIME: Encoding.TIME,
+}, exclude=[data.NAME])
+_EXUDATIONS_SCHEMA = Schema.of(water.EXUDATION_LOCAL_TO_REMOTE, {
+    water.EXUDATION_DEPTH: Encoding.DEPTH_TEXT,
+    data.TIME: Encoding.TIME,
+}, exclude=[data.NAME])
+_TODO_SHEARS_SCHEMA = Schema.of(shear.SHEAR_TODO_LOCAL_TO_REMOTE, {shear.SHEAR_DEPTH: Encoding.DEPTH},
+                                exclude=[data.NAME])
+_PERSONS_SCHEMA = Schema.of(person.LOCAL_TO_REMOTE, exclude=[data.NAME])
+_TEAMS_SCHEMA = Schema((
+    FieldSpec(data.TIME, data.TIME_REMOTE, Encoding.TIME),
+    FieldSpec(data.NAME, data.NAME_REMOTE, Encoding.STR),
+))
+
+_encode_points = compile_encoder(_POINTS_SCHEMA)
+_encode_boreholes = compile_encoder(_BOREHOLES_SCHEMA)
+_encode_probes = compile_encoder(_PROBES_SCHEMA)
+_encode_layers = compile_encoder(_LAYERS_SCHEMA)
+_encode_water_horizons = compile_encoder(_WATER_HORIZONS_SCHEMA)
+_encode_exudations = compile_encoder(_EXUDATIONS_SCHEMA)
+_encode_todo_shears = compile_encoder(_TODO_SHEARS_SCHEMA)
+_encode_persons = compile_encoder(_PERSONS_SCHEMA)
+_encode_teams = compile_encoder(_TEAMS_SCHEMA)
+
+_PERSONS_FIELDS = _PERSONS_SCHEMA.local_names()
+_PROBE_UNITS_FIELDS = [probe.INDEX, probe.VALUE]
+_PROBE_SERIES_FIELDS = [probe.SERIES]
+_SHEAR_UNITS_FIELDS = m_shears.SHEAR_UNIT_FIELDS
+_WATER_HORIZONS_FIELDS = _WATER_HORIZONS_SCHEMA.local_names()
+_EXUDATIONS_FIELDS = _EXUDATIONS_SCHEMA.local_names()
+_LAYERS_FIELDS = _LAYERS_SCHEMA.local_names()
+_TODO_SHEARS_FIELDS = _TODO_SHEARS_SCHEMA.local_names()
+_POINTS_FIELDS = _POINTS_SCHEMA.local_names()
+_BOREHOLES_FIELDS = _BOREHOLES_SCHEMA.local_names()
+_PROBES_FIELDS = _PROBES_SCHEMA.local_names()
+_TEAMS_FIELDS = _TEAMS_SCHEMA.local_names()
+
+
+def _persons_list_map(features: Rows) -> dict:
+    rows = _encode_persons(Columns.of(features, _PERSONS_FIELDS))
+    elements = [row[person.REMOTE_PERSONS] for row in rows if row[person.REMOTE_PERSONS]]
     data_map = {
         product_point.REMOTE_POINT: {
             person.REMOTE_PERSONS: elements
@@ -217,18 +331,24 @@ def _persons_list_map(features: List[IFeature]) -> dict:
     return data_map
 
 
-def _probe_units_list_map(features: List[IFeature]) -> dict:
-    def sorter(feat: IFeature) -> int:
-        idx = feat.attribute(shear.INDEX)
-        assert type(idx) is int
-        return idx
+def _probe_units_list_map(features: Rows) -> dict:
+    columns = Columns.of(features, _PROBE_UNITS_FIELDS)
+    indexes = columns.column(probe.INDEX)
+    assert all(type(idx) is int for idx in indexes)
+    values = columns.column(probe.VALUE)
+    elements = [str(values[row] or '') for row in sorted(range(len(columns)), key=indexes.__getitem__)]
+    data_map = {
+        probe.REMOTE_PROBE: {
+            probe.UNITS_REMOTE: elements
+        }
+    }
+    return data_map
+
 
-    features.sort(key=sorter)
-    elements = []
-    for feat in features:
-        element = str(feat.attribute(probe.VALUE) or '')
-        assert type(element) is str
-        elements.append(element)
+def _probe_series_map(features: Rows) -> dict:
+    series = Columns.of(features, _PROBE_SERIES_FIELDS).column(probe.SERIES)
+    # a second series of the probe is not committed, it fails the unique name rule
+    elements = probe.unpack_units(series[0]) if series else []
     data_map = {
         probe.REMOTE_PROBE: {
             probe.UNITS_REMOTE: elements
@@ -237,25 +357,15 @@ def _probe_units_list_map(features: List[IFeature]) -> dict:
     return data_map
 
 
-def _shear_units_list_map(features: List[IFeature]) -> dict:
-    depths_set = {_round_depth(float(f.attribute(shear.SHEAR_DEPTH) or 0)) for f in features}
+def _shear_units_list_map(features: Rows) -> dict:
+    columns = Columns.of(features, _SHEAR_UNITS_FIELDS)
+    assert all(type(idx) is int for idx in columns.column(shear.INDEX))
+    assert all(type(t) is str for t in columns.column(shear.VALUE))
     shears = []
-
-    def sorter(feat: IFeature) -> int:
-        idx = feat.attribute(shear.INDEX)
-        assert type(idx) is int
-        return idx
-
-    for depth in depths_set:
-        assert type(depth) is float
-        depth_features = [f for f in features if f.attribute(shear.SHEAR_DEPTH) == depth]
-        depth_features.sort(key=sorter)
-        shears_torques = [f.attribute(shear.VALUE) for f in depth_features]
-        for t in shears_torques:
-            assert type(t) is str
+    for group in m_shears.groups_of_columns(columns):
         shear_map = {
-            shear.SHEAR_DEPTH_REMOTE: str(depth),
-            shear.TORQUES_REMOTE: shears_torques
+            shear.SHEAR_DEPTH_REMOTE: str(group.depth),
+            shear.TORQUES_REMOTE: group.torques
         }
         shears.append(shear_map)
     data_map = {
@@ -264,241 +374,188 @@ def _shear_units_list_map(features: List[IFeature]) -> dict:
     return data_map
 
 
-def _water_horizons_map(features: List[IFeature]) -> dict:
-    horizons_list = []
-    for feat in features:
-        horizon_value = str(feat.attribute(water.HORIZON))
-        assert type(horizon_value) is str
-        water_depth = str(_round_depth(float(feat.attribute(water.WATER_DEPTH) or 0)))
-        assert type(water_depth) is str
-        time = _make_time(feat)
-        horizons_list.append({
-            water.REMOTE_DATA: horizon_value,
-            water.WATER_DEPTH_REMOTE: water_depth,
-            water.TIME_REMOTE: time,
-        })
+def _water_horizons_map(features: Rows) -> dict:
     data_map = {
-        database.borehole.DRILLED_WATER_HORIZONS_REMOTE: horizons_list
+        database.borehole.DRILLED_WATER_HORIZONS_REMOTE: _encode_water_horizons(
+            Columns.of(features, _WATER_HORIZONS_FIELDS))
     }
     return data_map
 
 
-def _exudations_list(features: List[IFeature]) -> dict:
-    exudations_list = []
-    for feat in features:
-        exudation_type = str(feat.attribute(water.EXUDATION_TYPE) or '')
-        assert type(exudation_type) is str
-        depth_value = str(_round_depth(float(feat.attribute(water.EXUDATION_DEPTH) or 0)))
-        assert type(depth_value) is str
-        time = _make_time(feat)
-        exudations_list.append({
-            water.REMOTE_DATA: exudation_type,
-            water.WATER_DEPTH_REMOTE: depth_value,
-            water.TIME_REMOTE: time,
-        })
+def _exudations_list(features: Rows) -> dict:
     data_map = {
-        database.borehole.EXUDATIONS_REMOTE: exudations_list
+        database.borehole.EXUDATIONS_REMOTE: _encode_exudations(Columns.of(features, _EXUDATIONS_FIELDS))
     }
     return data_map
 
 
-def _layers_map(features: List[IFeature]) -> dict:
-    layers_list = []
-    for feat in features:
-        to = str(_round_depth(float(feat.attribute(layer.TO) or 0)))
-        assert type(to) is str
-        soil_type = feat.attribute(layer.TYPE) or ''
-        assert type(soil_type) is str
-        admixtures = feat.attribute(layer.ADMIXTURES) or ''
-        assert type(admixtures) is str
-        interbeddings = feat.attribute(layer.INTERBEDDINGS) or ''
-        assert type(interbeddings) is str
-        color = feat.attribute(layer.COLOR) or ''
-        assert type(color) is str
-        moisture = feat.attribute(layer.MOISTURE) or ''
-        assert type(moisture) is str
-        rolls_number = feat.attribute(layer.ROLLS_NUMBER) or ''
-        assert type(rolls_number) is str
-        soil_state = feat.attribute(layer.SOIL_STATE) or ''
-        assert type(soil_state) is str
-        sampling = str(feat.attribute(layer.SAMPLING) or '')
-        assert type(sampling) is str
-        description = feat.attribute(layer.DESCRIPTION) or ''
-        assert type(description) is str
-        layers_list.append({
-            layer.TO_REMOTE: to,
-            layer.TYPE_REMOTE: soil_type,
-            layer.ADMIXTURES_REMOTE: admixtures,
-            layer.INTERBEDDINGS_REMOTE: interbeddings,
-            layer.COLOR_REMOTE: color,
-            layer.MOISTURE_REMOTE: moisture,
-            layer.ROLLS_NUMBER_REMOTE: rolls_number,
-            layer.SOIL_STATE_REMOTE: soil_state,
-            layer.SAMPLING_REMOTE: sampling,
-            layer.DESCRIPTION_REMOTE: description,
-        })
+def _layers_map(features: Rows) -> dict:
+    columns = _sorted_by_depth(Columns.of(features, _LAYERS_FIELDS), layer.TO)
     data_map = {
-        database.borehole.LAYERS_REMOTE: layers_list
+        database.borehole.LAYERS_REMOTE: _encode_layers(columns)
     }
     return data_map
 
 
-def _todo_shears_list(features: List[IFeature]) -> dict:
-    todo_shears_list = []
-    for feat in features:
-        shear_depth = _round_depth(float(feat.attribute(shear.SHEAR_DEPTH) or 0))
-        assert type(shear_depth) is float
-        todo_shears_list.append(shear_depth)
+def _todo_shears_list(features: Rows) -> dict:
+    rows = _encode_todo_shears(Columns.of(features, _TODO_SHEARS_FIELDS))
     data_map = {
-        point.SHEARS_TODO_LIST_REMOTE: todo_shears_list
+        point.SHEARS_TODO_LIST_REMOTE: [row[shear.SHEAR_DEPTH_REMOTE] for row in rows]
     }
     return data_map
 
 
-def _points_map(features: List[IPointFeature]) -> dict:
+def _points_map(features: Rows) -> dict:
+    columns = Columns.of(features, _POINTS_FIELDS)
+    xy = columns.xy or [(0, 0)] * len(columns)
     data_map = {}
-    for feature in features:
-        borehole_depth: str = str(_round_depth(float(feature.attribute(point.BOREHOLE_DEPTH) or 0)))
-        assert type(borehole_depth) is str
-        probe_depth: str = str(_round_depth(float(feature.attribute(point.PROBE_DEPTH) or 0)))
-        assert type(probe_depth) is str
-        name = _make_name(feature)
-        height: str = str(_round_depth(float(feature.attribute(point.HEIGHT) or 0)))
-        assert type(height) is str
-        stakeout: bool = feature.attribute(point.STAKEOUT) or False
-        assert type(stakeout) is bool
-        creator: str = feature.attribute(point.CREATOR) or ''
-        assert type(creator) is str
-        height_system: str = feature.attribute(point.HEIGHT_SYSTEM) or ''
-        assert type(height_system) is str
-        borehole_state: str = feature.attribute(point.BOREHOLE_STATE) or ''
-        borehole_state = constants.STATUSES_REMOTE_TO_LOCAL.key(borehole_state)
-        assert type(borehole_state) is str
-        probe_state: str = feature.attribute(point.PROBE_STATE) or ''
-        probe_state = constants.STATUSES_REMOTE_TO_LOCAL.key(probe_state)
-        assert type(probe_state) is str
-        probe_type: str = feature.attribute(point.PROBE_TYPE) or ''
-        assert type(probe_type) is str
-        owner: str = feature.attribute(point.OWNER) or ''
-        assert type(owner) is str
-        contact: str = feature.attribute(point.CONTACT) or ''
-        assert type(contact) is str
-        assigned_performer: str = feature.attribute(point.ASSIGNED_PERFORMER) or ''
-        assert type(assigned_performer) is str
-        comments: str = feature.attribute(point.COMMENTS) or ''
-        assert type(comments) is str
-        time = _make_time(feature)
-        point_map = {
-            data.TIME_REMOTE: time,
-            data.NAME_REMOTE: name,
-            point.CREATOR_REMOTE: creator,
-            point.HEIGHT_REMOTE: height,
-            point.HEIGHT_SYSTEM_REMOTE: height_system,
-            point.BOREHOLE_STATE_REMOTE: borehole_state,
-            point.PROBE_STATE_REMOTE: probe_state,
-            point.BOREHOLE_DEPTH_REMOTE: borehole_depth,
-            point.PROBE_DEPTH_REMOTE: probe_depth,
-            point.STAKEOUT_REMOTE: stakeout,
-            point.PROBE_TYPE_REMOTE: probe_type,
-            point.OWNER_REMOTE: owner,
-            point.CONTACT_REMOTE: contact,
-            point.ASSIGNED_PERFORMER_REMOTE: assigned_performer,
-            point.COMMENTS_REMOTE: comments,
-        }
-        x, y = feature.xy()
+    for point_map, (x, y) in zip(_encode_points(columns), xy):
         point_map.update({
             point.POINT_X: x,
             point.POINT_Y: y
         })
-        data_map.update({name: point_map})
+        data_map.update({point_map[data.NAME_REMOTE]: point_map})
     return data_map
 
 
-def _boreholes_map(features: List[IFeature]) -> dict:
+def _boreholes_map(features: Rows) -> dict:
     data_map = {}
-    for feature in features:
-        name, borehole_map = _product_point_map(feature)
-        drill_type = str(feature.attribute(product_point.TYPE) or '')
-        assert type(drill_type) is str
-        borehole_map.update({
-            borehole.REMOTE_DRILL_TYPE: drill_type,
-        })
-        borehole_map = borehole.remote_transformation(borehole_map)
-        data_map.update({name: borehole_map})
+    for borehole_map in _encode_boreholes(Columns.of(features, _BOREHOLES_FIELDS)):
+        name = borehole_map[data.NAME_REMOTE]
+        data_map.update({name: borehole.remote_transformation(borehole_map)})
     return data_map
 
 
-def _probes_map(features: List[IFeature]) -> dict:
+def _probes_map(features: Rows) -> dict:
     data_map = {}
-    for feature in features:
-        name, probe_map = _product_point_map(feature)
-        drill_type = str(feature.attribute(product_point.TYPE) or '')
-        assert type(drill_type) is str
-        probe_type = str(feature.attribute(probe.PROBE_TYPE) or '')
-        assert type(probe_type) is str
-        interval = float(feature.attribute(probe.INTERVAL) or constants.DEFAULT_PROBE_INTERVAL)
-        assert type(interval) is float
-        probe_map.update({
-            probe.PROBE_TYPE_REMOTE: probe_type,
-            probe.INTERVAL_REMOTE: interval,
-        })
-        probe_map = probe.remote_transformation(probe_map)
-        data_map.update({name: probe_map})
+    for probe_map in _encode_probes(Columns.of(features, _PROBES_FIELDS)):
+        name = probe_map[data.NAME_REMOTE]
+        data_map.update({name: probe.remote_transformation(probe_map)})
     return data_map
 
 
-def _product_point_map(feature):
-    time = _make_time(feature)
-    name = _make_name(feature)
-    last_performer = str(feature.attribute(product_point.LAST_PERFORMER) or '')
-    assert type(last_performer) is str
-    location = str(feature.attribute(product_point.LOCATION) or '')
-    assert type(location) is str
-    vehicle_number = str(feature.attribute(product_point.VEHICLE_NUMBER) or '')
-    assert type(vehicle_number) is str
-    start_depth = _round_depth(float(feature.attribute(product_point.START_DEPTH) or 0))
-    assert type(start_depth) is float
-    point_map = {
-        data.TIME_REMOTE: time,
-        data.NAME_REMOTE: name,
-        product_point.LAST_PERFORMER_REMOTE: last_performer,
-        product_point.LOCATION_REMOTE: location,
-        product_point.VEHICLE_NUMBER_REMOTE: vehicle_number,
-        product_point.START_DEPTH_REMOTE: start_depth,
-    }
-    return name, point_map
-
-
-def _round_depth(depth: float):
-    return round(depth, 2)
-
+def _sorted_by_depth(columns: Columns, depth_field: str) -> Columns:
+    # rows added in the middle of the list get the last ids, so the list is ordered by depth
+    depths = [float(depth or 0) for depth in columns.column(depth_field)]
+    return columns.sorted_by(depths.__getitem__)
 
-def _make_name(feature):
-    name = str(feature.attribute(data.NAME))
-    assert type(name) is str
-    return name
 
-
-def _make_time(feature: IFeature) -> datetime.datetime:
-    time = feature.time() or datetime.datetime.utcnow()
-    assert isinstance(time, datetime.datetime)
-    return time
-
-
-def _team_map(features: List[IFeature]) -> dict:
+def _team_map(features: Rows) -> dict:
     data_map = {}
-    for feature in features:
-        time = _make_time(feature)
-        name = _make_name(feature)
-        time_map = {
-            data.TIME_REMOTE: time,
-            data.NAME_REMOTE: name,
-        }
+    for time_map in _encode_teams(Columns.of(features, _TEAMS_FIELDS)):
         # todo name key should be email, but it's not kept in feature
-        data_map.update({name: time_map})
+        data_map.update({time_map[data.NAME_REMOTE]: time_map})
     return data_map
 
 
+def _product_parents(map_key: str, *remote_names: str) -> Dict[str, str]:
+    names = [product_point.LOCATION_REMOTE, product_point.VEHICLE_NUMBER_REMOTE, product_point.START_DEPTH_REMOTE]
+    return {name: map_key for name in names + list(remote_names)}
+
+
+_decode_point = compile_decoder(_POINTS_SCHEMA)
+_decode_borehole = compile_decoder(_BOREHOLES_SCHEMA,
+                                   _product_parents(borehole.REMOTE_BOREHOLE, borehole.REMOTE_DRILL_TYPE))
+_decode_probe = compile_decoder(_PROBES_SCHEMA,
+                                _product_parents(probe.REMOTE_PROBE, probe.PROBE_TYPE_REMOTE, probe.INTERVAL_REMOTE))
+# sub-items are decoded to the local types of the fields, depths are numbers
+_decode_layer = compile_item_decoder(Schema.of(
+    layer.LOCAL_TO_REMOTE, {layer.TO: Encoding.DEPTH, layer.SAMPLING: Encoding.NUMBER},
+    defaults={**{name: '' for name in layer.LOCAL_TO_REMOTE.local_names()}, layer.SAMPLING: 0},
+    exclude=[data.NAME]))
+_WATER_DECODING = {water.WATER_DEPTH: Encoding.DEPTH, data.TIME: Encoding.TIME}
+_decode_drilled_water_horizon = compile_item_decoder(Schema.of(
+    water.DRILLED_WATER_LOCAL_TO_REMOTE, _WATER_DECODING, exclude=[data.NAME]))
+_decode_set_water_horizon = compile_item_decoder(Schema.of(
+    water.SET_WATER_LOCAL_TO_REMOTE, _WATER_DECODING, exclude=[data.NAME]),
+    {water.TIME_PERIOD_MIN: water.measurement_period_minutes})
+_decode_exudation = compile_item_decoder(Schema.of(
+    water.EXUDATION_LOCAL_TO_REMOTE, {water.EXUDATION_DEPTH: Encoding.DEPTH, data.TIME: Encoding.TIME},
+    exclude=[data.NAME]))
+_ProbeUnitRow = row_class(probe.probe_unit_local_names())
+_ShearUnitRow = row_class(shear.shear_unit_local_names())
+
+
+@dataclasses.dataclass(frozen=True)
+class PointRows:
+    name: str
+    point: PointRow
+    shears_todo: List[TodoShear]
+
+
+@dataclasses.dataclass(frozen=True)
+class BoreholeRows:
+    name: str
+    borehole: Row
+    persons: List[Person]
+    layers: List[ItemRow]
+    drilled_water_horizons: List[ItemRow]
+    set_water_horizons: List[ItemRow]
+    exudations: List[ItemRow]
+
+
+@dataclasses.dataclass(frozen=True)
+class ProbeRows:
+    name: str
+    probe: Row
+    persons: List[Person]
+    units: List[ItemRow]
+    shears: List[ItemRow]
+    # units packed for the probe series layer, then `units` are empty
+    series: Optional[ProbeSeries] = None
+
+
+def decode_point(doc_map: dict) -> Optional[PointRows]:
+    """Rows of the point document for the points and todo shears layers, None for documents without name"""
+    name = doc_map.get(data.NAME_REMOTE)
+    if not name:
+        return None
+    row = PointRow(_decode_point(doc_map), _POINTS_FIELDS, doc_map.get(point.POINT_X), doc_map.get(point.POINT_Y))
+    todo_shears = [TodoShear(name, float(depth)) for depth in doc_map.get(point.SHEARS_TODO_LIST_REMOTE, [])]
+    return PointRows(name, row, todo_shears)
+
+
+def decode_borehole(doc_map: dict) -> BoreholeRows:
+    name = doc_map.get(data.NAME_REMOTE)
+    return BoreholeRows(
+        name,
+        Row(_decode_borehole(doc_map), _BOREHOLES_FIELDS),
+        _decode_persons(name, doc_map.get(borehole.REMOTE_BOREHOLE) or {}),
+        [_decode_layer(name, layer_map) for layer_map in doc_map.get(borehole.LAYERS_REMOTE, [])],
+        [_decode_drilled_water_horizon(name, water_map)
+         for water_map in doc_map.get(borehole.DRILLED_WATER_HORIZONS_REMOTE, [])],
+        [_decode_set_water_horizon(name, water_map)
+         for water_map in doc_map.get(borehole.SET_WATER_HORIZONS_REMOTE, [])],
+        [_decode_exudation(name, exudation_map) for exudation_map in doc_map.get(borehole.EXUDATIONS_REMOTE, [])],
+    )
+
+
+def decode_probe(doc_map: dict, packed_units: bool = False) -> ProbeRows:
+    name = doc_map.get(data.NAME_REMOTE)
+    probe_map = doc_map.get(probe.REMOTE_PROBE) or {}
+    raw_units = probe_map.get(probe.UNITS_REMOTE, [])
+    shear_units = []
+    for shear_map in doc_map.get(probe.REMOTE_SHEARS, []):
+        depth = float(shear_map.get(shear.SHEAR_DEPTH_REMOTE, ''))
+        shear_units += [_ShearUnitRow((name, depth, idx, torque))
+                        for idx, torque in enumerate(shear_map.get(shear.TORQUES_REMOTE))]
+    return ProbeRows(
+        name,
+        Row(_decode_probe(doc_map), _PROBES_FIELDS),
+        _decode_persons(name, probe_map),
+        [] if packed_units else [_ProbeUnitRow((name, idx, value)) for idx, value in enumerate(raw_units)],
+        shear_units,
+        ProbeSeries(name, probe.pack_units(raw_units)) if packed_units else None,
+    )
+
+
+def _decode_persons(name: str, point_map: dict) -> List[Person]:
+    raw_persons = point_map.get(data.REMOTE_PERSONS, [])
+    if type(raw_persons) == str:
+        raw_persons = [raw_persons]
+    return [Person(name, person_name) for person_name in raw_persons]
+
+
 def name_to_file_name(name: str) -> str:
     return name.replace("/", "__")
 
@@ -508,8 +565,10 @@ def file_name_to_name(name: str) -> str:
 
 
 class Project:
-    def __init__(self, name: str, projects_dir: str, **layers):
+    def __init__(self, name: str, projects_dir: str, packed_probe_units: bool = False, **layers):
         self._name: str = name
+        # units of every probe are kept in one feature of the probe series layer
+        self._packed_probe_units = packed_probe_units
         self._dir: str = projects_dir
         self._gpkg_file_path: str = os.path.join(self.dir, f'{name_to_file_name(name)}.gpkg')
         self.set_layers(**layers)
@@ -523,9 +582,11 @@ class Project:
             SET_WATER_LAYER_STR,
             EXUDATIONS_LAYER_STR,
             PROBES_LAYER_STR,
-            PROBE_UNITS_LAYER_STR,
+            PROBE_SERIES_LAYER_STR if packed_probe_units else PROBE_UNITS_LAYER_STR,
             PROBE_PERSONS_LAYER_STR,
+            PROBE_ANALYSIS_LAYER_STR,
             SHEAR_UNITS_LAYER_STR,
+            SHEAR_SUMMARY_LAYER_STR,
             TEAMS_LAYER_STR,
         ]
 
@@ -537,6 +598,10 @@ class Project:
     def name(self):
         return self._name
 
+    @property
+    def packed_probe_units(self) -> bool:
+        return self._packed_probe_units
+
     @property
     def dir(self):
         return self._dir
@@ -560,7 +625,10 @@ class Project:
             self.points_layer.can_make_timestamp_on_added = True
             self.points_layer.database_ref_path = points_ref
             self.points_layer.features_to_remote = _points_map
+            self.points_layer.remote_fields = _POINTS_FIELDS
             self.points_layer.local_to_remote = point.LOCAL_TO_REMOTE
+            self.points_layer.spatial_index = m_spatial.GridIndex()
+            self.points_layer.spatial_tag_field = m_spatial.POINTS_TAG_FIELD
 
         self.boreholes_layer: IMapLayer = layers.get(BOREHOLES_LAYER_STR)
         if self.boreholes_layer:
@@ -568,6 +636,7 @@ class Project:
             self.boreholes_layer.can_make_timestamp_on_added = True
             self.boreholes_layer.database_ref_path = boreholes_ref
             self.boreholes_layer.features_to_remote = _boreholes_map
+            self.boreholes_layer.remote_fields = _BOREHOLES_FIELDS
             self.boreholes_layer.remote_transformation = borehole.remote_transformation
             self.boreholes_layer.local_to_remote = borehole.LOCAL_TO_REMOTE
 
@@ -577,6 +646,7 @@ class Project:
             self.probes_layer.can_make_timestamp_on_added = True
             self.probes_layer.database_ref_path = probes_ref
             self.probes_layer.features_to_remote = _probes_map
+            self.probes_layer.remote_fields = _PROBES_FIELDS
             self.probes_layer.remote_transformation = probe.remote_transformation
             self.probes_layer.local_to_remote = probe.LOCAL_TO_REMOTE
 
@@ -585,65 +655,116 @@ class Project:
             self.borehole_persons_layer.name = BOREHOLE_PERSONS_LAYER_STR
             self.borehole_persons_layer.database_ref_path = boreholes_ref
             self.borehole_persons_layer.features_to_remote = _persons_list_map
+            self.borehole_persons_layer.remote_fields = _PERSONS_FIELDS
 
         self.shears_todo_layer: IMapLayer = layers.get(SHEARS_TODO_LAYER_STR)
         if self.shears_todo_layer:
             self.shears_todo_layer.name = SHEARS_TODO_LAYER_STR
             self.shears_todo_layer.database_ref_path = points_ref
             self.shears_todo_layer.features_to_remote = _todo_shears_list
+            self.shears_todo_layer.remote_fields = _TODO_SHEARS_FIELDS
+            self.shears_todo_layer.key_positions = (1,)
 
         self.layers_layer: IMapLayer = layers.get(LAYERS_LAYER_STR)
         if self.layers_layer:
             self.layers_layer.name = LAYERS_LAYER_STR
             self.layers_layer.database_ref_path = boreholes_ref
             self.layers_layer.features_to_remote = _layers_map
+            self.layers_layer.remote_fields = _LAYERS_FIELDS
+            # the same order as of the sent list, see `_layers_map`
+            self.layers_layer.order_field = layer.TO
 
         self.drilled_water_horizons_layer: IMapLayer = layers.get(DRILLED_WATER_LAYER_STR)
         if self.drilled_water_horizons_layer:
             self.drilled_water_horizons_layer.name = DRILLED_WATER_LAYER_STR
             self.drilled_water_horizons_layer.database_ref_path = boreholes_ref
             self.drilled_water_horizons_layer.features_to_remote = _water_horizons_map
+            self.drilled_water_horizons_layer.remote_fields = _WATER_HORIZONS_FIELDS
+            self.drilled_water_horizons_layer.pairs_by_position = True
 
         self.set_water_horizons_layer: IMapLayer = layers.get(SET_WATER_LAYER_STR)
         if self.set_water_horizons_layer:
             self.set_water_horizons_layer.name = SET_WATER_LAYER_STR
             self.set_water_horizons_layer.database_ref_path = boreholes_ref
             self.set_water_horizons_layer.features_to_remote = _water_horizons_map
+            self.set_water_horizons_layer.remote_fields = _WATER_HORIZONS_FIELDS
+            self.set_water_horizons_layer.pairs_by_position = True
 
         self.exudations_layer: IMapLayer = layers.get(EXUDATIONS_LAYER_STR)
         if self.exudations_layer:
             self.exudations_layer.name = EXUDATIONS_LAYER_STR
             self.exudations_layer.database_ref_path = boreholes_ref
             self.exudations_layer.features_to_remote = _exudations_list
+            self.exudations_layer.remote_fields = _EXUDATIONS_FIELDS
+            self.exudations_layer.pairs_by_position = True
 
         self.probe_persons_layer: IMapLayer = layers.get(PROBE_PERSONS_LAYER_STR)
         if self.probe_persons_layer:
             self.probe_persons_layer.name = PROBE_PERSONS_LAYER_STR
             self.probe_persons_layer.database_ref_path = probes_ref
             self.probe_persons_layer.features_to_remote = _persons_list_map
+            self.probe_persons_layer.remote_fields = _PERSONS_FIELDS
 
         self.probe_units_layer: IMapLayer = layers.get(PROBE_UNITS_LAYER_STR)
         if self.probe_units_layer:
             self.probe_units_layer.name = PROBE_UNITS_LAYER_STR
             self.probe_units_layer.database_ref_path = probes_ref
             self.probe_units_layer.features_to_remote = _probe_units_list_map
+            self.probe_units_layer.remote_fields = _PROBE_UNITS_FIELDS
+            self.probe_units_layer.key_positions = (1,)
+
+        self.probe_series_layer: IMapLayer = layers.get(PROBE_SERIES_LAYER_STR)
+        if self.probe_series_layer:
+            self.probe_series_layer.name = PROBE_SERIES_LAYER_STR
+            self.probe_series_layer.database_ref_path = probes_ref
+            self.probe_series_layer.features_to_remote = _probe_series_map
+            self.probe_series_layer.remote_fields = _PROBE_SERIES_FIELDS
+
+        # derived from probe snapshots, local changes are not sent
+        self.probe_analysis_layer: IMapLayer = layers.get(PROBE_ANALYSIS_LAYER_STR)
+        if self.probe_analysis_layer:
+            self.probe_analysis_layer.name = PROBE_ANALYSIS_LAYER_STR
 
         self.shear_units_layer: IMapLayer = layers.get(SHEAR_UNITS_LAYER_STR)
         if self.shear_units_layer:
             self.shear_units_layer.name = SHEAR_UNITS_LAYER_STR
             self.shear_units_layer.database_ref_path = probes_ref
             self.shear_units_layer.features_to_remote = _shear_units_list_map
+            self.shear_units_layer.remote_fields = _SHEAR_UNITS_FIELDS
+            self.shear_units_layer.key_positions = (1, 2)
+
+        # derived from shear units, local changes are not sent
+        self.shear_summary_layer: IMapLayer = layers.get(SHEAR_SUMMARY_LAYER_STR)
+        if self.shear_summary_layer:
+            self.shear_summary_layer.name = SHEAR_SUMMARY_LAYER_STR
+            self.shear_summary_layer.key_positions = (1,)
 
         self.teams_layer: IMapLayer = layers.get(TEAMS_LAYER_STR)
         if self.teams_layer:
             self.teams_layer.name = TEAMS_LAYER_STR
             self.teams_layer.database_ref_path = teams_ref
             self.teams_layer.features_to_remote = _team_map
+            self.teams_layer.remote_fields = _TEAMS_FIELDS
+            self.teams_layer.spatial_index = m_spatial.GridIndex()
+            self.teams_layer.time_is_content = True
 
     def reset(self):
-        [layer.delete_all_features() for layer in self.layers]
+        for layer in self.layers:
+            layer.delete_all_features()
+            layer.clear_indexes()
 
     def layer_by_id(self, layer_id: str) -> 'IMapLayer':
         layers = [l for l in self.layers if l.id() == layer_id]
         assert len(layers) == 1
         return layers[0]
+
+    def nearest_unassigned_points(self, team_name: str, number: int) -> List[str]:
+        """Names of points without a performer nearest to the team, read from the spatial indexes"""
+        if not (self.points_layer and self.teams_layer):
+            return []
+        return m_spatial.nearest_unassigned_points(self.points_layer, self.teams_layer, team_name, number)
+
+    def points_within(self, team_name: str, radius: float) -> List[str]:
+        if not (self.points_layer and self.teams_layer):
+            return []
+        return m_spatial.points_within(self.points_layer, self.teams_layer, team_name, radius)
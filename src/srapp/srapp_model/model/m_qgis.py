@@ -11,3 +11,13 @@ class IQgis(Generic[T]):
     @abc.abstractmethod
     def try_refresh(self) -> bool:
         pass
+
+    @abc.abstractmethod
+    def run_on_main_thread(self, func: Callable[[], None]):
+        """Calls the function in the next iteration of the main thread event loop"""
+        pass
+
+    @abc.abstractmethod
+    def call_later(self, seconds: float, func: Callable[[], None]):
+        """Calls the function on the main thread after the time"""
+        pass
@@ -0,0 +1,242 @@
+import dataclasses
+import datetime
+import enum
+import functools
+from typing import *
+
+from database import constants, data
+from database.data import Data, PointData
+from model import LocalToRemote
+from model.m_columns import Columns
+
+
+class Encoding(enum.Enum):
+    # text, empty for missing values
+    TEXT = 1
+    # text of any value
+    STR = 2
+    # depth rounded to centimetres
+    DEPTH = 3
+    # text of the depth rounded to centimetres
+    DEPTH_TEXT = 4
+    # number, the default of the field for missing values
+    FLOAT = 5
+    BOOL = 6
+    # time of the change, now for missing values
+    TIME = 7
+    # remote name of the local status
+    STATUS = 8
+    # number, None for values which are not numbers
+    NUMBER = 9
+
+
+@dataclasses.dataclass(frozen=True)
+class FieldSpec:
+    local_name: str
+    remote_name: str
+    encoding: Encoding = Encoding.TEXT
+    default: Any = None
+
+
+@dataclasses.dataclass(frozen=True)
+class Schema:
+    """Fields of a layer sent to the database, in order of the remote document"""
+    fields: Tuple[FieldSpec, ...]
+
+    def local_names(self) -> List[str]:
+        return [field.local_name for field in self.fields]
+
+    def with_fields(self, *fields: FieldSpec) -> 'Schema':
+        return Schema(self.fields + fields)
+
+    @staticmethod
+    def of(local_to_remote: LocalToRemote[str, str], encodings: Dict[str, Encoding] = None,
+           defaults: Dict[str, Any] = None, exclude: Iterable[str] = ()) -> 'Schema':
+        """Schema of the fields of the table, fields without remote names are not sent"""
+        encodings = encodings or {}
+        defaults = defaults or {}
+        exclude = set(exclude)
+        return Schema(tuple(
+            FieldSpec(local_name, remote_name, encodings.get(local_name, Encoding.TEXT), defaults.get(local_name))
+            for local_name, remote_name in local_to_remote.items()
+            if remote_name and local_name not in exclude))
+
+
+Encoder = Callable[[Columns], List[dict]]
+
+_STATUS_TO_REMOTE = {local: remote for remote, local in constants.STATUSES_REMOTE_TO_LOCAL.items()}
+
+
+def _round_depth(depth: float):
+    return round(depth, 2)
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _converter(field: FieldSpec) -> Callable[[Any], Any]:
+    encoding = field.encoding
+    if encoding == Encoding.TEXT:
+        return lambda value: str(value or '')
+    elif encoding == Encoding.STR:
+        return str
+    elif encoding == Encoding.DEPTH:
+        return lambda value: _round_depth(float(value or 0))
+    elif encoding == Encoding.DEPTH_TEXT:
+        return lambda value: str(_round_depth(float(value or 0)))
+    elif encoding == Encoding.FLOAT:
+        default = field.default or 0
+        return lambda value: float(value or default)
+    elif encoding == Encoding.BOOL:
+        return lambda value: bool(value or False)
+    elif encoding == Encoding.TIME:
+        return lambda value: value or datetime.datetime.utcnow()
+    elif encoding == Encoding.STATUS:
+        return lambda value: _STATUS_TO_REMOTE.get(value or '')
+    elif encoding == Encoding.NUMBER:
+        return _number
+    raise ValueError(f'Unknown encoding {encoding}')
+
+
+def compile_encoder(schema: Schema) -> Encoder:
+    """Function making remote maps of rows of the columns, converters of the fields are chosen once"""
+    fields = [(field.local_name, field.remote_name, _converter(field)) for field in schema.fields]
+
+    def encode(columns: Columns) -> List[dict]:
+        encoded = [(remote_name, list(map(convert, columns.column(local_name))))
+                   for local_name, remote_name, convert in fields]
+        return [{remote_name: values[row] for remote_name, values in encoded} for row in range(len(columns))]
+
+    return encode
+
+
+class Row(Data):
+    """Attributes of a feature decoded from a document, in order of the layer fields"""
+    __slots__ = ('values', 'names')
+
+    def __init__(self, values: list, names: List[str]):
+        object.__setattr__(self, 'values', values)
+        object.__setattr__(self, 'names', names)
+
+    def attrs(self) -> list:
+        return list(self.values)
+
+    def fields_names(self) -> List[str]:
+        return self.names
+
+    def local_to_remote(self) -> LocalToRemote[str, str]:
+        pass
+
+    def __eq__(self, other):
+        if isinstance(other, Row):
+            return self.values == other.values and self.names == other.names
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self.values))
+
+
+class PointRow(Row, PointData):
+
+    def __init__(self, values: list, names: List[str], x: float, y: float):
+        super().__init__(values, names)
+        object.__setattr__(self, 'x', x)
+        object.__setattr__(self, 'y', y)
+
+
+Decoder = Callable[[dict], list]
+
+# sub-items written with their document share its time, so the slow conversions repeat
+_remote_time_to_local = functools.lru_cache(maxsize=1024)(Data.remote_time_to_local)
+
+
+def _decoder(field: FieldSpec) -> Optional[Callable[[Any], Any]]:
+    """Conversion of the remote value to the local one, None for values kept as they are"""
+    encoding = field.encoding
+    if encoding == Encoding.TIME:
+        return _remote_time_to_local
+    elif encoding == Encoding.STATUS:
+        return constants.STATUSES_REMOTE_TO_LOCAL.get
+    elif encoding in (Encoding.DEPTH, Encoding.FLOAT):
+        return lambda value: float(value or 0)
+    elif encoding == Encoding.NUMBER:
+        return _number
+    return None
+
+
+def _decoded_default(field: FieldSpec) -> Any:
+    # missing depths and floats are read as 0, the default of the field is only sent for them
+    if field.encoding in (Encoding.DEPTH, Encoding.FLOAT):
+        return None
+    return field.default
+
+
+def compile_decoder(schema: Schema, parents: Dict[str, str] = None) -> Decoder:
+    """Function making attributes of the schema fields from a document.
+
+    `parents` are keys of nested maps of the document keeping the fields with the remote names.
+    Missing fields get their defaults, like `dict.get` with the default in the parsers.
+    """
+    parents = parents or {}
+    parent_keys = tuple(dict.fromkeys(parents.values()))
+    # position 0 is the document, next positions are its nested maps
+    fields = tuple((parent_keys.index(parents[field.remote_name]) + 1 if field.remote_name in parents else 0,
+                    field.remote_name, _decoded_default(field), _decoder(field)) for field in schema.fields)
+
+    def decode(doc_map: dict) -> list:
+        maps = [doc_map]
+        if parent_keys:
+            maps += [doc_map.get(key) or {} for key in parent_keys]
+        return [convert(maps[map_idx].get(remote_name, default)) if convert
+                else maps[map_idx].get(remote_name, default)
+                for map_idx, remote_name, default, convert in fields]
+
+    return decode
+
+
+class ItemRow(tuple, Data):
+    """Attributes of a sub-item decoded from a document, a tuple takes less memory than a record with slots"""
+    __slots__ = ()
+    # local names of the fields, set by the classes made by `row_class`
+    names: List[str] = []
+    # values are set by the tuple, not by the initializer of the record
+    __init__ = object.__init__
+
+    def attrs(self) -> list:
+        return list(self)
+
+    def fields_names(self) -> List[str]:
+        return self.names
+
+    def local_to_remote(self) -> LocalToRemote[str, str]:
+        pass
+
+
+def row_class(names: List[str]) -> Type[ItemRow]:
+    """Class of rows of sub-items with the fields of the names"""
+    return type('ItemRow', (ItemRow,), {'__slots__': (), 'names': names})
+
+
+ItemDecoder = Callable[[str, dict], ItemRow]
+
+
+def compile_item_decoder(schema: Schema, computed: Dict[str, Callable[[dict], Any]] = None) -> ItemDecoder:
+    """Function making a row of the sub-item map of the named document, the name is the first field.
+
+    `computed` fields follow the schema fields, their values are made of the whole sub-item map.
+    """
+    computed = computed or {}
+    row_type = row_class([data.NAME] + schema.local_names() + list(computed))
+    decode = compile_decoder(schema)
+    makers = tuple(computed.values())
+
+    def decode_item(name: str, item_map: dict) -> ItemRow:
+        if makers:
+            return row_type((name, *decode(item_map), *[make(item_map) for make in makers]))
+        return row_type((name, *decode(item_map)))
+
+    return decode_item
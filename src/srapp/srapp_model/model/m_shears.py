@@ -0,0 +1,116 @@
+import dataclasses
+import math
+from typing import *
+
+from database import constants, data, shear
+from database.data import Data
+from model.m_columns import Columns
+
+PEAK = 'maksimum'
+RESIDUAL = 'rezydualny'
+COUNT = 'liczba'
+IS_COMPLETE = 'kompletne'
+
+# fields of the shear units layer read to group the units
+SHEAR_UNIT_FIELDS = [data.NAME, shear.SHEAR_DEPTH, shear.INDEX, shear.VALUE]
+
+
+def shear_summary_local_names() -> List[str]:
+    return [
+        data.NAME,
+        shear.SHEAR_DEPTH,
+        PEAK,
+        RESIDUAL,
+        COUNT,
+        IS_COMPLETE,
+    ]
+
+
+GroupKey = Tuple[str, float]
+
+
+def group_key(name: str, depth: Any) -> GroupKey:
+    """Units of the same point and depth rounded to centimetres make one shear"""
+    return name, round(float(depth or 0), 2)
+
+
+@dataclasses.dataclass(frozen=True)
+class ShearGroup:
+    name: str
+    depth: float
+    # in order of indexes of the units
+    torques: List[Any]
+
+
+def group_shears(names: Iterable[str], depths: Iterable[Any], indexes: List[Any], torques: List[Any]) \
+        -> List[ShearGroup]:
+    """Groups of units in one pass, in order of the first unit of every group"""
+    key_to_rows: Dict[GroupKey, List[int]] = dict()
+    for row, (name, depth) in enumerate(zip(names, depths)):
+        key_to_rows.setdefault(group_key(name, depth), []).append(row)
+    groups = []
+    for (name, depth), rows in key_to_rows.items():
+        rows.sort(key=indexes.__getitem__)
+        groups.append(ShearGroup(name, depth, [torques[row] for row in rows]))
+    return groups
+
+
+def groups_of_columns(columns: Columns) -> List[ShearGroup]:
+    return group_shears(columns.column(data.NAME), columns.column(shear.SHEAR_DEPTH),
+                        columns.column(shear.INDEX), columns.column(shear.VALUE))
+
+
+def groups_of_units(units: List[Data]) -> List[ShearGroup]:
+    # records and decoded rows of units list their attributes in order of SHEAR_UNIT_FIELDS
+    names, depths, indexes, torques = zip(*(unit.attrs() for unit in units)) if units else ([], [], [], [])
+    return group_shears(names, depths, indexes, torques)
+
+
+@dataclasses.dataclass(frozen=True)
+class ShearSummary(Data):
+    """Statistics of the torques of one shear"""
+    __slots__ = ('name', 'depth', 'peak', 'residual', 'count', 'is_complete')
+    name: str
+    depth: float
+    peak: Optional[float]
+    # the last reading of the series, after the soil is sheared
+    residual: Optional[float]
+    count: int
+    is_complete: bool
+
+    def attrs(self) -> list:
+        return [
+            self.name,
+            self.depth,
+            self.peak,
+            self.residual,
+            self.count,
+            self.is_complete,
+        ]
+
+    def fields_names(self) -> List[str]:
+        return shear_summary_local_names()
+
+
+def summarize(group: ShearGroup) -> ShearSummary:
+    numbers = [number for number in map(_number, group.torques) if number is not None]
+    return ShearSummary(
+        group.name,
+        group.depth,
+        max(numbers) if numbers else None,
+        numbers[-1] if numbers else None,
+        len(group.torques),
+        len(group.torques) == constants.SHEARS_SIZE,
+    )
+
+
+def summaries(groups: List[ShearGroup]) -> List[ShearSummary]:
+    return [summarize(group) for group in groups]
+
+
+def _number(torque: Any) -> Optional[float]:
+    try:
+        number = float(torque)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
@@ -0,0 +1,190 @@
+import heapq
+import math
+from typing import *
+
+from database import point
+
+# side of a cell in units of the layer coordinates, metres in the national grids
+DEFAULT_CELL_SIZE = 100.0
+# value of the points kept in their index to find unassigned points
+POINTS_TAG_FIELD = point.ASSIGNED_PERFORMER
+
+Cell = Tuple[int, int]
+
+
+class GridIndex:
+    """Positions of features in square cells, queries visit only the cells around the searched place.
+
+    Every position keeps a tag, a value of the feature used to filter the results without reading the layer.
+    """
+
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE):
+        self._cell_size = cell_size
+        self._cells: Dict[Cell, Set[int]] = dict()
+        self._fid_to_xy: Dict[int, Tuple[float, float]] = dict()
+        self._fid_to_tag: Dict[int, Any] = dict()
+        # bounds of the used cells, not shrunk on removal
+        self._min_cell: Optional[Cell] = None
+        self._max_cell: Optional[Cell] = None
+        # work of all queries, cells looked up and positions compared with the searched places
+        self.visited_cells = 0
+        self.checked_positions = 0
+
+    def __len__(self):
+        return len(self._fid_to_xy)
+
+    def __contains__(self, fid: int):
+        return fid in self._fid_to_xy
+
+    def xy(self, fid: int) -> Optional[Tuple[float, float]]:
+        return self._fid_to_xy.get(fid)
+
+    def tag(self, fid: int) -> Any:
+        return self._fid_to_tag.get(fid)
+
+    def insert(self, fid: int, x: float, y: float, tag: Any = None):
+        """Adds the position or moves the indexed feature"""
+        self.remove(fid)
+        if x is None or y is None:
+            return
+        cell = self._cell(x, y)
+        self._cells.setdefault(cell, set()).add(fid)
+        self._fid_to_xy[fid] = (x, y)
+        self._fid_to_tag[fid] = tag
+        if self._min_cell is None:
+            self._min_cell = self._max_cell = cell
+        else:
+            self._min_cell = (min(self._min_cell[0], cell[0]), min(self._min_cell[1], cell[1]))
+            self._max_cell = (max(self._max_cell[0], cell[0]), max(self._max_cell[1], cell[1]))
+
+    def set_tag(self, fid: int, tag: Any):
+        if fid in self._fid_to_xy:
+            self._fid_to_tag[fid] = tag
+
+    def remove(self, fid: int):
+        xy = self._fid_to_xy.pop(fid, None)
+        if xy is None:
+            return
+        self._fid_to_tag.pop(fid, None)
+        cell = self._cell(*xy)
+        fids = self._cells[cell]
+        fids.discard(fid)
+        if not fids:
+            del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._fid_to_xy.clear()
+        self._fid_to_tag.clear()
+        self._min_cell = self._max_cell = None
+
+    def within(self, x: float, y: float, radius: float, accept: Callable[[Any], bool] = None) -> List[int]:
+        """Ids of features not farther than the radius, nearest first"""
+        cx, cy = self._cell(x, y)
+        reach = int(math.ceil(radius / self._cell_size))
+        squared_radius = radius * radius
+        found = []
+        self.visited_cells += (2 * reach + 1) ** 2
+        for i in range(cx - reach, cx + reach + 1):
+            for j in range(cy - reach, cy + reach + 1):
+                fids = self._cells.get((i, j), ())
+                self.checked_positions += len(fids)
+                for fid in fids:
+                    distance = self._squared_distance(fid, x, y)
+                    if distance <= squared_radius and (accept is None or accept(self._fid_to_tag[fid])):
+                        found.append((distance, fid))
+        found.sort()
+        return [fid for _, fid in found]
+
+    def nearest(self, x: float, y: float, number: int, accept: Callable[[Any], bool] = None) -> List[int]:
+        """Ids of the nearest features, nearest first. Rings of cells around the place are visited until the
+        unvisited cells are farther than the found features. When a ring has more cells than there are used cells
+        left, e.g. on the way to a distant feature, the left cells are checked at once"""
+        if number <= 0 or not self._cells:
+            return []
+        cx, cy = self._cell(x, y)
+        last_ring = max(abs(cx - self._min_cell[0]), abs(cx - self._max_cell[0]),
+                        abs(cy - self._min_cell[1]), abs(cy - self._max_cell[1]))
+        # max heap of the nearest found features by negated distances
+        found: List[Tuple[float, int]] = []
+        visited_cells = 0
+        for ring in range(last_ring + 1):
+            if 8 * ring > len(self._cells) - visited_cells:
+                self.visited_cells += len(self._cells)
+                for (i, j), fids in self._cells.items():
+                    if max(abs(i - cx), abs(j - cy)) >= ring:
+                        self._visit(fids, x, y, number, accept, found)
+                break
+            self.visited_cells += 8 * ring or 1
+            for cell in _ring_cells(cx, cy, ring):
+                fids = self._cells.get(cell)
+                if fids:
+                    visited_cells += 1
+                    self._visit(fids, x, y, number, accept, found)
+            if visited_cells == len(self._cells):
+                break
+            # features of the next rings are at least this far
+            unvisited_distance = ring * self._cell_size
+            if len(found) == number and -found[0][0] <= unvisited_distance * unvisited_distance:
+                break
+        return [fid for _, fid in sorted((-distance, fid) for distance, fid in found)]
+
+    def _visit(self, fids: Collection[int], x: float, y: float, number: int, accept: Optional[Callable[[Any], bool]],
+               found: List[Tuple[float, int]]):
+        self.checked_positions += len(fids)
+        for fid in fids:
+            if accept is not None and not accept(self._fid_to_tag[fid]):
+                continue
+            distance = self._squared_distance(fid, x, y)
+            if len(found) < number:
+                heapq.heappush(found, (-distance, fid))
+            elif distance < -found[0][0]:
+                heapq.heapreplace(found, (-distance, fid))
+
+    def _cell(self, x: float, y: float) -> Cell:
+        return int(math.floor(x / self._cell_size)), int(math.floor(y / self._cell_size))
+
+    def _squared_distance(self, fid: int, x: float, y: float) -> float:
+        fx, fy = self._fid_to_xy[fid]
+        return (fx - x) ** 2 + (fy - y) ** 2
+
+
+def _ring_cells(cx: int, cy: int, ring: int) -> Iterator[Cell]:
+    if ring == 0:
+        yield cx, cy
+        return
+    for i in range(cx - ring, cx + ring + 1):
+        yield i, cy - ring
+        yield i, cy + ring
+    for j in range(cy - ring + 1, cy + ring):
+        yield cx - ring, j
+        yield cx + ring, j
+
+
+def _is_unassigned(performer: Any) -> bool:
+    return not performer
+
+
+def _team_xy(teams_layer: 'IMapLayer', team_name: str) -> Optional[Tuple[float, float]]:
+    fids = teams_layer.name_to_fids.get(team_name)
+    if not fids or teams_layer.spatial_index is None:
+        return None
+    return teams_layer.spatial_index.xy(fids[0])
+
+
+def nearest_unassigned_points(points_layer: 'IMapLayer', teams_layer: 'IMapLayer', team_name: str,
+                              number: int) -> List[str]:
+    """Names of the nearest points without an assigned performer, nearest first"""
+    xy = _team_xy(teams_layer, team_name)
+    if xy is None or points_layer.spatial_index is None:
+        return []
+    fids = points_layer.spatial_index.nearest(*xy, number, _is_unassigned)
+    return [points_layer.fid_to_name.get(fid) for fid in fids]
+
+
+def points_within(points_layer: 'IMapLayer', teams_layer: 'IMapLayer', team_name: str, radius: float) -> List[str]:
+    """Names of the points not farther from the team than the radius, nearest first"""
+    xy = _team_xy(teams_layer, team_name)
+    if xy is None or points_layer.spatial_index is None:
+        return []
+    return [points_layer.fid_to_name.get(fid) for fid in points_layer.spatial_index.within(*xy, radius)]
@@ -1,5 +1,7 @@
+from typing import *
+
 from google.cloud import firestore_v1
-from google.cloud.firestore_v1 import DocumentReference, CollectionReference
+from google.cloud.firestore_v1 import DocumentReference, CollectionReference, WriteBatch, DocumentSnapshot
 
 from database import constants
 
@@ -42,6 +44,16 @@ class User:
     def crs_ref(self, project_name) -> DocumentReference:
         return self.project_ref(project_name).collection(PROPERTIES_REMOTE).document(CRS_REMOTE)
 
+    def document_ref(self, path: str) -> DocumentReference:
+        return self.client.document(path)
+
+    def batch(self) -> WriteBatch:
+        return self.client.batch()
+
+    def get_all(self, refs: List[DocumentReference]) -> Iterable[DocumentSnapshot]:
+        """Reads the documents in one round trip to the database"""
+        return self.client.get_all(refs)
+
 
 def make_valid_id(id: str) -> str:
     return id.replace('/', '**')
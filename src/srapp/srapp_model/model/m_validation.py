@@ -0,0 +1,200 @@
+from collections import Counter
+from typing import *
+
+from database import constants, data, probe, shear
+from model.m_columns import Columns
+from model.m_config import LAYER_NAME_TO_FIELDS_CONSTRAINTS
+from model import m_shears
+from model.m_field import FieldConstraint
+
+
+class Rule:
+    """Constraint of one field of the layer, `idx` is the position of the field in the feature attributes"""
+
+    def __init__(self, idx: int, field_names: List[str]):
+        self.idx = idx
+        self.field_name = field_names[idx]
+
+    def fields(self) -> List[str]:
+        return [self.field_name]
+
+    def reset(self, columns: Columns):
+        pass
+
+    def index(self, fid: int, attributes: list):
+        pass
+
+    def unindex(self, fid: int):
+        pass
+
+    def messages(self, columns: Columns) -> List[str]:
+        pass
+
+
+class NotNullRule(Rule):
+
+    def messages(self, columns: Columns) -> List[str]:
+        return [f'Pusta wartość pola "{self.field_name}" w wierszu numer {fid}'
+                for fid, attr in zip(columns.fids, columns.column(self.field_name)) if not attr]
+
+
+class UniqueRule(Rule):
+    """Keeps the number of features of every value of the field"""
+
+    def __init__(self, idx: int, field_names: List[str]):
+        super().__init__(idx, field_names)
+        self._fid_to_value: Dict[int, Any] = dict()
+        self._value_counts: Counter = Counter()
+
+    def reset(self, columns: Columns):
+        self._fid_to_value = dict(zip(columns.fids, columns.column(self.field_name)))
+        self._value_counts = Counter(self._fid_to_value.values())
+
+    def index(self, fid: int, attributes: list):
+        self.unindex(fid)
+        value = attributes[self.idx]
+        self._fid_to_value[fid] = value
+        self._value_counts[value] += 1
+
+    def unindex(self, fid: int):
+        if fid not in self._fid_to_value:
+            return
+        value = self._fid_to_value.pop(fid)
+        self._value_counts[value] -= 1
+        if not self._value_counts[value]:
+            del self._value_counts[value]
+
+    def messages(self, columns: Columns) -> List[str]:
+        return [f'Nieunikalna wartość pola "{self.field_name}" w wierszu numer {fid}'
+                for fid, attr in zip(columns.fids, columns.column(self.field_name)) if self._value_counts[attr] > 1]
+
+
+class ValueInRule(Rule):
+
+    def __init__(self, idx: int, field_names: List[str], allowed: Collection, message: str,
+                 is_empty_allowed: bool = False, as_text: bool = False):
+        super().__init__(idx, field_names)
+        self._allowed = allowed
+        self._message = message
+        self._is_empty_allowed = is_empty_allowed
+        self._as_text = as_text
+
+    def messages(self, columns: Columns) -> List[str]:
+        messages = []
+        for fid, attr in zip(columns.fids, columns.column(self.field_name)):
+            if self._as_text:
+                attr = str(attr)
+            if self._is_empty_allowed and not attr:
+                continue
+            if attr not in self._allowed:
+                messages.append(self._message.format(attr=attr, field=self.field_name, fid=fid,
+                                                     allowed=self._allowed))
+        return messages
+
+
+class SeriesRule(Rule):
+
+    def messages(self, columns: Columns) -> List[str]:
+        return [f'Nieprawidłowa seria wartości "{attr}" w polu "{self.field_name}" w wierszu numer {fid}'
+                for fid, attr in zip(columns.fids, columns.column(self.field_name)) if not probe.is_series(attr)]
+
+
+class ShearsNumberRule(Rule):
+    """Keeps the number of shear values of every depth of every point"""
+
+    def __init__(self, idx: int, field_names: List[str]):
+        super().__init__(idx, field_names)
+        self._name_idx = field_names.index(data.NAME)
+        self._depth_idx = field_names.index(shear.SHEAR_DEPTH)
+        self._fid_to_group: Dict[int, Tuple[str, Any]] = dict()
+        self._group_counts: Counter = Counter()
+
+    def fields(self) -> List[str]:
+        return [data.NAME, shear.SHEAR_DEPTH]
+
+    def reset(self, columns: Columns):
+        groups = map(m_shears.group_key, columns.column(data.NAME), columns.column(shear.SHEAR_DEPTH))
+        self._fid_to_group = dict(zip(columns.fids, groups))
+        self._group_counts = Counter(self._fid_to_group.values())
+
+    def index(self, fid: int, attributes: list):
+        self.unindex(fid)
+        group = m_shears.group_key(attributes[self._name_idx], attributes[self._depth_idx])
+        self._fid_to_group[fid] = group
+        self._group_counts[group] += 1
+
+    def unindex(self, fid: int):
+        if fid not in self._fid_to_group:
+            return
+        group = self._fid_to_group.pop(fid)
+        self._group_counts[group] -= 1
+        if not self._group_counts[group]:
+            del self._group_counts[group]
+
+    def messages(self, columns: Columns) -> List[str]:
+        groups = dict.fromkeys(self._fid_to_group.get(fid) for fid in columns.fids)
+        messages = []
+        for group in groups:
+            if not group:
+                continue
+            name, depth = group
+            number_of_torques = self._group_counts[group]
+            if number_of_torques != constants.SHEARS_SIZE:
+                messages.append(
+                    f'Ilość wpisów wartości ścięć "{number_of_torques}" w polu "{self.field_name}" w dla głębokośći {depth} powinna wynosić {constants.SHEARS_SIZE}')
+        return messages
+
+
+def _make_rule(constraint: FieldConstraint, idx: int, field_names: List[str]) -> Rule:
+    if constraint == FieldConstraint.NOT_NULL:
+        return NotNullRule(idx, field_names)
+    elif constraint == FieldConstraint.UNIQUE:
+        return UniqueRule(idx, field_names)
+    elif constraint == FieldConstraint.SOIL:
+        return ValueInRule(idx, field_names, constants.SOIL_TYPES,
+                           'Nazwa gruntu "{attr}" w polu "{field}" w wierszu numer {fid} nie mieści się w zakresie {allowed}')
+    elif constraint == FieldConstraint.WATER_HORIZON:
+        return ValueInRule(idx, field_names, constants.WATER_HORIZONS,
+                           'Numer warstwy wodonośnej "{attr}" w polu "{field}" w wierszu numer {fid} nie mieści się w zakresie {allowed}')
+    elif constraint == FieldConstraint.EXUDATION:
+        return ValueInRule(idx, field_names, constants.EXUDATION_TYPES,
+                           'Rodzaj sączenia "{attr}" w polu "{field}" w wierszu numer {fid} nie mieści się w zakresie {allowed}',
+                           as_text=True)
+    elif constraint == FieldConstraint.STATUS:
+        return ValueInRule(idx, field_names, set(constants.STATUSES_REMOTE_TO_LOCAL.values()),
+                           'Stan wykonania "{attr}" w polu "{field}" w wierszu numer {fid} nie mieści się w zakresie {allowed}',
+                           is_empty_allowed=True)
+    elif constraint == FieldConstraint.SHEARS_NUMBER:
+        return ShearsNumberRule(idx, field_names)
+    elif constraint == FieldConstraint.SERIES:
+        return SeriesRule(idx, field_names)
+
+
+class LayerValidator:
+    """Rules of the layer fields with indexes of values kept up to date with the layer features"""
+
+    def __init__(self, layer_name: str, field_names: List[str]):
+        idx_to_constraints: Dict[int, Set[FieldConstraint]] = LAYER_NAME_TO_FIELDS_CONSTRAINTS.get(layer_name, {})
+        self.rules: List[Rule] = [_make_rule(constraint, idx, field_names)
+                                  for idx, constraints in idx_to_constraints.items()
+                                  for constraint in sorted(constraints, key=lambda c: c.value)]
+        # fields read by the rules
+        self.fields: List[str] = list(dict.fromkeys(field for rule in self.rules for field in rule.fields()))
+
+    def reset(self, columns: Columns):
+        for rule in self.rules:
+            rule.reset(columns)
+
+    def index(self, fid: int, attributes: list):
+        for rule in self.rules:
+            rule.index(fid, attributes)
+
+    def unindex(self, fid: int):
+        for rule in self.rules:
+            rule.unindex(fid)
+
+    def messages(self, columns: Columns) -> List[str]:
+        messages = []
+        for rule in self.rules:
+            messages += rule.messages(columns)
+        return messages
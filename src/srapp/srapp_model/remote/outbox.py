@@ -0,0 +1,186 @@
+import itertools
+import threading
+import traceback
+from typing import *
+
+from google.api_core import exceptions
+
+from model.m_user import User
+from remote import remote_update
+from remote.outbox_store import OutboxStore
+from remote.remote_update import DocumentWrite, DATABASE_TAG, MAX_BATCH_SIZE
+from srapp_model import G
+
+# seconds of the first and the longest pause between retries of sending writes
+RETRY_DELAY = 2
+RETRY_MAX_DELAY = 300
+# errors after which sending the same writes again would fail again
+PERMANENT_ERRORS = (exceptions.BadRequest, exceptions.Forbidden, exceptions.NotFound)
+
+
+class _StoreChanges:
+    """Changes of the stored writes made by one call, saved in one transaction"""
+
+    def __init__(self):
+        self.inserted: Dict[int, DocumentWrite] = dict()
+        self.updated: Dict[int, DocumentWrite] = dict()
+        self.deleted: List[int] = []
+
+    def __bool__(self):
+        return bool(self.inserted or self.updated or self.deleted)
+
+    def set(self, write_id: int, write: DocumentWrite):
+        if write_id in self.inserted:
+            self.inserted[write_id] = write
+        else:
+            self.updated[write_id] = write
+
+
+class Outbox:
+    """Write-behind queue of document writes sent to the database by a background worker.
+
+    Writes waiting for the same document are merged, so only the latest state of the document is sent.
+    With a store the writes are kept until the database confirms them and are sent again with growing pauses
+    when the connection is lost.
+    """
+
+    def __init__(self, user: User, name: str, store: OutboxStore = None):
+        self._user = user
+        self._store = store
+        self._ids = itertools.count(1)
+        self._pending: OrderedDict[str, Tuple[int, DocumentWrite]] = OrderedDict()
+        self._in_flight: List[Tuple[int, DocumentWrite]] = []
+        self._failed_attempts = 0
+        self._retry = False
+        self._closed = False
+        self._condition = threading.Condition()
+        if store:
+            changes = _StoreChanges()
+            stored = store.load()
+            for write_id, write in stored:
+                self._add(write, changes, write_id)
+            # new writes are stored after the loaded ones
+            self._ids = itertools.count(max((write_id for write_id, _ in stored), default=0) + 1)
+            self._save(changes)
+        self._worker = threading.Thread(target=self._run, name=f'SRApp outbox {name}', daemon=True)
+        self._worker.start()
+
+    @property
+    def pending_count(self) -> int:
+        """Number of document writes not yet confirmed by the database"""
+        with self._condition:
+            return len(self._pending) + len(self._in_flight)
+
+    def put(self, writes: Iterable[DocumentWrite]):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('Outbox is closed')
+            changes = _StoreChanges()
+            for write in writes:
+                self._add(write, changes)
+            self._save(changes)
+            self._condition.notify_all()
+
+    def retry_now(self):
+        """Ends the pause after failed sending, e.g. when the connection is known to be back"""
+        with self._condition:
+            self._retry = True
+            self._condition.notify_all()
+
+    @property
+    def is_persistent(self) -> bool:
+        return self._store is not None
+
+    def flush(self, timeout: float = None) -> bool:
+        """Waits until all writes are sent, returns False if the timeout passed before"""
+        with self._condition:
+            return self._condition.wait_for(self._is_flushed, timeout)
+
+    def close(self, timeout: float = None) -> bool:
+        """Stops the worker without waiting for the connection if sending fails.
+
+        Writes not sent stay in the store and are sent by the next outbox using it.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._is_flushed() or self._failed_attempts, timeout)
+            self._closed = True
+            is_flushed = self._is_flushed()
+            self._condition.notify_all()
+        self._worker.join(timeout)
+        return is_flushed
+
+    def _is_flushed(self) -> bool:
+        return not self._pending and not self._in_flight
+
+    def _add(self, write: DocumentWrite, changes: _StoreChanges, write_id: int = None):
+        earlier = self._pending.get(write.path)
+        if earlier:
+            earlier_id, earlier_write = earlier
+            merged = earlier_write.followed_by(write)
+            changes.set(earlier_id, merged)
+            if write_id is not None:
+                changes.deleted.append(write_id)
+            self._pending[write.path] = (earlier_id, merged)
+            return
+        if write_id is None:
+            write_id = next(self._ids)
+            changes.inserted[write_id] = write
+        self._pending[write.path] = (write_id, write)
+
+    def _save(self, changes: _StoreChanges):
+        if self._store and changes:
+            self._store.save(changes.inserted.items(), changes.updated.items(), changes.deleted)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if not self._pending or (self._closed and self._failed_attempts):
+                    return
+                self._in_flight = list(self._pending.values())[:MAX_BATCH_SIZE]
+                for write_id, write in self._in_flight:
+                    del self._pending[write.path]
+            is_sent = self._send([write for write_id, write in self._in_flight])
+            with self._condition:
+                if is_sent:
+                    self._failed_attempts = 0
+                    if self._store:
+                        self._store.delete([write_id for write_id, write in self._in_flight])
+                else:
+                    self._failed_attempts += 1
+                    self._restore_in_flight()
+                self._in_flight = []
+                pending = len(self._pending)
+                self._condition.notify_all()
+                if is_sent:
+                    G.Log.message(f'Wysłano zapisy, oczekujące: {pending}', DATABASE_TAG)
+                else:
+                    delay = min(RETRY_DELAY * 2 ** (self._failed_attempts - 1), RETRY_MAX_DELAY)
+                    G.Log.message(f'Brak połączenia, oczekujące zapisy: {pending}, ponowienie za {delay} s',
+                                  DATABASE_TAG)
+                    self._retry = False
+                    self._condition.wait_for(lambda: self._retry or self._closed, delay)
+
+    def _send(self, writes: List[DocumentWrite]) -> bool:
+        """Returns False if sending should be repeated"""
+        try:
+            remote_update.commit(self._user, writes)
+        except PERMANENT_ERRORS:
+            G.Log.error(f'Odrzucono zapisy: {len(writes)}\n{traceback.format_exc()}')
+        except Exception:
+            G.Log.error(f'{traceback.format_exc()}')
+            return False
+        return True
+
+    def _restore_in_flight(self):
+        changes = _StoreChanges()
+        for write_id, write in self._in_flight:
+            newer = self._pending.get(write.path)
+            if newer:
+                newer_id, newer_write = newer
+                write = write.followed_by(newer_write)
+                changes.set(write_id, write)
+                changes.deleted.append(newer_id)
+            self._pending[write.path] = (write_id, write)
+        self._save(changes)
+        self._pending = OrderedDict(sorted(self._pending.items(), key=lambda item: item[1][0]))
@@ -0,0 +1,73 @@
+import datetime
+import json
+from contextlib import closing
+from typing import *
+
+from model import m_gpkg
+from remote.remote_update import DocumentWrite
+
+OUTBOX_TABLE = 'srapp_outbox'
+DATETIME_KEY = '$datetime'
+
+
+class OutboxStore:
+    """Pending document writes kept in the project GeoPackage, so they survive lost connection and restart"""
+
+    def __init__(self, gpkg_file_path: str):
+        self.gpkg_file_path = gpkg_file_path
+        with closing(m_gpkg.connect(self.gpkg_file_path)) as conn, conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {OUTBOX_TABLE} ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'path TEXT NOT NULL, '
+                         'data TEXT, '
+                         'merge INTEGER NOT NULL, '
+                         'layer_name TEXT NOT NULL, '
+                         'name TEXT NOT NULL)')
+
+    def load(self) -> List[Tuple[int, DocumentWrite]]:
+        """Writes in the order they were saved"""
+        with closing(m_gpkg.connect(self.gpkg_file_path)) as conn, conn:
+            rows = conn.execute(f'SELECT id, path, data, merge, layer_name, name FROM {OUTBOX_TABLE} ORDER BY id')
+            return [(row[0], DocumentWrite(row[1], _decode(row[2]), bool(row[3]), row[4], row[5])) for row in rows]
+
+    def save(self, inserted: Iterable[Tuple[int, DocumentWrite]], updated: Iterable[Tuple[int, DocumentWrite]] = (),
+             deleted: Iterable[int] = ()):
+        """Inserts writes with the given ids, updates and deletes writes in one transaction"""
+        with closing(m_gpkg.connect(self.gpkg_file_path)) as conn, conn:
+            conn.executemany(f'INSERT INTO {OUTBOX_TABLE} (id, path, data, merge, layer_name, name) '
+                             f'VALUES (?, ?, ?, ?, ?, ?)', [(write_id,) + _row(write) for write_id, write in inserted])
+            conn.executemany(f'UPDATE {OUTBOX_TABLE} SET path = ?, data = ?, merge = ?, layer_name = ?, name = ? '
+                             f'WHERE id = ?', [_row(write) + (write_id,) for write_id, write in updated])
+            conn.executemany(f'DELETE FROM {OUTBOX_TABLE} WHERE id = ?', [(write_id,) for write_id in deleted])
+
+    def delete(self, write_ids: Iterable[int]):
+        with closing(m_gpkg.connect(self.gpkg_file_path)) as conn, conn:
+            conn.executemany(f'DELETE FROM {OUTBOX_TABLE} WHERE id = ?', [(write_id,) for write_id in write_ids])
+
+
+def _row(write: DocumentWrite) -> tuple:
+    return write.path, _encode(write.data), int(write.merge), write.layer_name, write.name
+
+
+def _encode(data: Optional[dict]) -> Optional[str]:
+    if data is None:
+        return None
+    return json.dumps(data, default=_encode_value, ensure_ascii=False)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {DATETIME_KEY: value.isoformat()}
+    raise TypeError(f'Type {type(value)} is not supported')
+
+
+def _decode(text: Optional[str]) -> Optional[dict]:
+    if text is None:
+        return None
+    return json.loads(text, object_hook=_decode_value)
+
+
+def _decode_value(value: dict):
+    if len(value) == 1 and DATETIME_KEY in value:
+        return datetime.datetime.fromisoformat(value[DATETIME_KEY])
+    return value
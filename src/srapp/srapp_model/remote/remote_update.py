@@ -1,3 +1,4 @@
+import dataclasses
 import datetime
 from typing import *
 
@@ -5,46 +6,110 @@ from google.cloud.firestore_v1 import CollectionReference, DocumentReference
 from google.cloud.firestore_v1.types import WriteResult
 
 from model.m_layer import IMapLayer
-from model.m_user import make_valid_id
+from model.m_user import make_valid_id, User
 from srapp_model import G
 
 DATABASE_TAG = 'SRApp - baza danych'
+# maximum number of operations accepted by Firestore in one batch
+MAX_BATCH_SIZE = 500
 
 
-def on_items_deleted(collection_ref: CollectionReference, names: Set[str], layer_name: str):
-    for name in names:
-        result = collection_ref.document(make_valid_id(name)).delete()
-        G.Log.message(f'{layer_name}: usunięto "{name}"', DATABASE_TAG)
+@dataclasses.dataclass(frozen=True)
+class DocumentWrite:
+    """Single document operation; `data` set to None means deletion of the document"""
+    path: str
+    data: Optional[dict]
+    merge: bool
+    layer_name: str
+    name: str
+
+    def is_delete(self) -> bool:
+        return self.data is None
+
+    def followed_by(self, later: 'DocumentWrite') -> 'DocumentWrite':
+        """Single write leaving the document in the same state as this write followed by the later one"""
+        if later.is_delete() or not later.merge:
+            return later
+        if self.is_delete():
+            return dataclasses.replace(later, merge=False)
+        return dataclasses.replace(later, data=_merged(self.data, later.data), merge=self.merge)
+
+
+def _merged(earlier: dict, later: dict) -> dict:
+    # nested maps are merged like Firestore does for writes with merge option
+    result = dict(earlier)
+    for key, value in later.items():
+        earlier_value = result.get(key)
+        if isinstance(value, dict) and isinstance(earlier_value, dict):
+            value = _merged(earlier_value, value)
+        result[key] = value
+    return result
+
 
+def items_deleted_writes(collection_ref: CollectionReference, names: Set[str], layer_name: str) -> List[DocumentWrite]:
+    return [DocumentWrite(collection_ref.document(make_valid_id(name)).path, None, False, layer_name, name)
+            for name in names]
 
-def on_items_modify(project_ref: DocumentReference, names: Set[str], layer: IMapLayer):
+
+def items_modify_writes(project_ref: DocumentReference, names: Set[str], layer: IMapLayer) -> List[DocumentWrite]:
     items_ref: CollectionReference = project_ref.collection(layer.database_ref_path)
+    writes = []
+    name_to_columns = layer.columns_by_names(names, layer.remote_fields)
     for name in names:
-        features = layer.features_by_name(name)
-        all_items_map: dict = layer.features_to_remote(features)
+        columns = name_to_columns.get(name)
+        if not columns:
+            continue
+        all_items_map: dict = layer.features_to_remote(columns)
         for item_name, item_map in all_items_map.items():
             item_ref = items_ref.document(make_valid_id(item_name))
-            result: WriteResult = item_ref.set(item_map, True)
-            result_message = make_result_message(result)
-            G.Log.message(f'{layer.name}: zmieniono "{item_name}" - {result_message}', DATABASE_TAG)
+            writes.append(DocumentWrite(item_ref.path, item_map, True, layer.name, item_name))
+    return writes
 
 
 def _parse_time(time_str: str):
     return datetime.datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
 
 
-def on_subitems_modify(project_ref: DocumentReference, names: Set[str], layer: IMapLayer):
+def subitems_modify_writes(project_ref: DocumentReference, names: Set[str], layer: IMapLayer) -> List[DocumentWrite]:
     items_ref: CollectionReference = project_ref.collection(layer.database_ref_path)
+    writes = []
+    name_to_columns = layer.columns_by_names(names, layer.remote_fields)
     for name in names:
         item_ref: DocumentReference = items_ref.document(make_valid_id(name))
-        features = layer.features_by_name(name)
-        if features:
-            data_map = layer.features_to_remote(features)
+        columns = name_to_columns.get(name)
+        if columns:
+            data_map = layer.features_to_remote(columns)
         else:
             data_map = dict()
-        result: WriteResult = item_ref.set(data_map, True)
+        writes.append(DocumentWrite(item_ref.path, data_map, True, layer.name, name))
+    return writes
+
+
+def commit(user: User, writes: List[DocumentWrite]) -> List[WriteResult]:
+    """Sends writes in as few batches as possible, each batch is one round trip to the database"""
+    results = []
+    for start in range(0, len(writes), MAX_BATCH_SIZE):
+        chunk = writes[start:start + MAX_BATCH_SIZE]
+        batch = user.batch()
+        for write in chunk:
+            doc_ref = user.document_ref(write.path)
+            if write.is_delete():
+                batch.delete(doc_ref)
+            else:
+                batch.set(doc_ref, write.data, write.merge)
+        chunk_results: List[WriteResult] = batch.commit()
+        for write, result in zip(chunk, chunk_results):
+            _log_result(write, result)
+        results += chunk_results
+    return results
+
+
+def _log_result(write: DocumentWrite, result: WriteResult):
+    if write.is_delete():
+        G.Log.message(f'{write.layer_name}: usunięto "{write.name}"', DATABASE_TAG)
+    else:
         result_message = make_result_message(result)
-        G.Log.message(f'{layer.name}: zmieniono "{name}" - {result_message}', DATABASE_TAG)
+        G.Log.message(f'{write.layer_name}: zmieniono "{write.name}" - {result_message}', DATABASE_TAG)
 
 
 def make_result_message(result):
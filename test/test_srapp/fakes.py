@@ -1,6 +1,21 @@
-from typing import List, Any, Tuple
+import datetime
+from typing import List, Any, Tuple, Iterator
 
+import logger
 from database.data import IFeature, IPointFeature
+from model.m_user import User
+from srapp_model.logger import ILogger
+
+
+class FakeLogger(ILogger):
+    def message(self, message: str, tag: str = logger.DEFAULT_MESSAGE_TAG):
+        print(f'{tag}: {message}')
+
+    def error(self, message: str, tag: str = logger.DEFAULT_ERROR_TAG):
+        print(f'{tag}: {message}')
+
+    def information(self, message: str, title: str = logger.DEFAULT_INFO_TITLE):
+        print(f'{title}: {message}')
 
 
 class FakeFeature(IFeature):
@@ -22,7 +37,11 @@ class FakeFeature(IFeature):
         return self._attrs.get(name)
 
     def attributes(self) -> list:
-        return list(self._attrs.values())
+        # like in QGIS the first attribute is the feature id
+        return [self._fid] + [self._attrs.get(name) for name in self._local_names]
+
+    def change_attribute(self, idx: int, value: Any):
+        self._attrs[self._local_names[idx - 1]] = value
 
 
 class FakePointFeature(FakeFeature, IPointFeature):
@@ -33,10 +52,73 @@ class FakePointFeature(FakeFeature, IPointFeature):
         self._y = y
 
     def set_geometry(self, x: float, y: float):
-        pass
-
-    def set_spatial_index(self):
-        pass
+        self._x = x
+        self._y = y
 
     def xy(self) -> Tuple[float, float]:
         return self._x, self._y
+
+
+class FakeWriteResult:
+    def __init__(self):
+        self.update_time = datetime.datetime.now()
+
+
+class FakeDocumentReference:
+    def __init__(self, path: str):
+        self.path = path
+        self.id = path.split('/')[-1]
+
+    def collection(self, name: str) -> 'FakeCollectionReference':
+        return FakeCollectionReference(f'{self.path}/{name}')
+
+
+class FakeCollectionReference:
+    def __init__(self, path: str):
+        self.path = path
+
+    def document(self, doc_id: str) -> FakeDocumentReference:
+        return FakeDocumentReference(f'{self.path}/{doc_id}')
+
+
+class FakeWriteBatch:
+    def __init__(self, user: 'FakeDatabaseUser'):
+        self._user = user
+        self._writes = []
+
+    def set(self, reference: FakeDocumentReference, document_data: dict, merge=False):
+        self._writes.append((reference.path, document_data, merge))
+
+    def delete(self, reference: FakeDocumentReference):
+        self._writes.append((reference.path, None, False))
+
+    def commit(self) -> List[FakeWriteResult]:
+        self._user.commits.append(list(self._writes))
+        return [FakeWriteResult() for _ in self._writes]
+
+
+class FakeDatabaseUser(User):
+
+    def __init__(self, email: str):
+        super().__init__(email, None)
+        # every item is one round trip to the database with the list of writes
+        self.commits: List[List[tuple]] = []
+        # every item is one round trip to the database with the read references
+        self.reads: List[list] = []
+
+    def is_auth(self):
+        return True
+
+    def project_ref(self, project_name) -> FakeDocumentReference:
+        return FakeDocumentReference(f'users/{self.email}/projects/{project_name}')
+
+    def document_ref(self, path: str) -> FakeDocumentReference:
+        return FakeDocumentReference(path)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def get_all(self, refs: list) -> Iterator:
+        self.reads.append(list(refs))
+        for ref in refs:
+            yield ref.get()
@@ -1,4 +1,7 @@
+import dataclasses
 import datetime
+import timeit
+import tracemalloc
 from typing import *
 
 import pytest
@@ -17,7 +20,7 @@ from srapp_model.database.point import Point
 from srapp_model.database.probe import ProbeProduct, Probe, ProbeUnit
 from srapp_model.database.shear import TodoShear, ShearUnit
 from srapp_model.database.water import DrilledWaterHorizon, SetWaterHorizon, Exudation
-from test_srapp.fakes import FakePointFeature
+from test_srapp.fakes import FakeFeature, FakePointFeature
 
 
 class FakeShearFeature(IFeature):
@@ -509,6 +512,111 @@ class TestParse:
         assert attrs[0] == time
         assert attrs[1] == 'D1'
 
+    def test_decoded_point_rows_equal_parsed_point(self, point_D1):
+        parsed = Point.from_dict(point_D1)
+        rows = m_project.decode_point(point_D1)
+        assert rows.name == 'D1'
+        assert rows.point.attrs() == parsed.attrs()
+        assert rows.point.fields_names() == parsed.fields_names()
+        assert (rows.point.x, rows.point.y) == (parsed.x, parsed.y)
+        assert rows.shears_todo == parsed.shears_todo
+
+    def test_decoded_borehole_rows_equal_parsed_borehole(self, borehole_D1):
+        parsed = BoreholeProduct.from_dict(borehole_D1)
+        rows = m_project.decode_borehole(borehole_D1)
+        assert rows.borehole.attrs() == parsed.attrs()
+        assert rows.persons == parsed.borehole.persons
+        assert_same_items(rows.layers, parsed.layers)
+        assert_same_items(rows.drilled_water_horizons, parsed.drilledWaterHorizons)
+        assert_same_items(rows.set_water_horizons, parsed.setWaterHorizons)
+        assert_same_items(rows.exudations, parsed.exudations)
+
+    def test_decoded_probe_rows_equal_parsed_probe(self, probe_D1):
+        parsed = ProbeProduct.from_dict(probe_D1)
+        rows = m_project.decode_probe(probe_D1)
+        assert rows.probe.attrs() == parsed.attrs()
+        assert rows.persons == parsed.probe.persons
+        assert_same_items(rows.units, parsed.probe.units)
+        assert_same_items(rows.shears, parsed.shears)
+
+    def test_points_are_decoded_faster_than_parsed(self, point_D1):
+        docs = [written_at(dict(point_D1, pointNumber=f'P{i}', shearsToDoList=[]), i) for i in range(10000)]
+        assert_decoded_faster(docs, lambda doc: Point.from_dict(doc).attrs(),
+                              lambda doc: m_project.decode_point(doc).point.attrs())
+
+    def test_boreholes_are_decoded_faster_than_parsed(self, borehole_D1):
+        docs = [written_at(dict(borehole_D1, pointNumber=f'P{i}'), i) for i in range(2000)]
+        assert_decoded_faster(docs, lambda doc: BoreholeProduct.from_dict(doc).attrs(), m_project.decode_borehole)
+
+    def test_probes_are_decoded_faster_than_parsed(self, probe_D1):
+        docs = [written_at(dict(probe_D1, pointNumber=f'P{i}'), i) for i in range(2000)]
+        assert_decoded_faster(docs, lambda doc: ProbeProduct.from_dict(doc).attrs(), m_project.decode_probe)
+
+    def test_packed_units_are_unpacked_unchanged(self):
+        units = ['3', '12', '', '0.5', '07', 'x', ' 4', '1e3', 'nan']
+        series = probe.pack_units(units)
+        assert series == '[3,12,null,0.5,"07","x"," 4","1e3","nan"]'
+        assert probe.unpack_units(series) == units
+
+    def test_decoded_packed_probe_has_series_of_units(self, probe_D1):
+        rows = m_project.decode_probe(probe_D1, packed_units=True)
+        assert not rows.units
+        assert rows.series.attrs() == ['D1', '[3,5,7,5,8,12,14,16,14,13,17,18,15,18,17,19]']
+        assert m_project._probe_series_map([FakeFeature(probe.probe_series_local_names(), 1, **dict(
+            zip(probe.probe_series_local_names(), rows.series.attrs())))]) == {
+            probe.REMOTE_PROBE: {probe.UNITS_REMOTE: probe_D1['probe']['units']}}
+
+    def test_sub_items_have_no_instance_dictionaries(self, borehole_D1, probe_D1):
+        borehole = BoreholeProduct.from_dict(borehole_D1)
+        probe = ProbeProduct.from_dict(probe_D1)
+        records = [borehole.borehole.persons[0], borehole.layers[0], borehole.drilledWaterHorizons[0],
+                   borehole.setWaterHorizons[0], borehole.exudations[0], probe.probe.units[0], probe.shears[0],
+                   TodoShear('D1', 1.0)]
+        for record in records:
+            assert not hasattr(record, '__dict__')
+
+    def test_project_load_memory_per_sub_item(self):
+        @dataclasses.dataclass(frozen=True)
+        class DictProbeUnit:
+            name: str
+            index: int
+            value: str
+
+        @dataclasses.dataclass(frozen=True)
+        class DictShearUnit:
+            name: str
+            depth: float
+            index: int
+            torque: str
+
+        def probe_doc(i: int) -> dict:
+            return {
+                'pointNumber': f'D{i}',
+                'shears': [{'depth': str(depth), 'torques': [str(t) for t in range(18)]} for depth in range(5)],
+                'probe': {'interval': '0.1', 'units': [str(u % 40) for u in range(300)], 'persons': ['Kowalski Jan']}
+            }
+
+        def traced_size(records: Callable[[], list]) -> int:
+            tracemalloc.start()
+            try:
+                built = records()
+                size, _ = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            assert len(built) == len(sub_items)
+            return size
+
+        products = [ProbeProduct.from_dict(probe_doc(i)) for i in range(200)]
+        sub_items = [unit for product in products for unit in product.probe.units + product.shears]
+        assert len(sub_items) == 200 * (300 + 5 * 18)
+
+        def build(unit_class, shear_class) -> list:
+            return [(unit_class if type(item) is ProbeUnit else shear_class)(*item.attrs()) for item in sub_items]
+
+        slots_size = traced_size(lambda: build(ProbeUnit, ShearUnit))
+        dict_size = traced_size(lambda: build(DictProbeUnit, DictShearUnit))
+        assert slots_size < 0.7 * dict_size
+
     def test_shears_are_parsed_to_remote(self):
         features = [
             FakeShearFeature(1.6, 17, '43'),
@@ -719,3 +827,25 @@ class TestParse:
         assert parsed == expected
 
         # todo test parse boreholes, parse probes
+
+
+def assert_same_items(rows: list, records: list):
+    assert [row.attrs() for row in rows] == [record.attrs() for record in records]
+    assert [row.fields_names() for row in rows] == [record.fields_names() for record in records]
+
+
+def written_at(doc_map: dict, seconds: int) -> dict:
+    """The document and its sub-items written the seconds after the time of the document"""
+    timestamp = doc_map['timestamp'] + datetime.timedelta(seconds=seconds)
+    doc_map = dict(doc_map, timestamp=timestamp)
+    for key, items in doc_map.items():
+        if isinstance(items, list) and all(isinstance(item, dict) and 'timestamp' in item for item in items):
+            doc_map[key] = [dict(item, timestamp=timestamp) for item in items]
+    return doc_map
+
+
+def assert_decoded_faster(docs: List[dict], parse: Callable[[dict], Any], decode: Callable[[dict], Any]):
+    # the best of a few runs, not disturbed by other processes
+    parse_time = min(timeit.repeat(lambda: [parse(doc) for doc in docs], number=1, repeat=3))
+    decode_time = min(timeit.repeat(lambda: [decode(doc) for doc in docs], number=1, repeat=3))
+    assert decode_time < parse_time
@@ -0,0 +1,140 @@
+import threading
+import time
+from typing import *
+
+from google.cloud.firestore_v1.watch import ChangeType
+
+from engine.dispatcher import Dispatcher, QueuedChange
+from model.m_qgis import IQgis
+from srapp_model import G
+from test_srapp.fakes import FakeLogger
+
+G.Log = FakeLogger()
+
+
+class FakeEventLoop(IQgis[None]):
+    """Main thread calls run only by `tick`"""
+
+    def __init__(self):
+        super().__init__(None)
+        self.calls: List[Callable[[], None]] = []
+
+    def try_refresh(self) -> bool:
+        return True
+
+    def run_on_main_thread(self, func: Callable[[], None]):
+        self.calls.append(func)
+
+    def call_later(self, seconds: float, func: Callable[[], None]):
+        self.calls.append(func)
+
+    def tick(self):
+        calls = self.calls
+        self.calls = []
+        for func in calls:
+            func()
+
+
+class Collection:
+    def __init__(self):
+        self.batches: List[List[QueuedChange]] = []
+
+    def apply(self, changes: List[QueuedChange], read_time):
+        self.batches.append(changes)
+
+
+def change(doc_id: str, change_type: ChangeType = ChangeType.MODIFIED, **doc_map) -> QueuedChange:
+    return QueuedChange(change_type, doc_id, doc_map, time.perf_counter())
+
+
+def test_changes_are_applied_on_main_thread_once_per_tick():
+    loop = FakeEventLoop()
+    dispatcher = Dispatcher(loop)
+    points = Collection()
+    dispatcher.put('points', points.apply, [change('D1')])
+    dispatcher.put('points', points.apply, [change('D2')])
+    assert points.batches == []
+    assert len(loop.calls) == 1
+    loop.tick()
+    assert [[c.doc_id for c in batch] for batch in points.batches] == [['D1', 'D2']]
+
+
+def test_changes_of_the_same_document_are_merged():
+    loop = FakeEventLoop()
+    dispatcher = Dispatcher(loop)
+    teams = Collection()
+    first = change('T1', x=1)
+    dispatcher.put('teams', teams.apply, [first, change('T2', x=1)])
+    dispatcher.put('teams', teams.apply, [change('T1', x=2)])
+    dispatcher.put('teams', teams.apply, [change('T1', ChangeType.REMOVED, x=3)])
+    loop.tick()
+    batch, = teams.batches
+    assert [(c.doc_id, c.type, c.doc_map) for c in batch] == [('T2', ChangeType.MODIFIED, {'x': 1}),
+                                                              ('T1', ChangeType.REMOVED, {'x': 3})]
+    assert batch[1].queued_at == first.queued_at
+    assert dispatcher.metrics().merged == 2
+
+
+def test_collections_are_applied_separately():
+    loop = FakeEventLoop()
+    dispatcher = Dispatcher(loop)
+    points, teams = Collection(), Collection()
+    dispatcher.put('points', points.apply, [change('D1')])
+    dispatcher.put('teams', teams.apply, [change('D1')])
+    loop.tick()
+    assert len(points.batches) == 1 and len(teams.batches) == 1
+
+
+def test_full_queue_waits_for_main_thread():
+    loop = FakeEventLoop()
+    dispatcher = Dispatcher(loop, max_pending=2)
+    points = Collection()
+    dispatcher.put('points', points.apply, [change('D1'), change('D2')])
+    watch_thread = threading.Thread(target=dispatcher.put, args=('points', points.apply, [change('D3')]))
+    watch_thread.start()
+    watch_thread.join(0.1)
+    assert watch_thread.is_alive()
+    assert dispatcher.metrics().depth == 2
+    loop.tick()
+    watch_thread.join(5)
+    assert not watch_thread.is_alive()
+    loop.tick()
+    assert [[c.doc_id for c in batch] for batch in points.batches] == [['D1', 'D2'], ['D3']]
+
+
+def test_depth_and_latency_are_measured():
+    loop = FakeEventLoop()
+    dispatcher = Dispatcher(loop)
+    points = Collection()
+    dispatcher.put('points', points.apply, [change('D1'), change('D2')])
+    assert dispatcher.metrics().depth == 2
+    time.sleep(0.01)
+    loop.tick()
+    metrics = dispatcher.metrics()
+    assert (metrics.depth, metrics.max_depth, metrics.applied) == (0, 2, 2)
+    assert 0.01 <= metrics.mean_latency <= metrics.max_latency
+
+
+def test_failed_collection_does_not_stop_others():
+    loop = FakeEventLoop()
+    dispatcher = Dispatcher(loop)
+    points = Collection()
+
+    def fail(changes, read_time):
+        raise ValueError()
+
+    dispatcher.put('teams', fail, [change('T1')])
+    dispatcher.put('points', points.apply, [change('D1')])
+    loop.tick()
+    assert len(points.batches) == 1
+
+
+def test_closed_dispatcher_drops_changes():
+    loop = FakeEventLoop()
+    dispatcher = Dispatcher(loop)
+    points = Collection()
+    dispatcher.put('points', points.apply, [change('D1')])
+    dispatcher.close()
+    dispatcher.put('points', points.apply, [change('D2')])
+    loop.tick()
+    assert points.batches == []
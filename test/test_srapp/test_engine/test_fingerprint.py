@@ -0,0 +1,31 @@
+import datetime
+
+from engine import fingerprint
+
+
+def test_nested_maps_are_fingerprinted_by_paths():
+    doc_map = {'pointNumber': 'S1', 'probe': {'interval': 0.1, 'units': ['1', '2']}}
+    assert set(fingerprint.leaves_fingerprint(doc_map)) == {'pointNumber', 'probe.interval', 'probe.units'}
+
+
+def test_timestamp_is_not_part_of_document_fingerprint():
+    doc_map = {'pointNumber': 'S1', 'timestamp': datetime.datetime(2022, 5, 31, tzinfo=datetime.timezone.utc)}
+    later_map = dict(doc_map, timestamp=datetime.datetime(2022, 6, 1, tzinfo=datetime.timezone.utc))
+    assert fingerprint.document_fingerprint(doc_map) == fingerprint.document_fingerprint(later_map)
+
+
+def test_timestamp_is_kept_when_it_is_content():
+    doc_map = {'id': 'T1', 'timestamp': datetime.datetime(2022, 5, 31, tzinfo=datetime.timezone.utc)}
+    later_map = dict(doc_map, timestamp=datetime.datetime(2022, 6, 1, tzinfo=datetime.timezone.utc))
+    assert fingerprint.document_fingerprint(doc_map, True) != fingerprint.document_fingerprint(later_map, True)
+
+
+def test_fingerprint_depends_on_list_order():
+    assert fingerprint.document_fingerprint({'units': ['1', '2']}) != fingerprint.document_fingerprint(
+        {'units': ['2', '1']})
+
+
+def test_times_are_compared_in_utc():
+    local_time = datetime.datetime(2022, 5, 31, 8, 17, 1)
+    utc_time = local_time.astimezone(datetime.timezone.utc)
+    assert fingerprint.leaves_fingerprint({'time': [local_time]}) == fingerprint.leaves_fingerprint({'time': [utc_time]})
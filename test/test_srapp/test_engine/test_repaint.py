@@ -0,0 +1,87 @@
+from typing import *
+
+import pytest
+
+from engine.repaint import RepaintScheduler
+from model.m_qgis import IQgis
+
+
+class FakeCanvas(IQgis[None]):
+
+    def __init__(self, is_caching: bool = False):
+        super().__init__(None)
+        self.is_caching = is_caching
+        self.refreshes = 0
+        self.timers: List[Tuple[float, Callable[[], None]]] = []
+
+    def try_refresh(self) -> bool:
+        if self.is_caching:
+            return False
+        self.refreshes += 1
+        return True
+
+    def run_on_main_thread(self, func: Callable[[], None]):
+        func()
+
+    def call_later(self, seconds: float, func: Callable[[], None]):
+        self.timers.append((seconds, func))
+
+    def fire(self) -> float:
+        seconds, func = self.timers.pop(0)
+        func()
+        return seconds
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeLayer:
+    def __init__(self):
+        self.repaints = 0
+
+    def trigger_repaint(self):
+        self.repaints += 1
+
+
+def test_requests_within_interval_are_one_canvas_refresh():
+    canvas = FakeCanvas()
+    scheduler = RepaintScheduler(canvas, 0.25, FakeClock())
+    layers = [FakeLayer() for i in range(10)]
+    for i in range(5):
+        for layer in layers:
+            scheduler.request(layer)
+    assert len(canvas.timers) == 1
+    canvas.fire()
+    assert canvas.refreshes == 1
+    assert all(layer.repaints == 0 for layer in layers)
+
+
+def test_next_repaint_waits_for_interval():
+    canvas = FakeCanvas()
+    clock = FakeClock()
+    scheduler = RepaintScheduler(canvas, 0.25, clock)
+    layer = FakeLayer()
+    scheduler.request(layer)
+    assert canvas.fire() == 0
+    clock.now += 0.1
+    scheduler.request(layer)
+    assert canvas.fire() == pytest.approx(0.25 - 0.1)
+    clock.now += 1
+    scheduler.request(layer)
+    assert canvas.fire() == 0
+    assert canvas.refreshes == 3
+
+
+def test_only_changed_layers_are_repainted_when_canvas_is_cached():
+    canvas = FakeCanvas(is_caching=True)
+    scheduler = RepaintScheduler(canvas, 0.25, FakeClock())
+    changed, other = FakeLayer(), FakeLayer()
+    scheduler.request(changed)
+    scheduler.request(changed)
+    canvas.fire()
+    assert (changed.repaints, other.repaints) == (1, 0)
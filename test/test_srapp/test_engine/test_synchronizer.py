@@ -1,12 +1,17 @@
 import datetime
+from collections import defaultdict
+from contextlib import closing
 from typing import *
 
 import pytest
 from google.api_core.datetime_helpers import DatetimeWithNanoseconds
 from google.cloud.firestore_v1.watch import ChangeType
 
-import logger
 import model.m_config
+from model import m_gpkg
+from database import probe, team
+from database.layer import Layer
+from database.probe import ProbeUnit
 from database.shear import TodoShear
 from model.m_layer import IMapLayer
 from srapp_model import G
@@ -16,23 +21,13 @@ from srapp_model.database import point, data
 from srapp_model.database.data import FTR
 from srapp_model.database.data import IFeature, Data
 from srapp_model.database.point import Point
+from srapp_model.engine import synchronize
 from srapp_model.engine.synchronize import Synchronizer
-from srapp_model.logger import ILogger
+from srapp_model.model import m_analysis, m_project, m_shears
 from srapp_model.model.m_project import Project
 from srapp_model.model.m_qgis import IQgis
-from srapp_model.model.m_user import User
-from test_srapp.fakes import FakeFeature, FakePointFeature
-
-
-class FakeLogger(ILogger):
-    def message(self, message: str, tag: str = logger.DEFAULT_MESSAGE_TAG):
-        print(f'{tag}: {message}')
-
-    def error(self, message: str, tag: str = logger.DEFAULT_ERROR_TAG):
-        print(f'{tag}: {message}')
-
-    def information(self, message: str, title: str = logger.DEFAULT_INFO_TITLE):
-        print(f'{title}: {message}')
+from srapp_model.remote import remote_update
+from test_srapp.fakes import FakeFeature, FakePointFeature, FakeDatabaseUser, FakeLogger, FakeDocumentReference
 
 
 G.Log = FakeLogger()
@@ -43,6 +38,28 @@ class FakeQgis(IQgis[None]):
     def try_refresh(self) -> bool:
         return True
 
+    def run_on_main_thread(self, func: Callable[[], None]):
+        func()
+
+    def call_later(self, seconds: float, func: Callable[[], None]):
+        func()
+
+
+class FakeTimersQgis(FakeQgis):
+    """Calls for later are run when the test fires them"""
+
+    def __init__(self):
+        super().__init__(None)
+        self.timers: List[Callable[[], None]] = []
+
+    def call_later(self, seconds: float, func: Callable[[], None]):
+        self.timers.append(func)
+
+    def fire_all(self):
+        timers, self.timers = self.timers, []
+        for func in timers:
+            func()
+
 
 class FakeWatch:
     def unsubscribe(self):
@@ -68,6 +85,12 @@ class FakeBoreholesReference:
 
 
 class FakeMapPointsReference:
+    queries = []
+
+    def where(self, field_path: str, op_string: str, value: Any) -> 'FakeMapPointsReference':
+        FakeMapPointsReference.queries.append((field_path, op_string, value))
+        return self
+
     def on_snapshot(self, on_update: callable) -> FakeWatch:
         FakeMapPointsReference.on_update = on_update
         doc_snapshot = None
@@ -100,13 +123,7 @@ class FakeCrsReference:
         pass
 
 
-class FakeUser(User):
-
-    def __init__(self, email: str):
-        super().__init__(email, None)
-
-    def is_auth(self):
-        return True
+class FakeUser(FakeDatabaseUser):
 
     def map_points_ref(self, project_name) -> FakeMapPointsReference:
         return FakeMapPointsReference()
@@ -125,11 +142,18 @@ class FakeUser(User):
 
 
 class FakeConnectable:
+    def __init__(self):
+        self._funcs = []
+
     def connect(self, func: callable):
-        pass
+        self._funcs.append(func)
 
     def disconnect(self, func: callable):
-        pass
+        self._funcs.remove(func)
+
+    def emit(self, *args):
+        for func in list(self._funcs):
+            func(*args)
 
 
 FKFTR = TypeVar('FTR', FakeFeature, FakePointFeature)
@@ -141,85 +165,128 @@ class FakeMapLayer(IMapLayer, Generic[FKFTR]):
         super().__init__(None, qgis)
         self._id = id
         self._features = features or []
+        self.features_added_signal = FakeConnectable()
+        self.features_removed_signal = FakeConnectable()
+        self.attribute_values_changed_signal = FakeConnectable()
+        self.scans = 0
+        self.reads = 0
+        self.provider_calls = Counter()
+        self.changed_values = 0
+        self.repaints = 0
 
     def _committed_features_added_func(self) -> callable:
-        return FakeConnectable()
+        return self.features_added_signal
 
     def _committed_features_removed_func(self) -> callable:
-        return FakeConnectable()
+        return self.features_removed_signal
 
     def _committed_attribute_values_changes_func(self) -> callable:
-        return FakeConnectable()
+        return self.attribute_values_changed_signal
 
     def wrap_raw_feature(self, feature: FTR) -> IFeature:
-        pass
+        return feature
+
+    def field_names(self):
+        local_names = self._features[0]._local_names if self._features else []
+        return ['fid'] + local_names
+
+    def features_by_fids(self, fids: List[int]):
+        self.reads += 1
+        fids = set(fids)
+        return sorted([f for f in self._features if f.fid() in fids], key=lambda f: f.fid())
 
     def make_timestamp_field(self, timestamp: datetime.datetime):
         return timestamp
 
-    def _add_feature(self, item: Data):
+    def _add_features(self, items: List[Data]) -> List[int]:
+        self.provider_calls['addFeatures'] += 1
         fids = [f.fid() for f in self._features]
         max_fid = max(fids) if fids else 0
-        fid = max_fid + 1
-        values = item.attrs()
-        keys = item.fields_names()
-        kwargs = dict(zip(keys, values))
-
-        self._features.append(self._make_fake_feature(fid, item, **kwargs))
-        # inform listeners
+        added_fids = []
+        for fid, item in enumerate(items, max_fid + 1):
+            values = item.attrs()
+            keys = item.fields_names()
+            kwargs = dict(zip(keys, values))
+            self._features.append(self._make_fake_feature(fid, item, **kwargs))
+            added_fids.append(fid)
+        return added_fids
 
     def _make_fake_feature(self, fid: int, item: Data, **kwargs) -> FKFTR:
         return FakeFeature(item.fields_names(), fid, **kwargs)
 
-    def _delete_features(self, id: int):
-        def fil(f: FKFTR):
-            return f.fid() == id
-
-        to_del = filter(fil, self._features)
-        for f in to_del:
-            self._features.remove(f)
+    def _delete_features(self, fids: List[int]):
+        self.provider_calls['deleteFeatures'] += 1
+        self._features = [f for f in self._features if f.fid() not in fids]
 
     def id(self):
         return self._id
 
-    def refresh(self):
-        pass
+    def trigger_repaint(self):
+        self.repaints += 1
 
-    def features_by_name(self, name: str) -> List[IFeature]:
+    def _scan_features_by_name(self, name: str) -> List[IFeature]:
+        self.scans += 1
         return [f for f in self._features if f.name() == name]
 
     def all_features(self) -> List[IFeature]:
         return self._features
 
     def change_attribute_values(self, attr_map: Dict[int, Dict[int, Any]]):
+        self.provider_calls['changeAttributeValues'] += 1
+        self.changed_values += sum(len(values) for values in attr_map.values())
         for f in self._features:
             fid = f.fid()
             if fid in attr_map.keys():
                 f_map = attr_map.get(fid)
-                f.set_attributes(list(f_map.values()))
+                for idx, value in f_map.items():
+                    f.change_attribute(idx, value)
 
     def delete_all_features(self):
         self._features.clear()
 
-    def delete_features_by_name(self, name: str):
-        [self._features.remove(f) for f in self._features if f.name() == name]
-
 
 class FakePointsMapLayer(FakeMapLayer, IMapLayer):
 
     def _make_fake_feature(self, fid: int, item: Point, **kwargs) -> FKFTR:
-        return FakePointFeature(point.LOCAL_TO_REMOTE.local_names(), fid, item.x, item.y, **kwargs)
+        return FakePointFeature(item.fields_names(), fid, item.x, item.y, **kwargs)
+
+    def change_geometry_values(self, fid_to_item: Dict[int, Point]):
+        self.provider_calls['changeGeometryValues'] += 1
+        for f in self.features_by_fids(list(fid_to_item.keys())):
+            item = fid_to_item[f.fid()]
+            f.set_geometry(item.x, item.y)
 
 
 class FakeDocument:
-    def __init__(self, doc_map: dict):
+    def __init__(self, doc_map: dict, current: 'FakeDocument' = None):
         self.doc_map = doc_map
-        self.id = doc_map.get(database.data.NAME_REMOTE)
+        self.id = doc_map.get(database.data.NAME_REMOTE) or doc_map.get(team.TEAM_ID_REMOTE)
+        self.exists = True
+        self.reference = FakeDocumentGetter(self.id, current)
 
     def to_dict(self):
         return self.doc_map
 
 
+class FakeDocumentGetter:
+    def __init__(self, doc_id: str, current: FakeDocument):
+        self.doc_id = doc_id
+        self.current = current
+
+    def get(self) -> FakeDocument:
+        if self.current:
+            return self.current
+        missing = FakeDocument({})
+        missing.id = self.doc_id
+        missing.exists = False
+        return missing
+
+
+class FakeFailingGetter(FakeDocumentGetter):
+    def get(self) -> FakeDocument:
+        raise ConnectionError('fake read failure')
+
+
 class FakeChange:
     def __init__(self, change_type: ChangeType, document: FakeDocument):
         self.type = change_type
@@ -286,16 +353,21 @@ class TestSynchronizer:
             Point(0, 0, OrderedDict([(data.TIME, datetime.datetime.now()), (data.NAME, 'D2')]), []),
             Point(0, 0, OrderedDict([(data.TIME, datetime.datetime.now()), (data.NAME, 'D3')]), []),
         ]
-        project.points_layer = FakePointsMapLayer(model.m_config.POINTS_LAYER_STR, [], qgis)
+        points_layer = FakePointsMapLayer(model.m_config.POINTS_LAYER_STR, [], qgis)
         for p in points:
             point_name: str = p.attrs()[1]
-            project.points_layer.add_feature(p, point_name)
-        project.shears_todo_layer = FakeMapLayer(model.m_config.SHEARS_TODO_LAYER_STR, [], qgis)
-        project.shears_todo_layer.add_features(shears, 'D1')
+            points_layer.add_feature(p, point_name)
+        shears_todo_layer = FakeMapLayer(model.m_config.SHEARS_TODO_LAYER_STR, [], qgis)
+        shears_todo_layer.add_features(shears, 'D1')
+        project.set_layers(**{
+            model.m_config.POINTS_LAYER_STR: points_layer,
+            model.m_config.SHEARS_TODO_LAYER_STR: shears_todo_layer,
+        })
         projects = [project]
         synchronizer = Synchronizer(qgis, FakeUser('fake@mail.com'), projects)
         synchronizer.synchronize()
-        return synchronizer
+        yield synchronizer
+        synchronizer.desynchronize()
 
     def test_listeners_stop(self, sync_instance):
         assert len(sync_instance._listeners) != 0
@@ -339,10 +411,741 @@ class TestSynchronizer:
         features = layer.features_by_name('D1')
         assert len(features) == 0
 
-    def test_update_with_the_same_timestamp_is_skipped(self, sync_instance, point_D1):
+    def test_update_with_the_same_timestamp_is_applied(self, sync_instance, point_D1):
         self.send_point(point_D1)
         key = 'creator'
         point_D1.update({key: 'Lukas'})
         self.send_point(point_D1)
         layer = sync_instance.projects[0].points_layer
-        assert layer.feature_by_name('D1').attribute('tworca') == 'wojtek'
+        assert layer.feature_by_name('D1').attribute('tworca') == 'Lukas'
+
+    def test_unchanged_document_is_skipped(self, sync_instance, point_D1):
+        self.send_point(point_D1)
+        layer = sync_instance.projects[0].points_layer
+        layer.feature_by_name('D1').change_attribute(3, 'local')
+        self.send_point(dict(point_D1))
+        assert layer.feature_by_name('D1').attribute('tworca') == 'local'
+
+    def test_document_with_only_new_timestamp_is_skipped(self, sync_instance, point_D1):
+        self.send_point(point_D1)
+        layer = sync_instance.projects[0].points_layer
+        time = layer.feature_by_name('D1').time()
+        point_D1.update({'timestamp': DatetimeWithNanoseconds(2022, 6, 1, tzinfo=datetime.timezone.utc)})
+        self.send_point(point_D1)
+        assert layer.feature_by_name('D1').time() == time
+
+    def test_changed_sublist_without_new_timestamp_is_applied(self, sync_instance, point_D1):
+        self.send_point(point_D1)
+        point_D1.update({'shearsToDoList': [5.1, 6.2]})
+        self.send_point(point_D1)
+        layer = sync_instance.projects[0].shears_todo_layer
+        assert len(layer.features_by_name('D1')) == 2
+
+    def test_removed_document_is_applied_again_when_added(self, sync_instance, point_D1):
+        self.send_point(point_D1)
+        self.remove_point(point_D1)
+        self.send_point(point_D1)
+        assert sync_instance.projects[0].points_layer.feature_by_name('D1')
+
+    def written_documents(self, sync_instance) -> List[dict]:
+        sync_instance.flush()
+        return [doc_data for writes in sync_instance.user.commits for path, doc_data, merge in writes]
+
+    def test_echo_of_written_point_is_not_applied(self, sync_instance, point_D1):
+        self.send_point(point_D1)
+        layer = sync_instance.projects[0].points_layer
+        feature = layer.feature_by_name('D1')
+        feature.change_attribute(3, 'Lukas')
+        layer.attribute_values_changed_signal.emit(layer.id(), {feature.fid(): {3: 'Lukas'}})
+        echo, = self.written_documents(sync_instance)
+        layer.provider_calls.clear()
+        self.send_point({**point_D1, **echo})
+        assert sync_instance.suppressed_echoes_count() == 1
+        assert layer.provider_calls == {}
+
+    def test_echo_of_written_sublist_is_not_applied(self, sync_instance, point_D1):
+        self.send_point(point_D1)
+        layer = sync_instance.projects[0].shears_todo_layer
+        layer.add_features([TodoShear('D1', 7.5)], 'D1')
+        feature, = layer.features_by_name('D1')
+        layer.features_added_signal.emit(layer.id(), [feature])
+        echo, = self.written_documents(sync_instance)
+        self.send_point({**point_D1, **echo})
+        assert sync_instance.suppressed_echoes_count() == 1
+
+    def test_echo_of_deletion_is_not_applied(self, sync_instance, point_D1):
+        self.send_point(point_D1)
+        layer = sync_instance.projects[0].points_layer
+        fid = layer.feature_by_name('D1').fid()
+        layer.features_removed_signal.emit(layer.id(), [fid])
+        sync_instance.flush()
+        self.remove_point(point_D1)
+        assert sync_instance.suppressed_echoes_count() == 1
+
+    def test_change_of_other_user_is_applied(self, sync_instance, point_D1):
+        self.send_point(point_D1)
+        layer = sync_instance.projects[0].points_layer
+        feature = layer.feature_by_name('D1')
+        layer.attribute_values_changed_signal.emit(layer.id(), {feature.fid(): {}})
+        sync_instance.flush()
+        self.send_point({**point_D1, 'creator': 'Lukas'})
+        assert sync_instance.suppressed_echoes_count() == 0
+        assert layer.feature_by_name('D1').attribute('tworca') == 'Lukas'
+        # the echo of the plugin's write will not come back unchanged
+        assert sync_instance.expected_echoes_count() == 0
+
+    def test_expected_echoes_of_document_are_bounded(self, sync_instance, point_D1):
+        self.send_point(point_D1)
+        layer = sync_instance.projects[0].points_layer
+        feature = layer.feature_by_name('D1')
+        for i in range(3 * synchronize.MAX_EXPECTED_ECHOES):
+            feature.change_attribute(3, f'Lukas {i}')
+            layer.attribute_values_changed_signal.emit(layer.id(), {feature.fid(): {3: f'Lukas {i}'}})
+        assert sync_instance.expected_echoes_count() == synchronize.MAX_EXPECTED_ECHOES
+
+    def add_points(self, layer: IMapLayer, number: int):
+        for i in range(number):
+            name = f'P{i}'
+            fields = OrderedDict([(data.TIME, datetime.datetime.now()), (data.NAME, name)])
+            layer.add_feature(Point(i, i, fields, []), name)
+
+    def test_changed_points_are_sent_in_batches(self, sync_instance):
+        layer = sync_instance.projects[0].points_layer
+        self.add_points(layer, 1200)
+        changed = {f.fid(): {} for f in layer.all_features()}
+        layer.attribute_values_changed_signal.emit(layer.id(), changed)
+        sync_instance.flush()
+        commits = sync_instance.user.commits
+        assert [len(writes) for writes in commits] == [500, 500, 203]
+
+    def test_deleted_points_are_sent_in_one_batch(self, sync_instance):
+        layer = sync_instance.projects[0].points_layer
+        self.add_points(layer, 100)
+        fids = [f.fid() for f in layer.all_features()]
+        layer.features_removed_signal.emit(layer.id(), fids)
+        sync_instance.flush()
+        commits = sync_instance.user.commits
+        assert len(commits) == 1
+        assert all(doc_data is None for path, doc_data, merge in commits[0])
+
+    def test_changed_shears_todo_are_sent_in_one_batch(self, sync_instance):
+        layer = sync_instance.projects[0].shears_todo_layer
+        changed = {f.fid(): {} for f in layer.all_features()}
+        layer.attribute_values_changed_signal.emit(layer.id(), changed)
+        sync_instance.flush()
+        commits = sync_instance.user.commits
+        assert len(commits) == 1
+        path, doc_data, merge = commits[0][0]
+        assert path.endswith('map_points/D1')
+        assert doc_data == {point.SHEARS_TODO_LIST_REMOTE: [1.5, 1.9]}
+
+    def test_pending_writes_are_counted(self, sync_instance):
+        layer = sync_instance.projects[0].points_layer
+        changed = {f.fid(): {} for f in layer.all_features()}
+        layer.attribute_values_changed_signal.emit(layer.id(), changed)
+        assert sync_instance.flush(5)
+        assert sync_instance.pending_writes_count() == 0
+
+    def test_names_are_found_without_scanning_layer(self, sync_instance, point_D1, point_D4):
+        layer = sync_instance.projects[0].points_layer
+        scans = layer.scans
+        self.send_point(point_D4)
+        self.remove_point(point_D1)
+        assert layer.scans == scans
+        assert layer.feature_by_name('D4')
+        assert not layer.feature_by_name('D1')
+
+    def test_name_index_follows_layer_changes(self, sync_instance, point_D1, point_D4):
+        layer = sync_instance.projects[0].shears_todo_layer
+        self.send_point(point_D4)
+        self.remove_point(point_D1)
+        fids = sorted(f.fid() for f in layer.all_features())
+        assert layer.name_to_fids == {'D4': fids}
+        assert layer.fid_to_name == {fid: 'D4' for fid in fids}
+
+    def test_name_with_apostrophe_is_found(self, sync_instance, point_D1):
+        point_D1.update({'pointNumber': "D'1"})
+        self.send_point(point_D1)
+        layer = sync_instance.projects[0].points_layer
+        assert layer.feature_by_name("D'1").name() == "D'1"
+
+
+class TestBulkEdits:
+
+    def probe_units(self, name: str, number: int, value: str = '1') -> List[ProbeUnit]:
+        return [ProbeUnit(name, i, value) for i in range(number)]
+
+    @pytest.fixture
+    def units_layer(self) -> FakeMapLayer:
+        layer = FakeMapLayer(model.m_config.PROBE_UNITS_LAYER_STR, [], FakeQgis(None))
+        layer.index_features([])
+        layer.key_positions = (1,)
+        return layer
+
+    def test_units_added_together_call_provider_once_instead_of_for_each_row(self, units_layer):
+        for unit in self.probe_units('S1', 600):
+            units_layer.add_feature(unit, f'S1-{unit.index}')
+        row_by_row_calls = dict(units_layer.provider_calls)
+        units_layer.provider_calls.clear()
+        units_layer.add_features(self.probe_units('S2', 600), 'S2')
+        assert row_by_row_calls == {'addFeatures': 600}
+        assert units_layer.provider_calls == {'addFeatures': 1}
+
+    def test_added_units_are_one_provider_call(self, units_layer):
+        units_layer.add_features(self.probe_units('S1', 600), 'S1')
+        assert units_layer.provider_calls == {'addFeatures': 1}
+        assert len(units_layer.features_by_name('S1')) == 600
+
+    def test_changed_units_are_one_provider_call(self, units_layer):
+        units_layer.add_features(self.probe_units('S1', 600), 'S1')
+        units_layer.provider_calls.clear()
+        units_layer.add_features(self.probe_units('S1', 600, '2'), 'S1')
+        assert units_layer.provider_calls == {'changeAttributeValues': 1}
+        assert {f.attribute(probe.VALUE) for f in units_layer.features_by_name('S1')} == {'2'}
+
+    def test_shortened_and_extended_units_are_one_call_of_each_kind(self, units_layer):
+        units_layer.add_features(self.probe_units('S1', 600), 'S1')
+        units_layer.provider_calls.clear()
+        units_layer.add_features(self.probe_units('S1', 300, '2'), 'S1')
+        assert units_layer.provider_calls == {'changeAttributeValues': 1, 'deleteFeatures': 1}
+        units_layer.provider_calls.clear()
+        units_layer.add_features(self.probe_units('S1', 400, '3'), 'S1')
+        assert units_layer.provider_calls == {'changeAttributeValues': 1, 'addFeatures': 1}
+        features = units_layer.features_by_name('S1')
+        assert [f.attribute(probe.INDEX) for f in features] == list(range(400))
+
+    def test_unchanged_units_are_not_written(self, units_layer):
+        units_layer.add_features(self.probe_units('S1', 600), 'S1')
+        units_layer.provider_calls.clear()
+        units_layer.add_features(self.probe_units('S1', 600), 'S1')
+        assert units_layer.provider_calls == {}
+
+    def test_only_changed_values_are_written(self, units_layer):
+        units = self.probe_units('S1', 600)
+        units_layer.add_features(units, 'S1')
+        units[10] = ProbeUnit('S1', 10, '7')
+        units_layer.add_features(units, 'S1')
+        assert units_layer.changed_values == 1
+        assert units_layer.features_by_name('S1')[10].attribute(probe.VALUE) == '7'
+
+    TIME = '2022-05-31 08:17:01+02:00'
+
+    def point(self, x: float, y: float, **fields) -> Point:
+        return Point(x, y, OrderedDict([(data.TIME, self.TIME), (data.NAME, 'D1'), *fields.items()]), [])
+
+    @pytest.fixture
+    def points_layer(self) -> FakePointsMapLayer:
+        layer = FakePointsMapLayer(model.m_config.POINTS_LAYER_STR, [], FakeQgis(None))
+        layer.index_features([])
+        return layer
+
+    def test_equal_values_of_other_types_are_not_written(self, points_layer):
+        points_layer.add_feature(self.point(1.5, 2.5, tworca=None, wysokosc=86.7), 'D1')
+        feature = points_layer.feature_by_name('D1')
+        # the layer keeps the time as a naive local datetime
+        feature.change_attribute(1, datetime.datetime.fromisoformat(self.TIME).astimezone().replace(tzinfo=None))
+        feature.change_attribute(3, '')
+        points_layer.provider_calls.clear()
+        points_layer.add_feature(self.point(1.5, 2.5, tworca='', wysokosc='86.7'), 'D1')
+        assert points_layer.provider_calls == {}
+
+    def test_moved_point_changes_only_geometry(self, points_layer):
+        points_layer.add_feature(self.point(1.5, 2.5), 'D1')
+        points_layer.provider_calls.clear()
+        points_layer.add_feature(self.point(1.5, 3.5), 'D1')
+        assert points_layer.provider_calls == {'changeGeometryValues': 1}
+        assert points_layer.feature_by_name('D1').xy() == (1.5, 3.5)
+
+    def soil_layers(self, depths: List[float]) -> List[Layer]:
+        return [Layer('D1', depth, 'Pd', '', '', '', '', '', '', 0.0, '') for depth in depths]
+
+    @pytest.fixture
+    def layers_layer(self) -> FakeMapLayer:
+        layer = FakeMapLayer(model.m_config.LAYERS_LAYER_STR, [], FakeQgis(None))
+        Project('test', '/fake/dir').set_layers(**{model.m_config.LAYERS_LAYER_STR: layer})
+        layer.index_features([])
+        return layer
+
+    def test_layer_inserted_near_top_is_one_addition(self, layers_layer):
+        depths = [float(i) for i in range(1, 41)]
+        layers_layer.add_features(self.soil_layers(depths), 'D1')
+        fids = [f.fid() for f in layers_layer.features_by_name('D1')]
+        layers_layer.provider_calls.clear()
+        layers_layer.add_features(self.soil_layers([1.0, 1.5] + depths[1:]), 'D1')
+        assert layers_layer.provider_calls == {'addFeatures': 1}
+        features = layers_layer.features_by_name('D1')
+        assert [f.fid() for f in features][:40] == fids
+        assert features[-1].attribute('przelot') == 1.5
+
+    def test_inserted_layer_applied_again_is_not_changed(self, layers_layer):
+        layers_layer.add_features(self.soil_layers([1.0, 2.0, 3.0]), 'D1')
+        layers_layer.add_features(self.soil_layers([1.0, 1.5, 2.0, 3.0]), 'D1')
+        layers_layer.provider_calls.clear()
+        layers_layer.add_features(self.soil_layers([1.0, 1.5, 2.0, 3.0]), 'D1')
+        assert layers_layer.provider_calls == {}
+
+    def test_removed_layer_is_one_deletion(self, layers_layer):
+        layers_layer.add_features(self.soil_layers([1.0, 2.0, 3.0]), 'D1')
+        first, second, third = layers_layer.features_by_name('D1')
+        layers_layer.provider_calls.clear()
+        layers_layer.add_features(self.soil_layers([1.0, 3.0]), 'D1')
+        assert layers_layer.provider_calls == {'deleteFeatures': 1}
+        assert layers_layer.features_by_name('D1') == [first, third]
+
+    def test_units_are_matched_by_index(self, units_layer):
+        units_layer.add_features([ProbeUnit('S1', 1, '5'), ProbeUnit('S1', 2, '6')], 'S1')
+        first, second = units_layer.features_by_name('S1')
+        units_layer.provider_calls.clear()
+        units_layer.add_features([ProbeUnit('S1', 0, '4'), ProbeUnit('S1', 1, '5'), ProbeUnit('S1', 2, '7')], 'S1')
+        assert units_layer.provider_calls == {'addFeatures': 1, 'changeAttributeValues': 1}
+        assert units_layer.changed_values == 1
+        assert units_layer.features_by_name('S1')[:2] == [first, second]
+
+
+class TestColumns:
+
+    @pytest.fixture
+    def points_layer(self) -> FakePointsMapLayer:
+        local_names = point.LOCAL_TO_REMOTE.local_names()
+        features = [FakePointFeature(local_names, i, float(i), float(i), **{
+            data.TIME: datetime.datetime(2022, 5, 31, 8, 17, 1), data.NAME: f'P{i}', point.HEIGHT: 86.7,
+            point.BOREHOLE_STATE: 'Zrobiony', point.STAKEOUT: True}) for i in range(1, 10001)]
+        layer = FakePointsMapLayer(model.m_config.POINTS_LAYER_STR, features, FakeQgis(None))
+        layer.name = model.m_config.POINTS_LAYER_STR
+        layer.database_ref_path = 'points'
+        layer.features_to_remote = m_project._points_map
+        layer.remote_fields = m_project._POINTS_FIELDS
+        layer.index_features(layer.all_features())
+        return layer
+
+    def test_columns_are_in_order_of_ids(self, points_layer):
+        columns = points_layer.columns([3, 1, 2], [data.NAME, point.HEIGHT])
+        assert columns.fids == [1, 2, 3]
+        assert columns.column(data.NAME) == ['P1', 'P2', 'P3']
+        assert columns.column(point.HEIGHT) == [86.7] * 3
+        assert columns.xy == [(1.0, 1.0), (2.0, 2.0), (3.0, 3.0)]
+
+    def test_modified_points_are_read_at_once(self, points_layer):
+        names = {f'P{i}' for i in range(1, 1001)}
+        writes = remote_update.items_modify_writes(FakeDocumentReference('projects/p'), names, points_layer)
+        assert points_layer.reads == 1
+        assert {write.name for write in writes} == names
+        assert writes[0].data[point.BOREHOLE_STATE_REMOTE] == 'DONE'
+
+    def test_large_layer_is_serialized_from_columns_like_from_features(self, points_layer):
+        points_map = points_layer.features_to_remote(points_layer.columns(None, points_layer.remote_fields))
+        assert len(points_map) == 10000
+        assert points_map['P7'][point.HEIGHT_REMOTE] == '86.7'
+        assert points_map['P7'][point.POINT_X] == 7.0
+        assert points_layer.features_to_remote(points_layer.all_features()) == points_map
+
+
+class TestResume:
+
+    @pytest.fixture
+    def project(self, tmp_path) -> Project:
+        project = Project('test', str(tmp_path))
+        m_gpkg.initialize(project.gpkg_file_path)
+        return project
+
+    def synchronize(self, project: Project, qgis: IQgis = None) -> Synchronizer:
+        qgis = qgis or FakeQgis(None)
+        points_layer = FakePointsMapLayer(model.m_config.POINTS_LAYER_STR, [], qgis)
+        shears_todo_layer = FakeMapLayer(model.m_config.SHEARS_TODO_LAYER_STR, [], qgis)
+        project.set_layers(**{
+            model.m_config.POINTS_LAYER_STR: points_layer,
+            model.m_config.SHEARS_TODO_LAYER_STR: shears_todo_layer,
+        })
+        FakeMapPointsReference.queries = []
+        synchronizer = Synchronizer(qgis, FakeUser('fake@mail.com'), [project])
+        synchronizer.synchronize()
+        return synchronizer
+
+    def point(self, name: str, time: datetime.datetime) -> dict:
+        return {'pointNumber': name, 'x': 1.0, 'y': 2.0, 'timestamp': time, 'shearsToDoList': []}
+
+    def send(self, *changes: FakeChange, read_time: datetime.datetime = None):
+        FakeMapPointsReference.send_update(None, list(changes), read_time)
+
+    def test_first_synchronization_listens_to_whole_collection(self, project):
+        synchronizer = self.synchronize(project)
+        assert FakeMapPointsReference.queries == []
+        synchronizer.desynchronize()
+
+    def test_next_synchronization_listens_to_changes_since_latest_timestamp(self, project):
+        synchronizer = self.synchronize(project)
+        time = datetime.datetime(2022, 5, 31, 6, 17, 1, tzinfo=datetime.timezone.utc)
+        self.send(FakeChange(ChangeType.ADDED, FakeDocument(self.point('D1', time))),
+                  FakeChange(ChangeType.ADDED, FakeDocument(self.point('D2', time - datetime.timedelta(hours=1)))))
+        synchronizer.desynchronize()
+
+        self.synchronize(project).desynchronize()
+
+        assert FakeMapPointsReference.queries == [('timestamp', '>', time - synchronize.RESUME_MARGIN)]
+
+    def test_timestamps_ahead_of_database_are_not_marked(self, project):
+        synchronizer = self.synchronize(project)
+        read_time = datetime.datetime(2022, 5, 31, tzinfo=datetime.timezone.utc)
+        future = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+        self.send(FakeChange(ChangeType.ADDED, FakeDocument(self.point('D1', future))), read_time=read_time)
+        synchronizer.desynchronize()
+
+        self.synchronize(project).desynchronize()
+
+        assert FakeMapPointsReference.queries == [('timestamp', '>', read_time - synchronize.RESUME_MARGIN)]
+
+    def stored_mark(self, project: Project) -> Optional[str]:
+        with closing(m_gpkg.connect(project.gpkg_file_path)) as conn:
+            return m_gpkg.get_meta(conn, synchronize._resume_mark_key(synchronize._collection_key(project.points_layer)))
+
+    def test_marks_of_snapshots_are_written_once_later(self, project):
+        qgis = FakeTimersQgis()
+        synchronizer = self.synchronize(project, qgis)
+        time = datetime.datetime(2022, 5, 31, tzinfo=datetime.timezone.utc)
+        for minute in range(3):
+            self.send(FakeChange(ChangeType.ADDED, FakeDocument(self.point(f'D{minute}', time.replace(minute=minute)))))
+
+        assert self.stored_mark(project) is None
+        qgis.fire_all()
+        assert self.stored_mark(project) == time.replace(minute=2).isoformat()
+        synchronizer.desynchronize()
+
+    def test_unsaved_mark_is_written_when_synchronization_stops(self, project):
+        synchronizer = self.synchronize(project, FakeTimersQgis())
+        time = datetime.datetime(2022, 5, 31, tzinfo=datetime.timezone.utc)
+        self.send(FakeChange(ChangeType.ADDED, FakeDocument(self.point('D1', time))))
+        synchronizer.desynchronize()
+
+        assert self.stored_mark(project) == time.isoformat()
+
+    def test_document_leaving_changes_is_removed_only_when_deleted(self, project):
+        synchronizer = self.synchronize(project)
+        time = datetime.datetime(2022, 5, 31, tzinfo=datetime.timezone.utc)
+        self.send(FakeChange(ChangeType.ADDED, FakeDocument(self.point('D1', time))),
+                  FakeChange(ChangeType.ADDED, FakeDocument(self.point('D2', time))))
+        synchronizer.desynchronize()
+        synchronizer = self.synchronize(project)
+        layer = project.points_layer
+
+        moved_back = FakeDocument(self.point('D1', time - datetime.timedelta(days=2)))
+        self.send(FakeChange(ChangeType.REMOVED, FakeDocument(self.point('D1', time), moved_back)),
+                  FakeChange(ChangeType.REMOVED, FakeDocument(self.point('D2', time))))
+
+        assert layer.feature_by_name('D1')
+        assert not layer.feature_by_name('D2')
+        assert len(synchronizer.user.reads) == 1
+        synchronizer.desynchronize()
+
+    def test_document_which_cannot_be_read_is_removed(self, project):
+        synchronizer = self.synchronize(project)
+        time = datetime.datetime(2022, 5, 31, tzinfo=datetime.timezone.utc)
+        self.send(FakeChange(ChangeType.ADDED, FakeDocument(self.point('D1', time))))
+        synchronizer.desynchronize()
+        synchronizer = self.synchronize(project)
+        layer = project.points_layer
+
+        removed = FakeDocument(self.point('D1', time))
+        removed.reference = FakeFailingGetter('D1', None)
+        self.send(FakeChange(ChangeType.REMOVED, removed))
+
+        assert not layer.feature_by_name('D1')
+        synchronizer.desynchronize()
+
+
+class TestTeams:
+
+    @pytest.fixture
+    def sync_instance(self) -> Synchronizer:
+        qgis = FakeQgis(None)
+        project = Project('test', '/fake/dir')
+        project.set_layers(**{
+            model.m_config.POINTS_LAYER_STR: FakePointsMapLayer(model.m_config.POINTS_LAYER_STR, [], qgis),
+            model.m_config.TEAMS_LAYER_STR: FakePointsMapLayer(model.m_config.TEAMS_LAYER_STR, [], qgis),
+        })
+        synchronizer = Synchronizer(qgis, FakeUser('fake@mail.com'), [project])
+        synchronizer.synchronize()
+        yield synchronizer
+        synchronizer.desynchronize()
+
+    def team(self, name: str, x: float, minute: int = 0) -> dict:
+        time = DatetimeWithNanoseconds(2022, 5, 31, 6, minute, tzinfo=datetime.timezone.utc)
+        return {'id': name, 'x': x, 'y': 488728.8, 'timestamp': time}
+
+    def send(self, *changes: Tuple[ChangeType, dict]):
+        FakeTeamsReference.send_update(None, [FakeChange(change_type, FakeDocument(doc_map))
+                                              for change_type, doc_map in changes], None)
+
+    def test_added_teams_are_one_provider_call(self, sync_instance):
+        layer = sync_instance.projects[0].teams_layer
+        self.send((ChangeType.ADDED, self.team('T1', 460797.19)), (ChangeType.ADDED, self.team('T2', 460798.19)))
+        assert layer.provider_calls == {'addFeatures': 1}
+        assert layer.feature_by_name('T2').xy() == (460798.19, 488728.8)
+
+    def test_moved_teams_are_one_geometry_update(self, sync_instance):
+        layer = sync_instance.projects[0].teams_layer
+        self.send((ChangeType.ADDED, self.team('T1', 460797.19)), (ChangeType.ADDED, self.team('T2', 460798.19)))
+        layer.provider_calls.clear()
+        self.send((ChangeType.MODIFIED, self.team('T1', 460790.0, 1)), (ChangeType.MODIFIED, self.team('T2', 460791.0, 1)))
+        assert layer.provider_calls == {'changeGeometryValues': 1, 'changeAttributeValues': 1}
+        assert layer.feature_by_name('T1').xy() == (460790.0, 488728.8)
+
+    def test_only_changed_team_is_processed(self, sync_instance):
+        layer = sync_instance.projects[0].teams_layer
+        self.send((ChangeType.ADDED, self.team('T1', 460797.19)), (ChangeType.ADDED, self.team('T2', 460798.19)))
+        other_team = layer.feature_by_name('T2')
+        layer.provider_calls.clear()
+        self.send((ChangeType.MODIFIED, self.team('T1', 460790.0, 1)))
+        assert layer.provider_calls == {'changeGeometryValues': 1, 'changeAttributeValues': 1}
+        assert layer.changed_values == 1
+        assert layer.feature_by_name('T2') == other_team
+
+    def test_unchanged_team_is_skipped(self, sync_instance):
+        layer = sync_instance.projects[0].teams_layer
+        self.send((ChangeType.ADDED, self.team('T1', 460797.19)))
+        layer.provider_calls.clear()
+        self.send((ChangeType.MODIFIED, self.team('T1', 460797.19)))
+        assert layer.provider_calls == {}
+
+    def test_team_reporting_same_position_later_gets_new_time(self, sync_instance):
+        layer = sync_instance.projects[0].teams_layer
+        self.send((ChangeType.ADDED, self.team('T1', 460797.19)))
+        self.send((ChangeType.MODIFIED, self.team('T1', 460797.19, 1)))
+        assert layer.feature_by_name('T1').attribute(data.TIME) == Data.remote_time_to_local(
+            self.team('T1', 460797.19, 1)['timestamp'])
+
+    def test_removed_team_is_deleted(self, sync_instance):
+        layer = sync_instance.projects[0].teams_layer
+        self.send((ChangeType.ADDED, self.team('T1', 460797.19)), (ChangeType.ADDED, self.team('T2', 460798.19)))
+        self.send((ChangeType.REMOVED, self.team('T1', 460797.19)))
+        assert not layer.feature_by_name('T1')
+        assert layer.feature_by_name('T2')
+
+    def point(self, name: str, x: float, performer: str = '', minute: int = 0) -> dict:
+        time = DatetimeWithNanoseconds(2022, 5, 31, 6, minute, tzinfo=datetime.timezone.utc)
+        return {'pointNumber': name, 'x': x, 'y': 488728.8, 'assignedPerformer': performer, 'timestamp': time,
+                'shearsToDoList': []}
+
+    def send_points(self, *changes: Tuple[ChangeType, dict]):
+        FakeMapPointsReference.send_update(None, [FakeChange(change_type, FakeDocument(doc_map))
+                                                  for change_type, doc_map in changes], None)
+
+    def test_nearest_unassigned_points_follow_snapshots(self, sync_instance):
+        project = sync_instance.projects[0]
+        self.send((ChangeType.ADDED, self.team('T1', 460000.0)))
+        self.send_points((ChangeType.ADDED, self.point('D1', 460010.0, 'T2')),
+                         (ChangeType.ADDED, self.point('D2', 460020.0)),
+                         (ChangeType.ADDED, self.point('D3', 461000.0)))
+        assert project.nearest_unassigned_points('T1', 2) == ['D2', 'D3']
+        self.send((ChangeType.MODIFIED, self.team('T1', 461100.0, 1)))
+        assert project.nearest_unassigned_points('T1', 2) == ['D3', 'D2']
+        self.send_points((ChangeType.MODIFIED, self.point('D3', 461000.0, 'T1', 1)))
+        assert project.nearest_unassigned_points('T1', 2) == ['D2']
+
+    def test_points_within_radius_of_team(self, sync_instance):
+        project = sync_instance.projects[0]
+        self.send((ChangeType.ADDED, self.team('T1', 460000.0)))
+        self.send_points((ChangeType.ADDED, self.point('D1', 460010.0, 'T2')),
+                         (ChangeType.ADDED, self.point('D2', 459950.0)),
+                         (ChangeType.ADDED, self.point('D3', 461000.0)))
+        assert project.points_within('T1', 100.0) == ['D1', 'D2']
+        self.send_points((ChangeType.REMOVED, self.point('D1', 460010.0, 'T2')))
+        assert project.points_within('T1', 100.0) == ['D2']
+        assert project.points_within('T2', 100.0) == []
+
+    def test_points_without_geometry_are_not_indexed(self, sync_instance):
+        layer = sync_instance.projects[0].points_layer
+        names = [data.TIME, data.NAME, point.ASSIGNED_PERFORMER]
+        layer.index_features([FakePointFeature(names, 1, 0, 0, punkt='D1'),
+                              FakePointFeature(names, 2, 460010.0, 488728.8, punkt='D2')])
+        assert 1 not in layer.spatial_index
+        assert 2 in layer.spatial_index
+
+    def test_assigned_work_is_sent_in_one_batch(self, sync_instance):
+        project = sync_instance.projects[0]
+        self.send((ChangeType.ADDED, self.team('T1', 460000.0)), (ChangeType.ADDED, self.team('T2', 461000.0)))
+        self.send_points((ChangeType.ADDED, {**self.point('D1', 460010.0), 'boreholeStatus': 'TODO'}),
+                         (ChangeType.ADDED, {**self.point('D2', 460990.0), 'probeStatus': 'TODO'}),
+                         (ChangeType.ADDED, {**self.point('D3', 460020.0), 'probeStatus': 'DONE'}))
+        layer = project.points_layer
+        layer.provider_calls.clear()
+
+        assert sync_instance.assign_work(project) == {'D1': 'T1', 'D2': 'T2'}
+        assert layer.provider_calls == {'changeAttributeValues': 1}
+        assert layer.feature_by_name('D2').attribute(point.ASSIGNED_PERFORMER) == 'T2'
+        assert project.nearest_unassigned_points('T1', 5) == ['D3']
+        sync_instance.flush()
+        writes, = sync_instance.user.commits
+        assert sorted((path.split('/')[-1], doc_data[point.ASSIGNED_PERFORMER_REMOTE]) for path, doc_data, _ in writes) \
+               == [('D1', 'T1'), ('D2', 'T2')]
+
+
+class FakeSnapshotsReference:
+    """Collection reference with snapshots sent by the test"""
+
+    def __init__(self):
+        self.on_update = None
+
+    def where(self, field_path: str, op_string: str, value: Any) -> 'FakeSnapshotsReference':
+        return self
+
+    def on_snapshot(self, on_update: callable) -> FakeWatch:
+        self.on_update = on_update
+        return FakeWatch()
+
+    def send(self, changes: List[FakeChange]):
+        self.on_update(None, changes, None)
+
+
+class FakeSnapshotsUser(FakeUser):
+    """User with references of collections sending snapshots of the test"""
+
+    def __init__(self, email: str):
+        super().__init__(email)
+        self.references: Dict[Tuple[str, str], FakeSnapshotsReference] = defaultdict(FakeSnapshotsReference)
+
+    def map_points_ref(self, project_name) -> FakeSnapshotsReference:
+        return self.references[(project_name, 'map_points')]
+
+    def teams_ref(self, project_name) -> FakeSnapshotsReference:
+        return self.references[(project_name, 'teams')]
+
+    def probes_ref(self, project_name) -> FakeSnapshotsReference:
+        return self.references[(project_name, 'probes')]
+
+
+@pytest.fixture
+def make_sync_instance():
+    """Factory of synchronizing instances of a project with fake layers of the names"""
+    synchronizers = []
+
+    def make(layer_names: Iterable[str], packed_probe_units: bool = False) -> Synchronizer:
+        qgis = FakeQgis(None)
+        project = Project('test', '/fake/dir', packed_probe_units=packed_probe_units)
+        project.set_layers(**{name: FakeMapLayer(name, [], qgis) for name in layer_names})
+        synchronizer = Synchronizer(qgis, FakeSnapshotsUser('fake@mail.com'), [project])
+        synchronizer.synchronize()
+        synchronizers.append(synchronizer)
+        return synchronizer
+
+    yield make
+    for synchronizer in synchronizers:
+        synchronizer.desynchronize()
+
+
+class TestProbeSeries:
+
+    @pytest.fixture
+    def sync_instance(self, make_sync_instance) -> Synchronizer:
+        return make_sync_instance([model.m_config.PROBES_LAYER_STR, model.m_config.PROBE_SERIES_LAYER_STR],
+                                  packed_probe_units=True)
+
+    def send(self, sync_instance, change_type: ChangeType, units: List[str], minute: int = 0):
+        time = DatetimeWithNanoseconds(2022, 5, 31, 6, minute, tzinfo=datetime.timezone.utc)
+        doc_map = {'pointNumber': 'S1', 'timestamp': time, 'probe': {'probeType': 'DPL', 'units': units}}
+        sync_instance.user.references[('test', 'probes')].send([FakeChange(change_type, FakeDocument(doc_map))])
+
+    def test_packed_project_has_series_layer_instead_of_units_layer(self):
+        project = Project('test', '/fake/dir', packed_probe_units=True)
+        assert model.m_config.PROBE_SERIES_LAYER_STR in project.layers_names
+        assert model.m_config.PROBE_UNITS_LAYER_STR not in project.layers_names
+
+    def test_units_of_probe_are_one_feature(self, sync_instance):
+        layer = sync_instance.projects[0].probe_series_layer
+        self.send(sync_instance, ChangeType.ADDED, [str(i % 40) for i in range(300)])
+        assert len(layer.all_features()) == 1
+        assert m_project._probe_series_map(layer.all_features()) == {
+            'probe': {'units': [str(i % 40) for i in range(300)]}}
+
+    def test_changed_units_change_the_series(self, sync_instance):
+        layer = sync_instance.projects[0].probe_series_layer
+        self.send(sync_instance, ChangeType.ADDED, ['3', '5'])
+        layer.provider_calls.clear()
+        self.send(sync_instance, ChangeType.MODIFIED, ['3', '5', '12'], 1)
+        assert layer.provider_calls == {'changeAttributeValues': 1}
+        assert layer.feature_by_name('S1').attribute(probe.SERIES) == '[3,5,12]'
+
+    def test_removed_probe_removes_the_series(self, sync_instance):
+        layer = sync_instance.projects[0].probe_series_layer
+        self.send(sync_instance, ChangeType.ADDED, ['3', '5'])
+        self.send(sync_instance, ChangeType.REMOVED, ['3', '5'])
+        assert not layer.all_features()
+
+
+class TestProbeAnalysis:
+
+    @pytest.fixture
+    def sync_instance(self, make_sync_instance) -> Synchronizer:
+        return make_sync_instance([model.m_config.PROBES_LAYER_STR, model.m_config.PROBE_UNITS_LAYER_STR,
+                                   model.m_config.PROBE_ANALYSIS_LAYER_STR])
+
+    def probe(self, name: str, units: List[str], minute: int = 0) -> FakeDocument:
+        time = DatetimeWithNanoseconds(2022, 5, 31, 6, minute, tzinfo=datetime.timezone.utc)
+        return FakeDocument({'pointNumber': name, 'timestamp': time, 'probe': {'interval': '0.1', 'units': units}})
+
+    def send(self, sync_instance, *changes: Tuple[ChangeType, FakeDocument]):
+        changes = [FakeChange(change_type, document) for change_type, document in changes]
+        sync_instance.user.references[('test', 'probes')].send(changes)
+
+    def test_probes_of_snapshot_are_analysed_in_one_call(self, sync_instance):
+        layer = sync_instance.projects[0].probe_analysis_layer
+        self.send(sync_instance, (ChangeType.ADDED, self.probe('S1', ['1', '2'])),
+                  (ChangeType.ADDED, self.probe('S2', ['3'])))
+        assert layer.provider_calls == {'addFeatures': 1}
+        assert layer.feature_by_name('S1').attribute(m_analysis.N10_MAX) == 2.0
+
+    def test_analysis_follows_changed_and_removed_probes(self, sync_instance):
+        layer = sync_instance.projects[0].probe_analysis_layer
+        self.send(sync_instance, (ChangeType.ADDED, self.probe('S1', ['1', '2'])),
+                  (ChangeType.ADDED, self.probe('S2', ['3'])))
+        self.send(sync_instance, (ChangeType.MODIFIED, self.probe('S1', ['1', '2', '8'], 1)),
+                  (ChangeType.REMOVED, self.probe('S2', ['3'])))
+        assert layer.feature_by_name('S1').attribute(m_analysis.N10_MAX) == 8.0
+        assert not layer.feature_by_name('S2')
+
+    def test_committed_units_and_interval_are_analysed(self, sync_instance):
+        project = sync_instance.projects[0]
+        layer = project.probe_analysis_layer
+        self.send(sync_instance, (ChangeType.ADDED, self.probe('S1', ['1', '2'])))
+        units_layer = project.probe_units_layer
+        second_unit = units_layer.features_by_name('S1')[1]
+        second_unit.change_attribute(3, '9')
+        units_layer.attribute_values_changed_signal.emit(units_layer.id(), {second_unit.fid(): {3: '9'}})
+        assert layer.feature_by_name('S1').attribute(m_analysis.N10_MAX) == 9.0
+        probe_feature = project.probes_layer.feature_by_name('S1')
+        probe_feature.change_attribute(probe_feature._local_names.index(probe.INTERVAL) + 1, '0.2')
+        project.probes_layer.attribute_values_changed_signal.emit(project.probes_layer.id(), {probe_feature.fid(): {}})
+        assert layer.feature_by_name('S1').attribute(m_analysis.DEPTH) == 0.4
+
+
+class TestShearSummaries:
+
+    @pytest.fixture
+    def sync_instance(self, make_sync_instance) -> Synchronizer:
+        return make_sync_instance([model.m_config.PROBES_LAYER_STR, model.m_config.SHEAR_UNITS_LAYER_STR,
+                                   model.m_config.SHEAR_SUMMARY_LAYER_STR])
+
+    def send_probe(self, sync_instance, shears: List[dict]):
+        doc_map = {'pointNumber': 'S1', 'timestamp': None, 'shears': shears}
+        sync_instance.user.references[('test', 'probes')].send([FakeChange(ChangeType.ADDED, FakeDocument(doc_map))])
+
+    def test_shears_of_probe_are_summarized_by_depth(self, sync_instance):
+        layer = sync_instance.projects[0].shear_summary_layer
+        self.send_probe(sync_instance, [{'depth': '1.6', 'torques': ['13', '24', '20']},
+                                        {'depth': '2.7', 'torques': ['6', '9']}])
+        assert [f.attributes()[1:] for f in layer.all_features()] == [
+            ['S1', 1.6, 24.0, 20.0, 3, False], ['S1', 2.7, 9.0, 9.0, 2, False]]
+
+    def test_committed_units_change_only_their_shear(self, sync_instance):
+        project = sync_instance.projects[0]
+        self.send_probe(sync_instance, [{'depth': '1.6', 'torques': ['13', '24'] + ['20'] * 16},
+                                        {'depth': '2.7', 'torques': ['6'] * 18}])
+        units_layer = project.shear_units_layer
+        feature = [f for f in units_layer.features_by_name('S1') if f.attribute(database.shear.INDEX) == 1][0]
+        feature.change_attribute(4, '30')
+        project.shear_summary_layer.provider_calls.clear()
+
+        units_layer.attribute_values_changed_signal.emit(units_layer.id(), {feature.fid(): {4: '30'}})
+
+        assert project.shear_summary_layer.provider_calls == {'changeAttributeValues': 1}
+        assert project.shear_summary_layer.changed_values == 1
+        assert project.shear_summary_layer.all_features()[0].attribute(m_shears.PEAK) == 30.0
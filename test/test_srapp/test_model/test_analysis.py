@@ -0,0 +1,75 @@
+import json
+
+from model import m_analysis
+from model.m_analysis import ProbeAnalyzer, ProbeMeasurement, analyse_probes
+
+
+def _measurement(name: str, units, interval: float = 0.1, start_depth: float = 0.0) -> ProbeMeasurement:
+    return ProbeMeasurement(name, tuple(units), interval, start_depth)
+
+
+def test_statistics_of_probe():
+    analysis, = analyse_probes([_measurement('S1', ['2'] * 5 + ['10'] * 6)])
+
+    assert analysis.depth == 1.1
+    assert analysis.n10_mean == 6.36
+    assert analysis.n10_max == 10.0
+    assert analysis.n20_mean == 12.73
+    assert json.loads(analysis.metre_sums) == [60.0, 10.0]
+    assert json.loads(analysis.running_means)[:6] == [2.0, 2.0, 2.0, 2.0, 2.0, 3.6]
+    assert json.loads(analysis.boundaries) == [0.5]
+
+
+def test_blows_are_per_10_and_20_cm_for_other_intervals():
+    analysis, = analyse_probes([_measurement('S1', ['4', '', '6'], interval=0.2, start_depth=0.5)])
+
+    assert analysis.depth == 1.1
+    assert analysis.n10_mean == 2.5
+    assert analysis.n20_mean == 5.0
+    # units of the first metre, nothing starts below 1 m
+    assert json.loads(analysis.metre_sums) == [10.0, None]
+
+
+def test_probes_of_different_lengths_are_analysed_together():
+    analyses = analyse_probes([_measurement('S1', ['1'] * 30), _measurement('S2', []), _measurement('S3', ['x', '3'])])
+
+    assert [analysis.name for analysis in analyses] == ['S1', 'S2', 'S3']
+    assert json.loads(analyses[0].metre_sums) == [10.0, 10.0, 10.0]
+    assert analyses[1].n10_mean is None
+    assert analyses[1].attrs()[5:] == ['[]', '[]', '[]']
+    assert analyses[2].n10_max == 3.0
+
+
+def test_analysis_of_unchanged_series_is_reused(monkeypatch):
+    analyzer = ProbeAnalyzer()
+    analyzer.analyse([_measurement('S1', ['1', '2']), _measurement('S2', ['3'])])
+    analysed = []
+
+    def count_analysed(measurements):
+        analysed.extend(measurement.name for measurement in measurements)
+        return analyse_probes(measurements)
+
+    monkeypatch.setattr(m_analysis, 'analyse_probes', count_analysed)
+    analyses = analyzer.analyse([_measurement('S1', ['1', '2']), _measurement('S2', ['3', '4'])])
+
+    assert analysed == ['S2']
+    assert [analysis.n10_max for analysis in analyses] == [2.0, 4.0]
+
+
+def test_large_project_is_analysed_in_one_pass(monkeypatch):
+    measurements = [_measurement(f'S{i}', [str(j % 30) for j in range(300)]) for i in range(300)]
+    calls = []
+
+    def counted(func):
+        def call(*args):
+            calls.append(func.__name__)
+            return func(*args)
+        return call
+
+    for name in ['_metre_sums', '_running_means', '_boundaries', '_number']:
+        monkeypatch.setattr(m_analysis, name, counted(getattr(m_analysis, name)))
+    analyses = analyse_probes(measurements)
+
+    assert len(analyses) == 300
+    # all probes are computed together and numbers as text are not converted one by one
+    assert sorted(calls) == ['_boundaries', '_metre_sums', '_running_means']
@@ -0,0 +1,82 @@
+import random
+
+from database import data, point
+from model import m_assignment
+from model.m_assignment import Task, TeamPosition
+from model.m_columns import Columns
+
+TODO = m_assignment.STATUS_TODO
+
+
+def test_only_points_to_do_are_tasks():
+    columns = Columns([1, 2, 3], {
+        data.NAME: ['D1', 'D2', 'D3'],
+        point.BOREHOLE_STATE: [TODO, 'Zrobiony', ''],
+        point.PROBE_STATE: ['', TODO, 'Zrobiony'],
+        point.BOREHOLE_DEPTH: ['5.0', '8.0', '3.0'],
+        point.PROBE_DEPTH: ['4.0', 'x', None],
+        point.ASSIGNED_PERFORMER: [None, 'T1', None],
+    }, [(1, 1), (2, 2), (3, 3)])
+
+    assert m_assignment.todo_tasks(columns) == [Task('D1', 1, 1, 6.0, None), Task('D2', 2, 2, 1.0, 'T1')]
+
+
+def test_points_and_teams_without_geometry_are_skipped():
+    points = Columns([1, 2], {
+        data.NAME: ['D1', 'D2'],
+        point.BOREHOLE_STATE: [TODO, TODO],
+        point.ASSIGNED_PERFORMER: [None, None],
+    }, [(0, 0), (5, 5)])
+    teams = Columns([1, 2], {data.NAME: ['T1', 'T2']}, [(0, 0), (10, 10)])
+
+    assert [task.name for task in m_assignment.todo_tasks(points)] == ['D2']
+    assert m_assignment.team_positions(teams) == [TeamPosition('T2', 10, 10)]
+
+
+def test_tasks_go_to_nearest_teams():
+    teams = [TeamPosition('T1', 0, 0), TeamPosition('T2', 1000, 0)]
+    tasks = [Task('D1', 10, 0, 1, None), Task('D2', 990, 0, 1, None), Task('D3', 20, 0, 1, None),
+             Task('D4', 980, 0, 1, None)]
+
+    assert m_assignment.assign(tasks, teams) == {'D1': 'T1', 'D2': 'T2', 'D3': 'T1', 'D4': 'T2'}
+
+
+def test_work_is_balanced_between_teams():
+    teams = [TeamPosition('T1', 0, 0), TeamPosition('T2', 1000, 0)]
+    tasks = [Task(f'D{i}', i, 0, 1, None) for i in range(10)]
+
+    performers = list(m_assignment.assign(tasks, teams).values())
+
+    assert performers.count('T1') == 5
+    assert performers.count('T2') == 5
+
+
+def test_assigned_tasks_keep_teams_and_count_to_work():
+    teams = [TeamPosition('T1', 0, 0), TeamPosition('T2', 1000, 0)]
+    tasks = [Task('D1', 0, 0, 10, 'T1'), Task('D2', 5, 0, 5, None), Task('D3', 6, 0, 5, None)]
+
+    assert m_assignment.assign(tasks, teams) == {'D2': 'T2', 'D3': 'T2'}
+
+
+def test_nothing_is_assigned_without_teams():
+    assert m_assignment.assign([Task('D1', 0, 0, 1, None)], []) == {}
+
+
+def test_thousands_of_points_are_assigned_with_one_distance_matrix(monkeypatch):
+    rnd = random.Random(1)
+    teams = [TeamPosition(f'T{i}', rnd.uniform(0, 10000), rnd.uniform(0, 10000)) for i in range(20)]
+    tasks = [Task(f'D{i}', rnd.uniform(0, 10000), rnd.uniform(0, 10000), 1 + rnd.uniform(0, 30), None)
+             for i in range(5000)]
+    shapes = []
+    distance_matrix = m_assignment.distance_matrix
+
+    def counted_distance_matrix(points, team_points):
+        distances = distance_matrix(points, team_points)
+        shapes.append(distances.shape)
+        return distances
+
+    monkeypatch.setattr(m_assignment, 'distance_matrix', counted_distance_matrix)
+    name_to_performer = m_assignment.assign(tasks, teams)
+
+    assert len(name_to_performer) == len(tasks)
+    assert shapes == [(len(tasks), len(teams))]
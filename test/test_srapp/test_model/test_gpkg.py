@@ -0,0 +1,90 @@
+import sqlite3
+from contextlib import closing
+
+from model import m_gpkg
+from model.m_config import POINTS_LAYER_STR, PROBE_SERIES_LAYER_STR, PROBE_SERIES_VIEW_STR, PROBE_UNITS_LAYER_STR, \
+    TEAMS_LAYER_STR
+
+
+def _make_gpkg(path):
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute(f'CREATE TABLE "{POINTS_LAYER_STR}" (fid INTEGER PRIMARY KEY, punkt TEXT)')
+        conn.execute(f'CREATE TABLE "{PROBE_UNITS_LAYER_STR}" (fid INTEGER PRIMARY KEY, punkt TEXT, indeks INTEGER)')
+
+
+def _indexes(path):
+    with closing(sqlite3.connect(path)) as conn:
+        return {(row[0], row[1]) for row in conn.execute(
+            "SELECT tbl_name, name FROM sqlite_master WHERE type = 'index' AND name LIKE '%_idx'")}
+
+
+def _query_plan(path, sql):
+    with closing(sqlite3.connect(path)) as conn:
+        return ' '.join(row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}'))
+
+
+def test_upgrade_creates_indexes_of_existing_tables(tmp_path):
+    path = str(tmp_path / 'project.gpkg')
+    _make_gpkg(path)
+
+    m_gpkg.upgrade(path)
+
+    assert _indexes(path) == {(POINTS_LAYER_STR, f'{POINTS_LAYER_STR}_punkt_idx'),
+                              (PROBE_UNITS_LAYER_STR, f'{PROBE_UNITS_LAYER_STR}_punkt_indeks_idx')}
+    assert 'INDEX' in _query_plan(path, f'SELECT * FROM "{POINTS_LAYER_STR}" WHERE punkt = \'p1\'')
+    assert 'INDEX' in _query_plan(
+        path, f'SELECT * FROM "{PROBE_UNITS_LAYER_STR}" WHERE punkt = \'p1\' ORDER BY indeks')
+    assert not any(table == TEAMS_LAYER_STR for table, name in _indexes(path))
+
+
+def test_upgrade_is_applied_once(tmp_path):
+    path = str(tmp_path / 'project.gpkg')
+    _make_gpkg(path)
+    m_gpkg.upgrade(path)
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute(f'DROP INDEX "{POINTS_LAYER_STR}_punkt_idx"')
+
+    m_gpkg.upgrade(path)
+
+    assert (POINTS_LAYER_STR, f'{POINTS_LAYER_STR}_punkt_idx') not in _indexes(path)
+    with closing(m_gpkg.connect(path)) as conn:
+        assert m_gpkg.get_meta(conn, m_gpkg.SCHEMA_VERSION_KEY) == str(len(m_gpkg.SCHEMA_UPGRADES))
+
+
+def test_initialize_recreates_indexes_of_overwritten_tables(tmp_path):
+    path = str(tmp_path / 'project.gpkg')
+    _make_gpkg(path)
+    m_gpkg.initialize(path)
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute(f'DROP TABLE "{POINTS_LAYER_STR}"')
+        conn.execute(f'CREATE TABLE "{POINTS_LAYER_STR}" (fid INTEGER PRIMARY KEY, punkt TEXT)')
+
+    m_gpkg.initialize(path)
+
+    assert (POINTS_LAYER_STR, f'{POINTS_LAYER_STR}_punkt_idx') in _indexes(path)
+
+
+def test_units_of_packed_series_are_rows_of_the_view(tmp_path):
+    path = str(tmp_path / 'project.gpkg')
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute(f'CREATE TABLE "{PROBE_SERIES_LAYER_STR}" (fid INTEGER PRIMARY KEY, punkt TEXT, wartosci TEXT)')
+        conn.executemany(f'INSERT INTO "{PROBE_SERIES_LAYER_STR}" VALUES (?, ?, ?)',
+                         [(1, 'S1', '[3,5,null]'), (2, 'S2', '[7'), (3, 'S3', '[1]')])
+
+    m_gpkg.initialize(path)
+
+    with closing(sqlite3.connect(path)) as conn:
+        rows = conn.execute(f'SELECT * FROM "{PROBE_SERIES_VIEW_STR}" ORDER BY fid').fetchall()
+    # a broken series has no rows instead of failing the whole view
+    assert rows == [(10000, 'S1', 0, 3), (10001, 'S1', 1, 5), (10002, 'S1', 2, None), (30000, 'S3', 0, 1)]
+
+
+def test_view_is_not_made_without_packed_series(tmp_path):
+    path = str(tmp_path / 'project.gpkg')
+    _make_gpkg(path)
+
+    m_gpkg.initialize(path)
+
+    assert not m_gpkg.has_table(path, PROBE_SERIES_LAYER_STR)
+    with closing(sqlite3.connect(path)) as conn:
+        assert not conn.execute("SELECT name FROM sqlite_master WHERE type = 'view'").fetchall()
@@ -0,0 +1,37 @@
+import datetime
+
+from database import data, point, water
+from model import m_project
+from model.m_columns import Columns
+from model.m_schema import Encoding, FieldSpec, Schema, compile_encoder
+
+
+def test_fields_without_remote_names_are_not_in_schema():
+    schema = Schema.of(water.SET_WATER_LOCAL_TO_REMOTE, exclude=[data.NAME])
+    assert schema.local_names() == [water.HORIZON, water.WATER_DEPTH, data.TIME]
+
+
+def test_values_are_encoded_by_field_rules():
+    schema = Schema((
+        FieldSpec('a', 'A', Encoding.TEXT),
+        FieldSpec('b', 'B', Encoding.DEPTH_TEXT),
+        FieldSpec('c', 'C', Encoding.FLOAT, 0.1),
+        FieldSpec('d', 'D', Encoding.STATUS),
+        FieldSpec('e', 'E', Encoding.BOOL),
+    ))
+    columns = Columns([1, 2], {'a': [None, 'x'], 'b': ['1.234', None], 'c': [None, 2], 'd': ['Zrobiony', None],
+                               'e': [None, True]})
+
+    rows = compile_encoder(schema)(columns)
+
+    assert rows == [
+        {'A': '', 'B': '1.23', 'C': 0.1, 'D': 'DONE', 'E': False},
+        {'A': 'x', 'B': '0.0', 'C': 2.0, 'D': 'EMPTY', 'E': True},
+    ]
+
+
+def test_points_are_encoded_with_remote_names_of_the_table():
+    encoded = m_project._points_map(Columns([1], {data.NAME: ['D1']}, [(1.5, 2.5)]))
+    point_map = encoded['D1']
+    assert list(point_map.keys()) == point.LOCAL_TO_REMOTE.remote_names() + [point.POINT_X, point.POINT_Y]
+    assert isinstance(point_map[data.TIME_REMOTE], datetime.datetime)
@@ -0,0 +1,48 @@
+from database import constants, shear
+from database.shear import ShearUnit
+from model import m_shears
+
+
+def _units(name: str, depth: float, torques) -> list:
+    return [ShearUnit(name, depth, index, torque) for index, torque in enumerate(torques)]
+
+
+def test_units_are_grouped_by_point_and_depth_in_order_of_indexes():
+    units = _units('D1', 1.0, ['1', '2']) + _units('D2', 1.0, ['3']) + _units('D1', 2.5, ['4'])
+    units.insert(1, ShearUnit('D1', 1.0001, 5, '9'))
+
+    groups = m_shears.groups_of_units(units)
+
+    assert [(group.name, group.depth, group.torques) for group in groups] == [
+        ('D1', 1.0, ['1', '2', '9']), ('D2', 1.0, ['3']), ('D1', 2.5, ['4'])]
+
+
+def test_summary_has_peak_and_residual_torques():
+    torques = ['13', '24', '34', '56', '76', '87', '90', '100', '110', '90', '60', '50', '46', '45', '45', '43', '43',
+               '43']
+    summary, = m_shears.summaries(m_shears.groups_of_units(_units('D1', 1.6, torques)))
+
+    assert summary.attrs() == ['D1', 1.6, 110.0, 43.0, constants.SHEARS_SIZE, True]
+
+
+def test_incomplete_shear_is_marked():
+    summary, = m_shears.summaries(m_shears.groups_of_units(_units('D1', 1.6, ['', 'x', '5'])))
+
+    assert (summary.peak, summary.residual, summary.count, summary.is_complete) == (5.0, 5.0, 3, False)
+    assert summary.fields_names()[1] == shear.SHEAR_DEPTH
+
+
+def test_many_depths_are_grouped_in_one_pass(monkeypatch):
+    units = [unit for depth in range(2000) for unit in _units('D1', depth / 10, [str(i) for i in range(18)])]
+    keyed = []
+    group_key = m_shears.group_key
+
+    def counted_group_key(name, depth):
+        keyed.append(name)
+        return group_key(name, depth)
+
+    monkeypatch.setattr(m_shears, 'group_key', counted_group_key)
+    groups = m_shears.groups_of_units(units)
+
+    assert len(groups) == 2000
+    assert len(keyed) == len(units)
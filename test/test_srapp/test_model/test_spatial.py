@@ -0,0 +1,88 @@
+import math
+import random
+
+from model import m_spatial
+
+
+def _index(count: int, seed: int = 1) -> m_spatial.GridIndex:
+    rnd = random.Random(seed)
+    index = m_spatial.GridIndex()
+    for fid in range(1, count + 1):
+        # every third point is assigned
+        index.insert(fid, rnd.uniform(0, 10000), rnd.uniform(0, 10000), 'T1' if fid % 3 == 0 else None)
+    return index
+
+
+def _brute_nearest(index: m_spatial.GridIndex, x: float, y: float, number: int, accept=None) -> list:
+    fids = [fid for fid in range(1, len(index) + 1) if accept is None or accept(index.tag(fid))]
+    fids.sort(key=lambda fid: (math.dist(index.xy(fid), (x, y)), fid))
+    return fids[:number]
+
+
+def test_nearest_are_the_same_as_of_all_positions():
+    index = _index(2000)
+    is_unassigned = lambda performer: not performer
+    for x, y in [(0, 0), (5000, 5000), (-3000, 12000), (9999, 1)]:
+        assert index.nearest(x, y, 10) == _brute_nearest(index, x, y, 10)
+        assert index.nearest(x, y, 10, is_unassigned) == _brute_nearest(index, x, y, 10, is_unassigned)
+
+
+def test_within_are_nearest_first():
+    index = _index(2000)
+    found = index.within(5000, 5000, 300)
+
+    assert found == [fid for fid in _brute_nearest(index, 5000, 5000, len(index))
+                     if math.dist(index.xy(fid), (5000, 5000)) <= 300]
+
+
+def test_moved_and_removed_positions_are_updated():
+    index = m_spatial.GridIndex()
+    index.insert(1, 10, 10)
+    index.insert(2, 500, 500)
+    index.insert(1, 1000, 1000)
+    index.remove(2)
+
+    assert index.nearest(0, 0, 5) == [1]
+    assert index.within(0, 0, 800) == []
+    assert len(index) == 1
+
+
+def test_more_nearest_than_positions_are_all_positions():
+    index = _index(10)
+
+    assert sorted(index.nearest(0, 0, 50)) == list(range(1, 11))
+
+
+def test_queries_of_many_points_check_only_cells_around_them():
+    index = _index(20000)
+    rnd = random.Random(2)
+    places = [(rnd.uniform(0, 10000), rnd.uniform(0, 10000)) for _ in range(200)]
+
+    for x, y in places:
+        index.nearest(x, y, 10, lambda performer: not performer)
+    # about 2 positions in a cell, all positions are in 10000 cells
+    assert index.visited_cells / len(places) < 100
+    assert index.checked_positions / len(places) < 200
+
+    index.visited_cells = index.checked_positions = 0
+    for x, y in places:
+        index.within(x, y, 200)
+    assert index.visited_cells == 25 * len(places)
+    assert index.checked_positions / len(places) < 200
+
+
+def test_distant_point_does_not_slow_down_search_of_few_matches():
+    rnd = random.Random(3)
+    index = m_spatial.GridIndex()
+    for fid in range(1, 20001):
+        index.insert(fid, rnd.uniform(505000, 515000), rnd.uniform(305000, 315000), 'T1' if fid > 6 else None)
+    index.insert(20001, 1.0, 1.0, 'T1')
+    is_unassigned = lambda performer: not performer
+
+    found = index.nearest(510000, 310000, 10, is_unassigned)
+
+    assert found == _brute_nearest(index, 510000, 310000, 10, is_unassigned)
+    assert len(found) == 6
+    # the empty rings between the points and the distant one would be millions of cells
+    assert index.visited_cells < 2 * len(index)
+    assert index.checked_positions == len(index)
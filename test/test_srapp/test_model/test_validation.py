@@ -0,0 +1,107 @@
+from database import constants, data, point, probe, shear
+from test_srapp.fakes import FakeFeature
+from model.m_columns import Columns
+from model.m_config import POINTS_LAYER_STR, PROBE_SERIES_LAYER_STR, SHEAR_UNITS_LAYER_STR
+from model.m_validation import LayerValidator
+
+POINT_NAMES = point.LOCAL_TO_REMOTE.local_names()
+SHEAR_UNIT_NAMES = shear.shear_unit_local_names()
+
+
+def _point(fid: int, name: str, status: str = None) -> FakeFeature:
+    return FakeFeature(POINT_NAMES, fid, **{data.NAME: name, point.BOREHOLE_STATE: status})
+
+
+def _shear_unit(fid: int, name: str, depth: float, index: int) -> FakeFeature:
+    attrs = dict(zip(SHEAR_UNIT_NAMES, [name, depth, index, 10.0]))
+    return FakeFeature(SHEAR_UNIT_NAMES, fid, **attrs)
+
+
+def _points_validator(features) -> LayerValidator:
+    validator = LayerValidator(POINTS_LAYER_STR, ['fid'] + POINT_NAMES)
+    validator.reset(Columns.from_features(features, POINT_NAMES))
+    return validator
+
+
+def _point_columns(features) -> Columns:
+    return Columns.from_features(features, POINT_NAMES)
+
+
+class TestValidation:
+
+    def test_duplicated_name_is_invalid(self):
+        features = [_point(1, 'D1'), _point(2, 'D2')]
+        validator = _points_validator(features)
+        duplicate = _point(3, 'D1')
+        validator.index(duplicate.fid(), duplicate.attributes())
+
+        messages = validator.messages(_point_columns([duplicate]))
+
+        assert messages == [f'Nieunikalna wartość pola "{data.NAME}" w wierszu numer 3']
+
+    def test_renamed_duplicate_is_valid(self):
+        features = [_point(1, 'D1'), _point(2, 'D1')]
+        validator = _points_validator(features)
+        renamed = _point(2, 'D3')
+        validator.index(renamed.fid(), renamed.attributes())
+
+        assert not validator.messages(_point_columns(features[:1] + [renamed]))
+
+    def test_removed_duplicate_is_valid(self):
+        features = [_point(1, 'D1'), _point(2, 'D1')]
+        validator = _points_validator(features)
+        validator.unindex(2)
+
+        assert not validator.messages(_point_columns(features[:1]))
+
+    def test_empty_name_and_unknown_status_are_invalid(self):
+        validator = _points_validator([])
+        feature = _point(1, None, 'zrobione?')
+        validator.index(feature.fid(), feature.attributes())
+
+        messages = validator.messages(_point_columns([feature]))
+
+        assert len(messages) == 2
+        assert messages[0] == f'Pusta wartość pola "{data.NAME}" w wierszu numer 1'
+        assert messages[1].startswith(f'Stan wykonania "zrobione?" w polu "{point.BOREHOLE_STATE}"')
+
+    def test_shears_are_counted_by_point_and_depth(self):
+        features = [_shear_unit(i + 1, 'D1', 1.0, i + 1) for i in range(constants.SHEARS_SIZE)]
+        features += [_shear_unit(i + 101, 'D2', 1.0, i + 1) for i in range(constants.SHEARS_SIZE - 1)]
+        validator = LayerValidator(SHEAR_UNITS_LAYER_STR, ['fid'] + SHEAR_UNIT_NAMES)
+        validator.reset(Columns.from_features(features, SHEAR_UNIT_NAMES))
+
+        assert not validator.messages(Columns.from_features(features[:1], SHEAR_UNIT_NAMES))
+        messages = validator.messages(Columns.from_features(features[constants.SHEARS_SIZE:], SHEAR_UNIT_NAMES))
+        assert messages == [f'Ilość wpisów wartości ścięć "{constants.SHEARS_SIZE - 1}" w polu '
+                            f'"{shear.INDEX}" w dla głębokośći 1.0 powinna wynosić {constants.SHEARS_SIZE}']
+
+    def test_broken_series_is_invalid(self):
+        names = probe.probe_series_local_names()
+        features = [FakeFeature(names, 1, **{data.NAME: 'S1', probe.SERIES: '[3,5,12]'}),
+                    FakeFeature(names, 2, **{data.NAME: 'S2', probe.SERIES: '[3,5'})]
+        validator = LayerValidator(PROBE_SERIES_LAYER_STR, ['fid'] + names)
+        validator.reset(Columns.from_features(features, names))
+
+        messages = validator.messages(Columns.from_features(features, names))
+
+        assert messages == [f'Nieprawidłowa seria wartości "[3,5" w polu "{probe.SERIES}" w wierszu numer 2']
+
+    def test_commit_into_large_layer_reads_only_committed_values(self, monkeypatch):
+        validator = _points_validator([_point(i, f'P{i}', 'Zrobiony') for i in range(20000)])
+        committed = [_point(i, f'N{i}', 'Zrobiony') for i in range(20000, 21000)]
+        read_values = []
+        column = Columns.column
+
+        def counted_column(columns: Columns, name: str) -> list:
+            values = column(columns, name)
+            read_values.extend(values)
+            return values
+
+        monkeypatch.setattr(Columns, 'column', counted_column)
+        for feature in committed:
+            validator.index(feature.fid(), feature.attributes())
+        messages = validator.messages(_point_columns(committed))
+
+        assert not messages
+        assert len(read_values) <= len(committed) * len(validator.rules)
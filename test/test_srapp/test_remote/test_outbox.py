@@ -0,0 +1,215 @@
+import datetime
+import threading
+from typing import *
+
+import pytest
+from google.api_core import exceptions
+
+from remote import outbox as outbox_module
+from remote.outbox import Outbox
+from remote.outbox_store import OutboxStore
+from remote.remote_update import DocumentWrite
+from srapp_model import G
+from test_srapp.fakes import FakeDatabaseUser, FakeWriteBatch, FakeWriteResult, FakeLogger
+
+G.Log = FakeLogger()
+
+D1_PATH = 'users/fake/projects/test/boreholes/D1'
+D2_PATH = 'users/fake/projects/test/boreholes/D2'
+
+
+class BlockingWriteBatch(FakeWriteBatch):
+
+    def commit(self) -> List[FakeWriteResult]:
+        self._user.committing.set()
+        self._user.release.wait(5)
+        return super().commit()
+
+
+class BlockingUser(FakeDatabaseUser):
+
+    def __init__(self, email: str):
+        super().__init__(email)
+        self.committing = threading.Event()
+        self.release = threading.Event()
+
+    def batch(self) -> FakeWriteBatch:
+        return BlockingWriteBatch(self)
+
+
+class OfflineWriteBatch(FakeWriteBatch):
+
+    def commit(self) -> List[FakeWriteResult]:
+        self._user.attempts += 1
+        if not self._user.online:
+            raise exceptions.ServiceUnavailable('offline')
+        return super().commit()
+
+
+class OfflineUser(FakeDatabaseUser):
+
+    def __init__(self, email: str):
+        super().__init__(email)
+        self.online = False
+        self.attempts = 0
+
+    def batch(self) -> FakeWriteBatch:
+        return OfflineWriteBatch(self)
+
+
+def write(path: str, data: Optional[dict], merge: bool = True) -> DocumentWrite:
+    return DocumentWrite(path, data, merge, 'wiercenia', path.split('/')[-1])
+
+
+@pytest.fixture
+def user() -> BlockingUser:
+    return BlockingUser('fake@mail.com')
+
+
+@pytest.fixture
+def outbox(user) -> Outbox:
+    outbox = Outbox(user, 'test')
+    yield outbox
+    user.release.set()
+    outbox.close(5)
+
+
+def hold_worker(outbox: Outbox, user: BlockingUser):
+    outbox.put([write(D2_PATH, {'pointNumber': 'D2'})])
+    assert user.committing.wait(5)
+
+
+def test_writes_are_sent_after_flush(outbox, user):
+    user.release.set()
+    outbox.put([write(D1_PATH, {'pointNumber': 'D1'}), write(D2_PATH, None)])
+    assert outbox.flush(5)
+    assert user.commits == [[(D1_PATH, {'pointNumber': 'D1'}, True), (D2_PATH, None, False)]]
+
+
+def test_writes_of_the_same_document_are_merged(outbox, user):
+    hold_worker(outbox, user)
+    outbox.put([write(D1_PATH, {'point': {'persons': ['Jan']}, 'layers': []})])
+    outbox.put([write(D1_PATH, {'point': {'location': 'Konin'}, 'layers': [{'to': '1.0'}]})])
+    user.release.set()
+    assert outbox.flush(5)
+    expected = {'point': {'persons': ['Jan'], 'location': 'Konin'}, 'layers': [{'to': '1.0'}]}
+    assert user.commits[-1] == [(D1_PATH, expected, True)]
+
+
+def test_deletion_supersedes_earlier_writes(outbox, user):
+    hold_worker(outbox, user)
+    outbox.put([write(D1_PATH, {'layers': []})])
+    outbox.put([write(D1_PATH, None)])
+    user.release.set()
+    assert outbox.flush(5)
+    assert user.commits[-1] == [(D1_PATH, None, False)]
+
+
+def test_write_after_deletion_replaces_document(outbox, user):
+    hold_worker(outbox, user)
+    outbox.put([write(D1_PATH, None)])
+    outbox.put([write(D1_PATH, {'layers': []})])
+    user.release.set()
+    assert outbox.flush(5)
+    assert user.commits[-1] == [(D1_PATH, {'layers': []}, False)]
+
+
+def test_pending_writes_are_counted(outbox, user):
+    hold_worker(outbox, user)
+    outbox.put([write(D1_PATH, {'layers': []})])
+    assert outbox.pending_count == 2
+    assert not outbox.flush(0.01)
+    user.release.set()
+    assert outbox.flush(5)
+    assert outbox.pending_count == 0
+
+
+@pytest.fixture
+def store(tmp_path) -> OutboxStore:
+    return OutboxStore(str(tmp_path / 'test.gpkg'))
+
+
+@pytest.fixture
+def offline_user(monkeypatch) -> OfflineUser:
+    monkeypatch.setattr(outbox_module, 'RETRY_DELAY', 0.01)
+    monkeypatch.setattr(outbox_module, 'RETRY_MAX_DELAY', 0.05)
+    return OfflineUser('fake@mail.com')
+
+
+def wait_until(condition: Callable[[], bool]):
+    deadline = datetime.datetime.now() + datetime.timedelta(seconds=5)
+    while not condition() and datetime.datetime.now() < deadline:
+        threading.Event().wait(0.01)
+    assert condition()
+
+
+def wait_for_attempts(user: OfflineUser, attempts: int):
+    wait_until(lambda: user.attempts >= attempts)
+
+
+def test_store_keeps_writes_with_dates(store):
+    time = datetime.datetime(2022, 5, 31, 6, 17, 1, tzinfo=datetime.timezone.utc)
+    d1 = write(D1_PATH, {'timestamp': time, 'layers': [{'to': '1.0'}]})
+    d2 = write(D2_PATH, None)
+    store.save([(1, d1), (2, d2)])
+    assert store.load() == [(1, d1), (2, d2)]
+
+
+def test_put_writes_are_stored_in_one_transaction(store, user, monkeypatch):
+    saves = []
+    save = store.save
+    monkeypatch.setattr(store, 'save', lambda *args: saves.append(args) or save(*args))
+    outbox = Outbox(user, 'test', store)
+    hold_worker(outbox, user)
+    saves.clear()
+    paths = [f'{D1_PATH}{i}' for i in range(2000)]
+    outbox.put([write(path, {'layers': []}) for path in paths])
+    outbox.put([write(path, {'layers': [{'to': '1.0'}]}) for path in paths])
+    assert len(saves) == 2
+    user.release.set()
+    assert outbox.flush(5)
+    outbox.close(5)
+
+
+def test_writes_are_sent_again_when_connection_is_back(store, offline_user):
+    outbox = Outbox(offline_user, 'test', store)
+    outbox.put([write(D1_PATH, {'pointNumber': 'D1'})])
+    wait_for_attempts(offline_user, 3)
+    assert outbox.pending_count == 1
+    assert len(store.load()) == 1
+    offline_user.online = True
+    outbox.retry_now()
+    assert outbox.flush(5)
+    assert offline_user.commits == [[(D1_PATH, {'pointNumber': 'D1'}, True)]]
+    assert store.load() == []
+    outbox.close(5)
+
+
+def test_writes_superseded_when_offline_are_dropped(store, offline_user):
+    outbox = Outbox(offline_user, 'test', store)
+    for i in range(100):
+        outbox.put([write(D1_PATH, {'layers': [{'to': str(i)}]}), write(D2_PATH, {'layers': [{'to': str(i)}]})])
+    wait_for_attempts(offline_user, 1)
+    # writes put while the first batch was sent are merged with it after the failure
+    wait_until(lambda: len(store.load()) == 2)
+    offline_user.online = True
+    outbox.retry_now()
+    assert outbox.flush(5)
+    assert offline_user.commits == [[
+        (D1_PATH, {'layers': [{'to': '99'}]}, True),
+        (D2_PATH, {'layers': [{'to': '99'}]}, True),
+    ]]
+    outbox.close(5)
+
+
+def test_stored_writes_are_sent_by_next_outbox(store, offline_user):
+    outbox = Outbox(offline_user, 'test', store)
+    outbox.put([write(D2_PATH, None), write(D1_PATH, {'pointNumber': 'D1'})])
+    wait_for_attempts(offline_user, 1)
+    assert not outbox.close(5)
+    offline_user.online = True
+    next_outbox = Outbox(offline_user, 'test', store)
+    assert next_outbox.flush(5)
+    assert offline_user.commits == [[(D2_PATH, None, False), (D1_PATH, {'pointNumber': 'D1'}, True)]]
+    assert store.load() == []
+    next_outbox.close(5)